@@ -0,0 +1,1221 @@
+"""
+Benchmarks for Taggart: run with `python bench_taggart.py`.
+
+`python bench_taggart.py --suite` times every operation instead, on generated
+catalogs of several sizes, and writes the results as JSON (see run_suite()).
+"""
+
+import argparse
+import asyncio
+import bisect
+import datetime
+import functools
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import taggart
+from taggart import aio
+from taggart.sqlite import SQLiteStore
+
+# The slowest that `import taggart` may take, in seconds, before main() reports
+# a regression and exits with an error (see bench_import())
+IMPORT_TIME_LIMIT = 0.015
+
+# Modules that importing taggart must not import, as only some functions use
+# them and they are slow to import (see bench_import())
+LAZY_MODULES = ('json', 'locale', 'logging', 'multiprocessing', 'yaml')
+
+# Catalog sizes, in (file, tag) edges, that run_suite() times by default; pass
+# --sizes for others, e.g. 10000,1000000,50000000 (memory permitting)
+SUITE_SIZES = (10000, 100000, 1000000)
+
+# The memory mappings and formats that run_suite() times by default
+SUITE_MAPPINGS = (taggart.TAG_TO_FILE, taggart.FILE_TO_TAG)
+SUITE_FORMATS = ('bin', 'json', 'text', 'yaml')
+
+# How many calls each single-file or single-tag operation is timed over
+SUITE_SAMPLES = 100
+
+# How much slower an operation may get, as a ratio of its time per call,
+# before compare_results() reports it as a regression
+REGRESSION_RATIO = 1.25
+
+# In generated catalogs, the popularity of the nth most popular tag is
+# proportional to 1 / n ** ZIPF_EXPONENT: a few tags are on most files, and
+# most tags are on a few files, as with real catalogs
+ZIPF_EXPONENT = 1.1
+
+# In generated catalogs, files are PATH_DEPTH directories deep, under a tree
+# with PATH_FANOUT subdirectories per directory, and tags are spread over
+# TAG_NAMESPACES namespaces (e.g. 'ns_3/tag_42')
+PATH_DEPTH = 6
+PATH_FANOUT = 8
+TAG_NAMESPACES = 16
+
+
+def timed(func, *args, **kwargs):
+    """
+    Call a function and measure how long it takes.
+
+    @param func: The function to call
+    @type func: callable
+    @return: The function's return value, and the elapsed time in seconds
+    @rtype: tuple
+    """
+    start = time.time()
+    result = func(*args, **kwargs)
+    return result, time.time() - start
+
+
+def reset(mapping=taggart.TAG_TO_FILE, postings=taggart.SET_POSTINGS):
+    """Empty the in-memory tag map and select a memory mapping."""
+    taggart.THE_LIST = {}
+    taggart.THE_REVERSE_LIST = {}
+    taggart.SYMBOL_IDS = {}
+    taggart.SYMBOL_NAMES = []
+    taggart.MAPPING = mapping
+    taggart.POSTINGS = postings
+
+
+def bench_query(size=1000000, postings=taggart.SET_POSTINGS, seed=0):
+    """
+    Time 3-term boolean queries over tags with many postings each.
+
+    Three tags each cover about half of the catalog, and a fourth, selective
+    tag covers about one file in a thousand.
+
+    @param size: How many files each common tag is applied to
+    @type size: int
+    @param postings: The POSTINGS setting to use
+    @type postings: str
+    @param seed: Seed for the random number generator
+    @type seed: int
+    @return: Query times, in seconds, keyed by query
+    @rtype: dict
+    """
+    rng = random.Random(seed)
+    reset(postings=postings)
+
+    files = ['file_%d' % i for i in range(size * 2)]
+    sizes = {'Photos': size, 'Vacation': size, 'Finances': size,
+             'Rare': size // 1000}
+    for tag_name in sorted(sizes):
+        taggart.tag(rng.sample(files, sizes[tag_name]), tag_name)
+        len(taggart.THE_LIST[tag_name])  # Settle array postings before timing
+
+    results = {}
+    for expression in ('Rare & Photos & Vacation',
+                       'Rare & Photos & !Finances',
+                       'Photos & Vacation & Finances'):
+        results[expression] = timed(taggart.query, expression)[1]
+    return results
+
+
+def bench_prefix(size=1000000, tags=10000, queries=100, seed=0):
+    """
+    Time prefix queries over namespaced tags, against filtering get_tags().
+
+    Tags are named 'ns_<i>/group_<j>/tag_<k>', in 100 namespaces of 10 groups
+    each, and each query asks for every file under one group.
+
+    @param size: How many (file, tag) edges to apply
+    @type size: int
+    @param tags: How many distinct tags to spread the edges over
+    @type tags: int
+    @param queries: How many prefix queries to run
+    @type queries: int
+    @param seed: Seed for the random number generator
+    @type seed: int
+    @return: Total query times, in seconds, keyed by method
+    @rtype: dict
+    """
+    rng = random.Random(seed)
+    names = ['ns_%d/group_%d/tag_%d' % (i % 100, i // 100 % 10, i)
+             for i in range(tags)]
+    reset()
+    taggart.tag_edges(('file_%d' % rng.randrange(size), rng.choice(names))
+                      for _ in range(size))
+    prefixes = ['ns_%d/group_%d/' % (rng.randrange(100), rng.randrange(10))
+                for _ in range(queries)]
+
+    def filtered():
+        for prefix in prefixes:
+            file_names = set()
+            for tag_name in taggart.get_tags():
+                if tag_name.startswith(prefix):
+                    file_names.update(taggart.get_files_by_tag(tag_name))
+            sorted(file_names)
+
+    def indexed():
+        for prefix in prefixes:
+            taggart.get_files_by_tag_prefix(prefix)
+
+    return {'get_tags filter': timed(filtered)[1],
+            'get_files_by_tag_prefix': timed(indexed)[1]}
+
+
+def bench_under(size=1000000, tags=100, queries=100, seed=0):
+    """
+    Time directory queries, against filtering get_files(), in every mapping.
+
+    Files are named 'vol_<i>/dir_<j>/file_<k>', in 100 volumes of 100
+    directories each, and each query asks for every file in one directory.
+    The first query builds the sorted file index, and the first query after
+    a write updates it: both are timed separately.
+
+    @param size: How many (file, tag) edges to apply
+    @type size: int
+    @param tags: How many distinct tags to spread the edges over
+    @type tags: int
+    @param queries: How many directory queries to run
+    @type queries: int
+    @param seed: Seed for the random number generator
+    @type seed: int
+    @return: Total query times, in seconds, keyed by (mapping, method)
+    @rtype: dict
+    """
+    rng = random.Random(seed)
+    edges = [('vol_%d/dir_%d/file_%d' % (i % 100, i // 100 % 100, i),
+              'tag_%d' % rng.randrange(tags))
+             for i in (rng.randrange(size) for _ in range(size))]
+    directories = ['vol_%d/dir_%d' % (rng.randrange(100), rng.randrange(100))
+                   for _ in range(queries)]
+
+    def filtered():
+        for directory in directories:
+            prefix = directory + '/'
+            [f for f in taggart.get_files() if f.startswith(prefix)]
+
+    def indexed():
+        for directory in directories:
+            taggart.get_files_under(directory)
+
+    results = {}
+    for mapping in (taggart.TAG_TO_FILE, taggart.FILE_TO_TAG,
+                    taggart.BIDIRECTIONAL):
+        reset(mapping)
+        taggart.tag_edges(edges)
+        results[mapping, 'first query'] = timed(
+            taggart.get_files_under, directories[0])[1]
+        results[mapping, 'get_files_under'] = timed(indexed)[1]
+        taggart.tag('vol_0/dir_0/new_file', 'tag_0')
+        results[mapping, 'after a write'] = timed(
+            taggart.get_files_under, directories[0])[1]
+        results[mapping, 'get_files filter'] = timed(filtered)[1]
+    return results
+
+
+def bench_cache(size=1000000, tags=100, rounds=1000, seed=0):
+    """
+    Time a dashboard's repeated queries, with and without the query cache.
+
+    Each round asks for the files of 5 popular tags, the tags of 5 files, and
+    one 2-term query, then tags a file with one of 10 other tags, so that
+    writes keep going on without touching what the dashboard asks for.
+
+    @param size: How many (file, tag) edges to apply
+    @type size: int
+    @param tags: How many distinct tags to spread the edges over
+    @type tags: int
+    @param rounds: How many rounds of queries to run
+    @type rounds: int
+    @param seed: Seed for the random number generator
+    @type seed: int
+    @return: Total times, in seconds, and cache stats, keyed by cache size
+    @rtype: dict
+    """
+    rng = random.Random(seed)
+    edges = [('file_%d' % rng.randrange(size), 'tag_%d' % rng.randrange(tags))
+             for _ in range(size)]
+    files = ['file_%d' % rng.randrange(size) for _ in range(5)]
+
+    def dashboard():
+        for i in range(rounds):
+            for tag_name in ('tag_0', 'tag_1', 'tag_2', 'tag_3', 'tag_4'):
+                taggart.get_files_by_tag(tag_name)
+            for file_name in files:
+                taggart.get_tags_by_file(file_name)
+            taggart.query('tag_5 & tag_6')
+            taggart.tag('new_file_%d' % i, 'tag_%d' % (90 + i % 10))
+
+    results = {}
+    for cache_size in (0, taggart.CACHE_SIZE):
+        reset(taggart.BIDIRECTIONAL)
+        taggart.tag_edges(edges)
+        taggart.CACHE_SIZE, saved = cache_size, taggart.CACHE_SIZE
+        taggart.DEFAULT_STORE.cache = taggart.QueryCache()
+        try:
+            results[cache_size] = (timed(dashboard)[1],
+                                   taggart.cache_stats())
+        finally:
+            taggart.CACHE_SIZE = saved
+    return results
+
+
+def bench_sorted(size=1000000, tags=100, rounds=10, seed=0):
+    """
+    Time reads with set postings and with sorted postings, cache turned off.
+
+    @param size: How many (file, tag) edges to apply
+    @type size: int
+    @param tags: How many distinct tags to spread the edges over
+    @type tags: int
+    @param rounds: How many times to read the files of every tag
+    @type rounds: int
+    @param seed: Seed for the random number generator
+    @type seed: int
+    @return: Times, in seconds, keyed by (postings, operation)
+    @rtype: dict
+    """
+    rng = random.Random(seed)
+    edges = [('file_%d' % rng.randrange(size), 'tag_%d' % rng.randrange(tags))
+             for _ in range(size)]
+    tag_names = ['tag_%d' % i for i in range(tags)]
+
+    def lookups():
+        for _ in range(rounds):
+            for tag_name in tag_names:
+                taggart.get_files_by_tag(tag_name)
+
+    def iterations():
+        for _ in range(rounds):
+            for tag_name in tag_names:
+                for _ in taggart.iter_files_by_tag(tag_name):
+                    pass
+
+    def queries():
+        for _ in range(rounds):
+            for i in range(tags - 1):
+                taggart.query('%s | %s' % (tag_names[i], tag_names[i + 1]))
+
+    results = {}
+    saved, taggart.CACHE_SIZE = taggart.CACHE_SIZE, 0
+    try:
+        for postings in (taggart.SET_POSTINGS, taggart.SORTED_POSTINGS):
+            reset(postings=postings)
+            results[postings, 'tag_edges'] = timed(
+                taggart.tag_edges, edges)[1]
+            results[postings, 'get_files_by_tag'] = timed(lookups)[1]
+            results[postings, 'iter_files_by_tag'] = timed(iterations)[1]
+            results[postings, 'query a | b'] = timed(queries)[1]
+            results[postings, 'dump_text'] = timed(taggart.dump_text)[1]
+            results[postings, 'MB'] = taggart.memory_usage()['forward'] / 1e6
+    finally:
+        taggart.CACHE_SIZE = saved
+    return results
+
+
+def bench_pages(size=1000000, pages=20, page_size=50, seed=0):
+    """
+    Time reading the first pages of a big tag, and of a query, 50 at a time.
+
+    Half of all edges go to a single tag. Pages are read by cursor, as a UI
+    would, with paginated calls, and by slicing the full results, as before.
+
+    @param size: How many (file, tag) edges to apply
+    @type size: int
+    @param pages: How many pages to read
+    @type pages: int
+    @param page_size: How many names to read per page
+    @type page_size: int
+    @param seed: Seed for the random number generator
+    @type seed: int
+    @return: Times, in seconds, keyed by (postings, method)
+    @rtype: dict
+    """
+    rng = random.Random(seed)
+    edges = [('file_%d' % rng.randrange(size),
+              'big' if rng.random() < 0.5 else 'tag_%d' % rng.randrange(100))
+             for _ in range(size)]
+
+    def sliced(get):
+        after = ''
+        for _ in range(pages):
+            file_names = get()
+            page = file_names[bisect.bisect_right(file_names, after):][
+                :page_size]
+            after = page[-1]
+
+    def paged(get):
+        after = None
+        for _ in range(pages):
+            after = get(after=after, limit=page_size)[-1]
+
+    results = {}
+    for postings in (taggart.SET_POSTINGS, taggart.SORTED_POSTINGS):
+        reset(postings=postings)
+        taggart.tag_edges(edges)
+        for name, get in (
+                ('get_files_by_tag', functools.partial(
+                    taggart.get_files_by_tag, 'big')),
+                ('query', functools.partial(
+                    taggart.query, 'big & !tag_1'))):
+            taggart.DEFAULT_STORE._invalidate()
+            results[postings, name + ' sliced'] = timed(sliced, get)[1]
+            taggart.DEFAULT_STORE._invalidate()
+            results[postings, name + ' paged'] = timed(paged, get)[1]
+    return results
+
+
+def bench_import(runs=20):
+    """
+    Time `import taggart` in fresh interpreters, with `python -X importtime`.
+
+    Bytecode is compiled once beforehand, into a temporary cache, so that only
+    the import itself is timed.
+
+    @param runs: How many interpreters to start
+    @type runs: int
+    @return: The fastest cumulative import time, in seconds, and any modules
+             in LAZY_MODULES that were imported along with taggart
+    @rtype: tuple
+    """
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    code = ('import sys, taggart; print(" ".join(m for m in %r '
+            'if m in sys.modules))' % (LAZY_MODULES,))
+
+    best, loaded = None, []
+    with tempfile.TemporaryDirectory() as cache:
+        env['PYTHONPYCACHEPREFIX'] = cache
+        for _ in range(runs + 1):
+            run = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', code], env=env,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                universal_newlines=True, check=True)
+            for line in run.stderr.splitlines():
+                fields = line.split('|')
+                if len(fields) == 3 and fields[2].strip() == 'taggart':
+                    elapsed = int(fields[1]) / 1e6
+            loaded = run.stdout.split()
+            if best is None:
+                best = float('inf')  # The first run just compiles bytecode
+            else:
+                best = min(best, elapsed)
+    return best, loaded
+
+
+def bench_tag_edges(size=1000000, tags=100, seed=0):
+    """
+    Time bulk tagging through tag_edges(), against one _tag() call per edge.
+
+    @param size: How many (file, tag) edges to apply
+    @type size: int
+    @param tags: How many distinct tags to spread the edges over
+    @type tags: int
+    @param seed: Seed for the random number generator
+    @type seed: int
+    @return: Tagging times, in seconds, keyed by method
+    @rtype: dict
+    """
+    rng = random.Random(seed)
+    edges = [('file_%d' % rng.randrange(size), 'tag_%d' % rng.randrange(tags))
+             for _ in range(size)]
+
+    results = {}
+    reset()
+    results['_tag'] = timed(lambda: [taggart._tag(*edge) for edge in edges])[1]
+    reset()
+    results['tag_edges'] = timed(taggart.tag_edges, edges)[1]
+    return results
+
+
+def bench_save(sizes=(125000, 250000, 500000, 1000000), tags=100, seed=0):
+    """
+    Time save() and measure its peak memory, in every format, at several sizes.
+
+    Both should grow linearly with the number of edges. Peak memory is what
+    save() allocates on top of the tag map itself.
+
+    @param sizes: The numbers of (file, tag) edges to save
+    @type sizes: tuple of int
+    @param tags: How many distinct tags to spread the edges over
+    @type tags: int
+    @param seed: Seed for the random number generator
+    @type seed: int
+    @return: (seconds, peak bytes) pairs, keyed by (format, size)
+    @rtype: dict
+    """
+    rng = random.Random(seed)
+    directory = tempfile.mkdtemp()
+    results = {}
+
+    for size in sizes:
+        reset()
+        taggart.tag_edges(('file_%d' % rng.randrange(size),
+                           'tag_%d' % rng.randrange(tags))
+                          for _ in range(size))
+        for fmt in ('json', 'text', 'yaml'):
+            path = os.path.join(directory, 'tags.' + fmt)
+            elapsed = timed(taggart.save, path)[1]
+            tracemalloc.start()
+            taggart.save(path)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            os.remove(path)
+            results[fmt, size] = elapsed, peak
+
+    os.rmdir(directory)
+    return results
+
+
+def bench_load(size=1000000, tags=100, seed=0):
+    """
+    Time load() of a plain text file, and of a binary snapshot of it.
+
+    A snapshot is read lazily, so the time to look up one tag's files after
+    loading is measured too.
+
+    @param size: How many (file, tag) edges to save and load
+    @type size: int
+    @param tags: How many distinct tags to spread the edges over
+    @type tags: int
+    @param seed: Seed for the random number generator
+    @type seed: int
+    @return: (load seconds, first lookup seconds) pairs, keyed by format
+    @rtype: dict
+    """
+    rng = random.Random(seed)
+    directory = tempfile.mkdtemp()
+    reset()
+    taggart.tag_edges(('file_%d' % rng.randrange(size),
+                       'tag_%d' % rng.randrange(tags)) for _ in range(size))
+
+    paths = {}
+    for fmt in ('text', 'bin'):
+        paths[fmt] = os.path.join(directory, 'tags.' + fmt)
+        taggart.save(paths[fmt], fmt=fmt)
+
+    results = {}
+    for fmt, path in paths.items():
+        reset()
+        elapsed = timed(taggart.load, path, fmt=fmt)[1]
+        results[fmt] = elapsed, timed(taggart.get_files_by_tag, 'tag_0')[1]
+        reset()
+        os.remove(path)
+
+    os.rmdir(directory)
+    return results
+
+
+def bench_parse_yaml(size=200000, tags=100, seed=0):
+    """
+    Time parse_yaml() on dump_yaml() output, against loading it with PyYAML.
+
+    PyYAML is timed with its pure Python loader, as parse_yaml() used before,
+    and with its C loader, which parse_yaml() falls back on. parse_json() of
+    the same tags is timed for comparison.
+
+    @param size: How many (file, tag) edges to dump and parse
+    @type size: int
+    @param tags: How many distinct tags to spread the edges over
+    @type tags: int
+    @param seed: Seed for the random number generator
+    @type seed: int
+    @return: Parse times, in seconds, keyed by method
+    @rtype: dict
+    """
+    import yaml
+
+    rng = random.Random(seed)
+    reset()
+    taggart.tag_edges(('file_%d' % rng.randrange(size),
+                       'tag_%d' % rng.randrange(tags)) for _ in range(size))
+    text, data = taggart.dump_yaml(), taggart.dump_json()
+
+    def load(loader):
+        return {str(k): taggart._postings(str(s) for s in v)
+                for k, v in yaml.load(text, Loader=loader).items()}
+
+    results = {
+        'parse_yaml': timed(taggart.parse_yaml, text)[1],
+        'parse_json': timed(taggart.parse_json, data)[1],
+        'yaml.SafeLoader': timed(load, yaml.SafeLoader)[1],
+    }
+    if hasattr(yaml, 'CSafeLoader'):
+        results['yaml.CSafeLoader'] = timed(load, yaml.CSafeLoader)[1]
+    reset()
+    return results
+
+
+def bench_parallel(size=2000000, tags=100, seed=0):
+    """
+    Time load() of a plain text file with 1, 2, 4, and 8 worker processes.
+
+    load() never uses more workers than os.cpu_count(), so on smaller
+    machines the larger pools are timed at that size instead.
+
+    @param size: How many (file, tag) edges to save and load
+    @type size: int
+    @param tags: How many distinct tags to spread the edges over
+    @type tags: int
+    @param seed: Seed for the random number generator
+    @type seed: int
+    @return: Load times, in seconds, keyed by number of workers
+    @rtype: dict
+    """
+    rng = random.Random(seed)
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'tags.txt')
+    reset()
+    taggart.tag_edges(('file_%d' % rng.randrange(size),
+                       'tag_%d' % rng.randrange(tags)) for _ in range(size))
+    taggart.save(path)
+
+    results = {}
+    for workers in (1, 2, 4, 8):
+        reset()
+        results[workers] = timed(taggart.load, path, workers=workers)[1]
+    reset()
+
+    os.remove(path)
+    os.rmdir(directory)
+    return results
+
+
+def bench_journal(size=1000000, tags=100, changes=100, seed=0):
+    """
+    Time small changes persisted by save() each time, and by the journal.
+
+    @param size: How many (file, tag) edges the catalog holds
+    @type size: int
+    @param tags: How many distinct tags to spread the edges over
+    @type tags: int
+    @param changes: How many single-file tag() calls to persist
+    @type changes: int
+    @param seed: Seed for the random number generator
+    @type seed: int
+    @return: Average seconds per persisted change, keyed by method
+    @rtype: dict
+    """
+    rng = random.Random(seed)
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'tags.txt')
+    reset()
+    taggart.tag_edges(('file_%d' % rng.randrange(size),
+                       'tag_%d' % rng.randrange(tags)) for _ in range(size))
+
+    def save_each():
+        for i in range(changes):
+            taggart.tag('new_%d' % i, 'tag_0')
+            taggart.save(path)
+
+    def journal_each():
+        for i in range(changes):
+            taggart.tag('new_%d' % i, 'tag_1')
+
+    results = {'save': timed(save_each)[1] / changes}
+    taggart.JOURNAL = os.path.join(directory, 'tags.journal')
+    try:
+        results['journal'] = timed(journal_each)[1] / changes
+        results['compact'] = timed(taggart.compact, path)[1]
+    finally:
+        taggart.JOURNAL = None
+
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    os.rmdir(directory)
+    return results
+
+
+def bench_remap(size=1000000, tags=100, seed=0):
+    """
+    Time remap() and measure its peak memory, both ways round.
+
+    @param size: How many (file, tag) edges to remap
+    @type size: int
+    @param tags: How many distinct tags to spread the edges over
+    @type tags: int
+    @param seed: Seed for the random number generator
+    @type seed: int
+    @return: (seconds, peak bytes) pairs, keyed by the mapping remapped to
+    @rtype: dict
+    """
+    rng = random.Random(seed)
+    reset()
+    taggart.tag_edges(('file_%d' % rng.randrange(size),
+                       'tag_%d' % rng.randrange(tags)) for _ in range(size))
+
+    results = {}
+    for mapping in (taggart.FILE_TO_TAG, taggart.TAG_TO_FILE):
+        tracemalloc.start()
+        elapsed = timed(taggart.remap, mapping)[1]
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[mapping] = elapsed, peak
+    return results
+
+
+def bench_rename(size=1000000, tags=100, renames=100000, seed=0):
+    """
+    Time renaming many files, one at a time and all at once, in every mapping.
+
+    @param size: How many (file, tag) edges the catalog holds
+    @type size: int
+    @param tags: How many distinct tags to spread the edges over
+    @type tags: int
+    @param renames: How many files to rename
+    @type renames: int
+    @param seed: Seed for the random number generator
+    @type seed: int
+    @return: Renaming times, in seconds, keyed by (mapping, method)
+    @rtype: dict
+    """
+    rng = random.Random(seed)
+    edges = [('dir_%d/file_%d' % (i % 10, i), 'tag_%d' % rng.randrange(tags))
+             for i in (rng.randrange(size) for _ in range(size))]
+    moves = dict(('dir_0/file_%d' % i, 'moved/file_%d' % i)
+                 for i in range(0, renames * 10, 10))
+
+    def rename_each():
+        for old_file, new_file in moves.items():
+            taggart.rename_file(old_file, new_file)
+
+    results = {}
+    for mapping in (taggart.TAG_TO_FILE, taggart.FILE_TO_TAG,
+                    taggart.BIDIRECTIONAL):
+        for name, method in (('rename_file', rename_each),
+                             ('rename_files', lambda: taggart.rename_files(
+                                 moves)),
+                             ('rename_directory', lambda: (
+                                 taggart.rename_directory('dir_0', 'moved')))):
+            reset(mapping)
+            taggart.tag_edges(edges)
+            results[mapping, name] = timed(method)[1]
+    return results
+
+
+def bench_aio(size=1000000, tags=100, seed=0):
+    """
+    Measure how long load() and save() stall an event loop, with and without
+    taggart.aio.
+
+    @param size: How many (file, tag) edges to save and load
+    @type size: int
+    @param tags: How many distinct tags to spread the edges over
+    @type tags: int
+    @param seed: Seed for the random number generator
+    @type seed: int
+    @return: (seconds, longest stall in seconds) pairs, keyed by
+             (function, 'sync' or 'aio')
+    @rtype: dict
+    """
+    rng = random.Random(seed)
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'tags.txt')
+    reset()
+    taggart.tag_edges(('file_%d' % rng.randrange(size),
+                       'tag_%d' % rng.randrange(tags)) for _ in range(size))
+
+    async def sync_save():
+        taggart.save(path)
+
+    async def aio_save():
+        await aio.save(path)
+
+    async def sync_load():
+        taggart.load(path)
+
+    async def aio_load():
+        await aio.load(path)
+
+    async def measure(coroutine):
+        stalls = [0]
+
+        async def tick():
+            last = time.time()
+            while True:
+                await asyncio.sleep(0.001)
+                now = time.time()
+                stalls[0] = max(stalls[0], now - last)
+                last = now
+
+        ticker = asyncio.ensure_future(tick())
+        await asyncio.sleep(0.01)
+        start = time.time()
+        await coroutine
+        elapsed = time.time() - start
+        await asyncio.sleep(0.01)
+        ticker.cancel()
+        return elapsed, stalls[0]
+
+    results = {}
+    results['save', 'sync'] = asyncio.run(measure(sync_save()))
+    results['save', 'aio'] = asyncio.run(measure(aio_save()))
+    reset()
+    results['load', 'sync'] = asyncio.run(measure(sync_load()))
+    reset()
+    results['load', 'aio'] = asyncio.run(measure(aio_load()))
+    reset()
+
+    os.remove(path)
+    os.rmdir(directory)
+    return results
+
+
+def bench_threads(size=1000000, tags=100, lookups=100000, changes=1000,
+                  seed=0):
+    """
+    Time lookups spread over many threads, while another thread tags files.
+
+    @param size: How many (file, tag) edges the store holds
+    @type size: int
+    @param tags: How many distinct tags to spread the edges over
+    @type tags: int
+    @param lookups: How many get_tags_by_file() calls to make in all
+    @type lookups: int
+    @param changes: How many single-file tag() calls the writer makes
+    @type changes: int
+    @param seed: Seed for the random number generator
+    @type seed: int
+    @return: Seconds until every lookup is done, keyed by number of readers
+    @rtype: dict
+    """
+    rng = random.Random(seed)
+    store = taggart.TagStore(taggart.BIDIRECTIONAL)
+    store.tag_edges(('file_%d' % rng.randrange(size),
+                     'tag_%d' % rng.randrange(tags)) for _ in range(size))
+    names = ['file_%d' % rng.randrange(size) for _ in range(lookups)]
+
+    def read(share):
+        for file_name in share:
+            store.get_tags_by_file(file_name)
+
+    def write():
+        for i in range(changes):
+            store.tag('new_%d' % i, 'tag_0')
+
+    results = {}
+    for readers in (1, 2, 4, 8):
+        threads = [threading.Thread(target=read, args=(names[i::readers],))
+                   for i in range(readers)]
+        threads.append(threading.Thread(target=write))
+
+        def run():
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        results[readers] = timed(run)[1]
+        store.untag(['new_%d' % i for i in range(changes)], 'tag_0')
+    return results
+
+
+def bench_sqlite(size=1000000, tags=100, lookups=1000, seed=0):
+    """
+    Time the same operations on an in-memory store and an SQLite store.
+
+    @param size: How many (file, tag) edges to apply
+    @type size: int
+    @param tags: How many distinct tags to spread the edges over
+    @type tags: int
+    @param lookups: How many get_tags_by_file() calls to make
+    @type lookups: int
+    @param seed: Seed for the random number generator
+    @type seed: int
+    @return: Times, in seconds, keyed by store and operation
+    @rtype: dict
+    """
+    rng = random.Random(seed)
+    edges = [('file_%d' % rng.randrange(size), 'tag_%d' % rng.randrange(tags))
+             for _ in range(size)]
+    names = ['file_%d' % rng.randrange(size) for _ in range(lookups)]
+
+    results = {}
+    directory = tempfile.mkdtemp()
+    try:
+        for name, store in (
+                ('memory', taggart.TagStore(taggart.BIDIRECTIONAL)),
+                ('sqlite', SQLiteStore(os.path.join(directory, 'tags.db')))):
+            results[name, 'tag_edges'] = timed(store.tag_edges, edges)[1]
+            results[name, 'get_files_by_tag'] = timed(
+                store.get_files_by_tag, 'tag_0')[1]
+            results[name, 'get_tags_by_file x%d' % lookups] = timed(
+                lambda: [store.get_tags_by_file(n) for n in names])[1]
+            results[name, 'query'] = timed(
+                store.query, 'tag_0 & (tag_1 | tag_2) & !tag_3')[1]
+            results[name, 'rename_tag'] = timed(
+                store.rename_tag, 'tag_0', 'tag_renamed')[1]
+            if name == 'sqlite':
+                store.close()
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+    return results
+
+
+def catalog_path(index, depth=PATH_DEPTH, fanout=PATH_FANOUT):
+    """
+    Name a file of a generated catalog, in a deep directory hierarchy.
+
+    The directories are the digits of the file's index, in base fanout, so
+    neighbouring files are spread over every directory.
+
+    @param index: The number of the file
+    @type index: int
+    @param depth: How many directories deep the file is
+    @type depth: int
+    @param fanout: How many subdirectories each directory has
+    @type fanout: int
+    @return: The file name, e.g. '/data/d0/d3/d1/d7/d2/d5/file_42.jpg'
+    @rtype: str
+    """
+    parts = ['file_%d.jpg' % index]
+    for _ in range(depth):
+        index, digit = divmod(index, fanout)
+        parts.append('d%d' % digit)
+    parts.append('/data')
+    return '/'.join(reversed(parts))
+
+
+def catalog_tag(index):
+    """Name the index-th most popular tag of a generated catalog."""
+    return 'ns_%d/tag_%d' % (index % TAG_NAMESPACES, index)
+
+
+def generate_catalog(size, tags=None, files=None, exponent=ZIPF_EXPONENT,
+                     depth=PATH_DEPTH, fanout=PATH_FANOUT, seed=0):
+    """
+    Generate a realistic catalog: (file, tag) edges, with Zipf-distributed tag
+    popularity, over files in a deep directory hierarchy.
+
+    Edges are generated as they are consumed, so catalogs of tens of millions
+    of edges need not be held in a list; the same seed always generates the
+    same edges. Some edges may be generated more than once.
+
+    @param size: How many edges to generate
+    @type size: int
+    @param tags: How many distinct tags to choose from, or None for the
+                 square root of size (at least 10)
+    @type tags: int
+    @param files: How many distinct files to choose from, or None for a
+                  quarter of size (at least 1)
+    @type files: int
+    @param exponent: How skewed tag popularity is (see ZIPF_EXPONENT)
+    @type exponent: float
+    @param depth: How many directories deep the files are (see PATH_DEPTH)
+    @type depth: int
+    @param fanout: How many subdirectories each directory has
+    @type fanout: int
+    @param seed: Seed for the random number generator
+    @type seed: int
+    @return: The (file name, tag name) edges
+    @rtype: iterator of tuple
+    """
+    tags = tags or max(10, int(size ** 0.5))
+    files = files or max(1, size // 4)
+    rng = random.Random(seed)
+    names = [catalog_tag(i) for i in range(tags)]
+    weights = list(itertools.accumulate(
+        1.0 / rank ** exponent for rank in range(1, tags + 1)))
+
+    for start in range(0, size, taggart.BATCH_SIZE):
+        batch = min(taggart.BATCH_SIZE, size - start)
+        for tag_name in rng.choices(names, cum_weights=weights, k=batch):
+            yield catalog_path(rng.randrange(files), depth, fanout), tag_name
+
+
+def git_commit():
+    """Get the commit being benchmarked, or None outside a git checkout."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL, universal_newlines=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes=SUITE_SIZES, mappings=SUITE_MAPPINGS,
+              formats=SUITE_FORMATS, samples=SUITE_SAMPLES, seed=0,
+              log=None):
+    """
+    Time every operation on generated catalogs, at several sizes, under
+    several memory mappings.
+
+    Lookups, renames, and single-file changes are timed over a sample of
+    files, tags, and directories picked from the catalog; everything else is
+    timed once, on the whole catalog. Each lookup in a sample asks for
+    something else, so none of them is answered from the query cache.
+
+    @param sizes: The numbers of (file, tag) edges to generate
+    @type sizes: tuple of int
+    @param mappings: The memory mappings to time
+    @type mappings: tuple of str
+    @param formats: The formats to dump, parse, save, and load
+    @type formats: tuple of str
+    @param samples: How many calls to time single-name operations over
+    @type samples: int
+    @param seed: Seed for the random number generator
+    @type seed: int
+    @param log: Called with each result as it is measured, e.g. print
+    @type log: callable
+    @return: A JSON-serializable report: where and when the suite ran, and
+             the results, each with the catalog size and mapping, the
+             operation (and format), how many calls were timed, and how long
+             they took in all and per call, in seconds
+    @rtype: dict
+    """
+    results = []
+    directory = tempfile.mkdtemp()
+
+    def record(operation, seconds, calls=1, fmt=None, **extra):
+        result = dict(size=size, edges=edges, mapping=mapping,
+                      operation=operation, format=fmt, calls=calls,
+                      seconds=seconds, per_call=seconds / calls, **extra)
+        results.append(result)
+        if log:
+            log(result)
+
+    def each(operation, method, args):
+        record(operation, timed(lambda: [method(*a) for a in args])[1],
+               len(args))
+
+    try:
+        for size, mapping in itertools.product(sizes, mappings):
+            rng = random.Random(seed)
+            store = taggart.TagStore(mapping)
+            seconds = timed(
+                store.tag_edges, generate_catalog(size, seed=seed))[1]
+            edges = sum(len(names) for names in store.the_list.values())
+            record('tag_edges', seconds)
+
+            tag_names, seconds = timed(store.get_tags)
+            record('get_tags', seconds)
+            file_names, seconds = timed(store.get_files)
+            record('get_files', seconds)
+            tags = [(name,) for name in rng.sample(
+                tag_names, min(samples, len(tag_names)))]
+            files = [(name,) for name in rng.sample(
+                file_names, min(samples, len(file_names)))]
+            prefixes = [('ns_%d/' % i,) for i in range(TAG_NAMESPACES)]
+            directories = [(name.rsplit('/', 4)[0],) for (name,) in files]
+            queries = [('"%s" & !"%s"' % (a, b),) for (a,), (b,) in zip(
+                tags, tags[1:] + tags[:1])]
+            queries += [('("%s" | "%s") & "%s"' % (catalog_tag(0), a, b),)
+                        for (a,), (b,) in zip(tags, tags[1:] + tags[:1])]
+            new = [(file_name, 'new_tag') for (file_name,) in files]
+
+            each('get_files_by_tag', store.get_files_by_tag, tags)
+            each('get_tags_by_file', store.get_tags_by_file, files)
+            each('get_tags_by_prefix', store.get_tags_by_prefix, prefixes)
+            each('get_files_by_tag_prefix', store.get_files_by_tag_prefix,
+                 prefixes)
+            each('get_files_under', store.get_files_under, directories)
+            each('get_tags_under', store.get_tags_under, directories)
+            each('query', store.query, queries)
+            each('tag', store.tag, new)
+            each('untag', store.untag, new)
+            each('rename_tag', store.rename_tag,
+                 [(name, name + '~') for (name,) in tags] +
+                 [(name + '~', name) for (name,) in tags])
+            each('rename_file', store.rename_file,
+                 [(name, name + '~') for (name,) in files] +
+                 [(name + '~', name) for (name,) in files])
+            each('rename_directory', store.rename_directory,
+                 [(name, name + '~') for (name,) in directories[:10]] +
+                 [(name + '~', name) for (name,) in directories[:10]])
+
+            for fmt in formats:
+                path = os.path.join(directory, 'tags.' + fmt)
+                if fmt != 'bin':
+                    data, seconds = timed(store.dump, fmt)
+                    record('dump', seconds, fmt=fmt)
+                    record('parse', timed(
+                        taggart.parse, data, fmt, mapping)[1], fmt=fmt)
+                    del data
+                record('save', timed(store.save, path, True, fmt)[1], fmt=fmt,
+                       bytes=os.path.getsize(path))
+                loaded = taggart.TagStore(mapping)
+                record('load', timed(loaded.load, path, True, fmt)[1],
+                       fmt=fmt)
+                del loaded
+                os.remove(path)
+
+            for other in taggart.TAG_TO_FILE, taggart.FILE_TO_TAG:
+                if other != mapping:
+                    record('remap', timed(store.remap, other)[1], to=other)
+                    store.remap(mapping)
+            del store
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'started': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'settings': {'samples': samples, 'seed': seed,
+                     'zipf_exponent': ZIPF_EXPONENT, 'path_depth': PATH_DEPTH,
+                     'path_fanout': PATH_FANOUT,
+                     'postings': taggart.POSTINGS},
+        'results': results,
+    }
+
+
+def result_key(result):
+    """Identify what a result of run_suite() measured, across runs."""
+    return (result['size'], result['mapping'], result['operation'],
+            result['format'], result.get('to'))
+
+
+def compare_results(old, new, ratio=REGRESSION_RATIO):
+    """
+    Find the operations that got slower between two runs of run_suite().
+
+    @param old: The earlier report, e.g. from the parent commit
+    @type old: dict
+    @param new: The later report
+    @type new: dict
+    @param ratio: How many times slower an operation may get
+    @type ratio: float
+    @return: (old result, new result) pairs of the operations that got more
+             than ratio times slower per call, slowest first
+    @rtype: list of tuple
+    """
+    before = dict((result_key(result), result) for result in old['results'])
+    slower = [(before[result_key(result)], result)
+              for result in new['results'] if result_key(result) in before and
+              result['per_call'] > before[result_key(result)]['per_call'] *
+              ratio]
+    return sorted(slower, key=lambda pair: pair[0]['per_call'] /
+                  pair[1]['per_call'])
+
+
+def print_result(result):
+    """Print a result of run_suite(), as it is measured."""
+    print('%9d %-10s %-24s %-4s %12.4f ms per call' % (
+        result['size'], result['mapping'], result['operation'],
+        result['format'] or '', result['per_call'] * 1000))
+
+
+def suite(args):
+    """
+    Run the benchmark suite from the command line (see main()).
+
+    @param args: The parsed command-line arguments
+    @type args: argparse.Namespace
+    @return: An error message if anything regressed, else None
+    @rtype: str
+    """
+    report = run_suite(args.sizes, args.mappings, args.formats, args.samples,
+                       args.seed, log=print_result)
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2, sort_keys=True)
+    print('Wrote %d results to %s' % (len(report['results']), args.output))
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            slower = compare_results(json.load(baseline), report, args.ratio)
+        for old, new in slower:
+            print('slower: %s %.2fx' % (' '.join(
+                str(field) for field in result_key(new) if field),
+                new['per_call'] / old['per_call']))
+        if slower:
+            return '%d operations regressed against %s' % (
+                len(slower), args.compare)
+
+
+def main(argv=None):
+    """
+    Run every benchmark and print the results, or run the suite.
+
+    @param argv: The command-line arguments, or None for sys.argv
+    @type argv: list of str
+    """
+    def words(value):
+        return tuple(value.split(','))
+
+    def sizes(value):
+        return tuple(int(size) for size in words(value))
+
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--suite', action='store_true',
+                        help='time every operation on generated catalogs')
+    parser.add_argument('--sizes', default=SUITE_SIZES, type=sizes,
+                        help='catalog sizes, e.g. 10000,1000000,50000000')
+    parser.add_argument('--mappings', default=SUITE_MAPPINGS, type=words,
+                        help='memory mappings, e.g. "tag-->file,file-->tag"')
+    parser.add_argument('--formats', default=SUITE_FORMATS, type=words,
+                        help='formats, e.g. bin,json,text,yaml')
+    parser.add_argument('--samples', default=SUITE_SAMPLES, type=int,
+                        help='calls to time single-name operations over')
+    parser.add_argument('--seed', default=0, type=int,
+                        help='seed for the catalog generator')
+    parser.add_argument('--output', default='bench_results.json',
+                        help='file to write the results to, as JSON')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='results of an earlier run to compare against')
+    parser.add_argument('--ratio', default=REGRESSION_RATIO, type=float,
+                        help='how many times slower counts as a regression')
+    args = parser.parse_args(argv)
+    if args.suite:
+        sys.exit(suite(args))
+
+    elapsed, loaded = bench_import()
+    print('import taggart %29.2f ms %s' % (
+        elapsed * 1000, ' '.join(loaded)))
+    if elapsed > IMPORT_TIME_LIMIT or loaded:
+        sys.exit('import taggart regressed: over %.2f ms, or imported %s' % (
+            IMPORT_TIME_LIMIT * 1000, ', '.join(LAZY_MODULES)))
+    for (fmt, size), (elapsed, peak) in sorted(bench_save().items()):
+        print('save  %-5s %8d edges %17.2f ms %8.2f MB peak' % (
+            fmt, size, elapsed * 1000, peak / 1e6))
+    for fmt, (elapsed, lookup) in sorted(bench_load().items()):
+        print('load  %-5s %26.2f ms %8.2f ms first lookup' % (
+            fmt, elapsed * 1000, lookup * 1000))
+    for name, value in sorted(bench_parse_yaml().items()):
+        print('parse %-37s %8.2f ms' % (name, value * 1000))
+    for workers, value in sorted(bench_parallel().items()):
+        print('load  text %d workers %21.2f ms' % (workers, value * 1000))
+    for name, value in sorted(bench_journal().items()):
+        print('persist %-36s %8.2f ms' % (name, value * 1000))
+    for mapping, (elapsed, peak) in sorted(bench_remap().items()):
+        print('remap %-10s %21.2f ms %8.2f MB peak' % (
+            mapping, elapsed * 1000, peak / 1e6))
+    for (mapping, name), value in sorted(bench_rename().items()):
+        print('rename %-10s %-16s %14.2f ms' % (mapping, name, value * 1000))
+    for (name, how), (elapsed, stall) in sorted(bench_aio().items()):
+        print('aio   %-4s %-4s %23.2f ms %8.2f ms longest stall' % (
+            name, how, elapsed * 1000, stall * 1000))
+    for (name, operation), value in sorted(bench_sqlite().items()):
+        print('store %-6s %-24s %10.2f ms' % (name, operation, value * 1000))
+    for readers, value in sorted(bench_threads().items()):
+        print('threads %d readers + 1 writer %21.2f ms' % (
+            readers, value * 1000))
+    for name, value in sorted(bench_prefix().items()):
+        print('prefix %-37s %8.2f ms' % (name, value * 1000))
+    for (mapping, name), value in sorted(bench_under().items()):
+        print('under %-10s %-16s %15.2f ms' % (mapping, name, value * 1000))
+    for cache_size, (value, stats) in sorted(bench_cache().items()):
+        print('cache %4d entries %21.2f ms %5d hits %5d misses' % (
+            cache_size, value * 1000, stats['hits'], stats['misses']))
+    for (postings, name), value in sorted(bench_sorted().items()):
+        print('read  %-6s %-20s %15.2f %s' % (
+            postings, name, value if name == 'MB' else value * 1000,
+            'MB' if name == 'MB' else 'ms'))
+    for (postings, name), value in sorted(bench_pages().items()):
+        print('page  %-6s %-30s %5.2f ms' % (postings, name, value * 1000))
+    for name, value in sorted(bench_tag_edges().items()):
+        print('tag   %-38s %8.2f ms' % (name, value * 1000))
+    for postings in (taggart.SET_POSTINGS, taggart.ARRAY_POSTINGS):
+        for name, value in sorted(bench_query(postings=postings).items()):
+            print('query %-5s %-32s %8.2f ms' % (
+                postings, name, value * 1000))
+
+
+if __name__ == '__main__':
+    main()
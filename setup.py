@@ -1,7 +1,7 @@
 """Taggart PyPI Package."""
 
 import os
-from distutils.core import setup
+from setuptools import setup
 
 
 def get_version():
@@ -27,7 +27,16 @@ setup_args = dict(
     author='Mark R. Gollnick &#10013;',
     author_email='mark.r.gollnick@gmail.com',
     url='https://github.com/markgollnick/taggart/',
-    py_modules=['taggart']
+    packages=['taggart'],
+    python_requires='>=3.7',
+    classifiers=[
+        'License :: OSI Approved :: Boost Software License 1.0 (BSL-1.0)',
+        'Programming Language :: Python :: 3',
+        'Programming Language :: Python :: 3 :: Only',
+        'Programming Language :: Python :: 3.7',
+        'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+    ]
 )
 
 
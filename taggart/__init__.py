@@ -0,0 +1,4290 @@
+"""Introducing Taggart: The simple file tagger."""
+
+import functools
+import io
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, defaultdict, deque
+from collections.abc import MutableMapping, MutableSet
+from itertools import count, islice
+
+# Initialize the logger
+#   Importing the logging module and installing a handler are put off until
+# something is first logged (see _logger()), as are the imports of modules
+# that only some functions need (yaml, json, multiprocessing, and locale), so
+# that importing taggart stays cheap for short-lived scripts and workers.
+DEBUG = False
+
+
+class _LazyLogger(object):
+    """
+    Stands in for the 'taggart' logger until it is first used.
+
+    Any attribute of this object is that of the real logger, which is set up
+    the first time one is asked for, and then replaces this object as the
+    module's logger.
+    """
+
+    def __getattr__(self, name):
+        return getattr(_logger(), name)
+
+
+def _logger():
+    """
+    Set up the 'taggart' logger, if it has not been set up already.
+
+    @return: The logger
+    @rtype: logging.Logger
+    """
+    global logger, _LOGGER
+    if _LOGGER is None:
+        import logging
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+        _LOGGER = logging.getLogger('taggart')
+        del _LOGGER.handlers[:]
+        _LOGGER.addHandler(handler)
+        _LOGGER.setLevel(logging.WARNING if not DEBUG else logging.DEBUG)
+    if isinstance(logger, _LazyLogger):
+        logger = _LOGGER
+    return _LOGGER
+
+
+_LOGGER = None
+logger = _LazyLogger()
+
+# A single file or tag name, as opposed to a list of them
+basestring = (str, bytes)
+
+# Store the list of files and tags in memory
+#   Each tag (or file) maps to a set of files (or tags), so that adding,
+# removing, and checking for a single file (or tag) all take constant time,
+# regardless of how popular the tag (or file) is. Output is always sorted.
+THE_LIST = {}
+
+# Store the reverse (file-to-tag) index in memory, for bidirectional mapping
+THE_REVERSE_LIST = {}
+
+# MEMORY MAPPING SETTING:
+#   This allows you to use either "tags have files" or "files have tags" design
+# paradigms, depending upon your desired application.
+#   If you intend to refer to files by their tags more often than you intend to
+# reference tags by their files, then you will probably want to use tag-to-file
+# memory mapping, as it will be a lot faster in that case (this is the default
+# setting). If you need to reference tags by their files more often, then you
+# will probably want to use the file-to-tag memory mapping instead.
+#   Either option you choose will result in a speed trade-off for the option
+# that you didn't choose. Alas, such is the dilemma posed by "many-to-many"
+# graph relationships such as file-tagging.
+#   If you can spare the memory, bidirectional mapping avoids the dilemma
+# altogether: THE_LIST is kept as a tag-to-file map, and THE_REVERSE_LIST is
+# kept alongside it as a file-to-tag index, so lookups in either direction are
+# fast. The price is a second copy of every edge (see memory_usage()).
+TAG_TO_FILE = 'tag-->file'
+FILE_TO_TAG = 'file-->tag'
+BIDIRECTIONAL = 'tag<->file'
+MAPPING = TAG_TO_FILE
+
+# POSTINGS SETTING:
+#   By default, each tag (or file) keeps its files (or tags) in a Python set.
+# Sets are fast, but each member costs a hash table slot, and every file name
+# that is parsed from disk becomes a separate string, repeated once per tag.
+#   Array postings intern every file and tag name into a symbol table of
+# dense integer ids, so that each name is stored exactly once, and keep the
+# files of each tag (or the tags of each file) as a compact, sorted array of
+# ids instead, using a fraction of the memory. Names are still accepted and
+# returned as strings. Change this setting before tagging or loading files.
+#   Sorted postings keep each set alongside a sorted list of the same names,
+# which costs one more pointer per name, but lets every lookup and dump copy
+# the names out in order instead of sorting them again (see SortedPostings).
+SET_POSTINGS = 'set'
+ARRAY_POSTINGS = 'array'
+SORTED_POSTINGS = 'sorted'
+POSTINGS = SET_POSTINGS
+
+# Symbol table for array postings: name-to-id and id-to-name
+SYMBOL_IDS = {}
+SYMBOL_NAMES = []
+
+# Locks for the symbol table and for sorting postings, which are shared by
+# every TagStore, and may be used by many threads reading at once
+_INTERN_LOCK = threading.Lock()
+_SETTLE_LOCK = threading.Lock()
+
+# Array type code for symbol ids: unsigned, and at least 32 bits wide
+ID_TYPECODE = 'I' if array('I').itemsize >= 4 else 'L'
+
+# Array postings for very common tags (or files) become bitmaps over all symbol
+# ids once they hold more than this fraction of all symbols: at 32 bits per id,
+# that is where a bitmap becomes smaller than the array. Postings with fewer
+# than BITMAP_MINIMUM ids always stay arrays.
+BITMAP_DENSITY = 1.0 / 32
+BITMAP_MINIMUM = 4096
+
+# The positions of the set bits in every possible byte, for decoding bitmaps
+BYTE_BITS = [tuple(bit for bit in range(8) if byte >> bit & 1)
+             for byte in range(256)]
+
+# Number of (file, tag) edges that tag_edges() and untag_edges() group together
+# before applying them to the tag map
+BATCH_SIZE = 100000
+
+# Number of lines (or other output chunks) that dump_to() joins together
+# before each write
+WRITE_SIZE = 1000
+
+# Number of bytes of a plain text file that each worker process parses at a
+# time, when load() is given more than one worker
+PARALLEL_RANGE_SIZE = 1 << 22
+
+# QUERY CACHE SETTINGS:
+#   Each store keeps the results of its most recent queries (files by tag,
+# tags by file, and query expressions), and hands them out again until the
+# tags or files they depend on change (see QueryCache). At most CACHE_SIZE
+# results are kept; 0 turns the cache off. If CACHE_BYTES is set, the lists
+# of results are also kept under that many bytes, in total.
+#   Only changes made through taggart are seen: code that modifies THE_LIST
+# directly should turn the cache off, which also has the sorted indexes of
+# tag and file names checked against THE_LIST whenever they are used.
+# Replacing THE_LIST is fine.
+CACHE_SIZE = 1024
+CACHE_BYTES = None
+
+# METRICS SETTINGS:
+#   When METRICS is True, every TagStore operation counts its calls, how long
+# they take, and how many (file, tag) edges they add or remove, and lookups
+# that may either use an index or scan the whole tag map count which they did
+# (see stats(), and profile() to turn metrics on for a block of code). Edges
+# are looked up before they are changed, to count only real changes, so this
+# slows writes down a little. When False, an operation pays for one more
+# global lookup and nothing else.
+#   Latency percentiles are worked out from the last METRICS_SAMPLES calls of
+# each operation.
+METRICS = False
+METRICS_SAMPLES = 1000
+PERCENTILES = (50, 90, 99)
+
+# OUTPUT FORMAT SETTING:
+# Available options are 'json', 'text', and 'yaml'. Files may also be saved
+# and loaded in the 'bin' format, a binary snapshot which loads instantly (see
+# the Snapshot class).
+FORMAT = 'text'
+
+# Binary snapshot header: magic number, then the numbers of tags, files, and
+# (file, tag) edges
+BIN_MAGIC = b'TAGGART\x01'
+BIN_HEADER = struct.Struct('<8sQQQ')
+
+# JOURNAL SETTING:
+# The name of a journal file, or None. When set, every change made by tag(),
+# untag(), tag_edges(), untag_edges(), and the rename functions is also
+# appended to the journal, which load() replays on top of whatever it loads.
+# save() marks the journal, so that loading the saved file only replays the
+# changes made after it was saved. See compact().
+JOURNAL = None
+
+# Separator for plain text format
+SEPARATOR = '<==>'
+
+# Query syntax: tag names, '&' (and), '|' (or), '!' (not), and parentheses.
+# Tag names containing any of those characters may be "double-quoted".
+QUERY_TOKEN = re.compile(r'\s*(?:"((?:[^"\\]|\\.)*)"|([&|!()])|([^&|!()"]+))')
+
+# YAML dialect: the "key:" and "- value" lines that dump_yaml() writes, where
+# every key and value is a plain (unquoted) YAML scalar, are parsed without
+# PyYAML (see parse_yaml()). Plain scalars may not start with an indicator, nor
+# contain tabs, ": ", or " #", nor end with ":", nor start or end with spaces.
+YAML_PLAIN = (r'[^ \t\n\-?:,\[\]{}#&*!|>\'"%@`][^ \t\n:#]*'
+              r'(?:(?::(?=[^ \t\n])|(?<! )#| +(?=[^ \t\n#:]|:[^ \t\n]))'
+              r'[^ \t\n:#]*)*')
+YAML_KEY = re.compile(r'(?: *\n)*(%s):\n' % YAML_PLAIN)
+YAML_VALUES = re.compile(r'(?:- +(?:%s) *\n)+' % YAML_PLAIN)
+
+# YAML dialect: plain scalars, or "- value" lines, that YAML may read as
+# something other than a string (a bool, an int, a float, a date, or null),
+# which are handed to PyYAML to be read the way it would read them.
+YAML_IMPLICIT = re.compile(
+    r'^(?:- +)?(?:[-+.]?[0-9]|(?:[-+]?\.(?:inf|Inf|INF|nan|NaN|NAN)|yes|Yes'
+    r'|YES|no|No|NO|true|True|TRUE|false|False|FALSE|on|On|ON|off|Off|OFF'
+    r'|null|Null|NULL|~|<<) *$)', re.MULTILINE)
+
+
+def getext(x):
+    """Return a file extension."""
+    return x[::-1].split('.', 1)[0][::-1]
+
+
+def getfmt(x):
+    """Return the format of a file extension."""
+    return 'text' if x == 'txt' else 'yaml' if x == 'yml' else x
+
+
+class Postings(MutableSet):
+    """
+    A set of file (or tag) names, stored as symbol ids.
+
+    Behaves like a set of str. Sparse postings are kept as a sorted array of
+    ids: new ids are appended and only sorted into place the next time the
+    array is read, so loading many names at once costs a single sort, while
+    removing a name costs a binary search and a shift of the array.
+
+    Once postings hold more than BITMAP_DENSITY of all known symbols, they
+    switch to a bitmap over every symbol id instead, which is then the smaller
+    of the two; they switch back if they fall below half that density. Set
+    operations between two Postings (&, |, and -) work directly on the ids or
+    bits, and return Postings.
+
+    Postings are only sorted or switched after they have been changed, while
+    holding _SETTLE_LOCK, so that many threads may read them at once.
+    """
+
+    __slots__ = ('_ids', '_size', '_bits', '_count', '_dirty')
+
+    def __init__(self, values=()):
+        self._ids = array(ID_TYPECODE)
+        self._size = 0  # Length of the sorted, de-duplicated prefix of _ids
+        self._bits = None  # Bitmap of ids, or None while using _ids
+        self._count = 0  # Number of bits set in _bits
+        self._dirty = False  # Whether changed since last settled
+        for value in values:
+            self.add(value)
+
+    @classmethod
+    def _from_iterable(cls, values):
+        return set(values)
+
+    @classmethod
+    def _from_ids(cls, ids):
+        """Create postings from a sorted, de-duplicated iterable of ids."""
+        postings = cls()
+        postings._ids.extend(ids)
+        postings._size = len(postings._ids)
+        postings._dirty = True
+        postings._settle()
+        return postings
+
+    @classmethod
+    def _from_number(cls, number):
+        """Create postings from a bitmap of ids, given as an int."""
+        postings = cls()
+        postings._bits = bytearray(_to_bytes(number))
+        postings._count = bin(number).count('1')
+        postings._dirty = True
+        postings._settle()
+        return postings
+
+    def _settle(self):
+        """Sort any newly appended ids, and pick the best representation."""
+        if not self._dirty:
+            return
+        with _SETTLE_LOCK:
+            if self._dirty:
+                self._resettle()
+                self._dirty = False
+
+    def _resettle(self):
+        """Settle these postings: see _settle(), which holds the lock."""
+        if self._bits is None:
+            if self._size != len(self._ids):
+                self._ids = array(ID_TYPECODE, sorted(set(self._ids)))
+                self._size = len(self._ids)
+            if self._size >= BITMAP_MINIMUM and (
+                    self._size > len(SYMBOL_NAMES) * BITMAP_DENSITY):
+                bits = bytearray(len(SYMBOL_NAMES) // 8 + 1)
+                for symbol in self._ids:
+                    bits[symbol >> 3] |= 1 << (symbol & 7)
+                self._bits, self._count = bits, self._size
+                self._ids, self._size = array(ID_TYPECODE), 0
+
+        elif self._count < BITMAP_MINIMUM or (
+                self._count < len(SYMBOL_NAMES) * BITMAP_DENSITY / 2):
+            self._ids = array(ID_TYPECODE, self._symbols())
+            self._size = len(self._ids)
+            self._bits, self._count = None, 0
+
+    def _symbols(self):
+        """Iterate over the ids in these postings, in ascending order."""
+        if self._bits is None:
+            return iter(self._ids)
+        return (byte * 8 + bit for byte, value in enumerate(self._bits)
+                if value for bit in BYTE_BITS[value])
+
+    def _number(self):
+        """Get the bitmap of ids in these postings, as an int."""
+        return int.from_bytes(self._bits, 'little')
+
+    def _has(self, symbol):
+        """Test whether these postings hold the given id."""
+        if self._bits is not None:
+            byte = symbol >> 3
+            return byte < len(self._bits) and bool(
+                self._bits[byte] & 1 << (symbol & 7))
+        ids = self._ids
+        i = bisect_left(ids, symbol)
+        return i < len(ids) and ids[i] == symbol
+
+    def __contains__(self, value):
+        symbol = SYMBOL_IDS.get(value)
+        if symbol is None:
+            return False
+        self._settle()
+        return self._has(symbol)
+
+    def __iter__(self):
+        self._settle()
+        names = SYMBOL_NAMES
+        return (names[symbol] for symbol in self._symbols())
+
+    def __len__(self):
+        self._settle()
+        return self._count if self._bits is not None else self._size
+
+    def __and__(self, other):
+        if not isinstance(other, Postings):
+            return MutableSet.__and__(self, other)
+        self._settle()
+        other._settle()
+        if self._bits is not None and other._bits is not None:
+            return Postings._from_number(self._number() & other._number())
+        if self._bits is None and other._bits is None:
+            small, large = sorted((self._ids, other._ids), key=len)
+            return Postings._from_ids(sorted(set(small).intersection(large)))
+        small, large = (self, other) if self._bits is None else (other, self)
+        return Postings._from_ids(
+            symbol for symbol in small._ids if large._has(symbol))
+
+    def __or__(self, other):
+        if not isinstance(other, Postings):
+            return MutableSet.__or__(self, other)
+        self._settle()
+        other._settle()
+        if self._bits is not None and other._bits is not None:
+            return Postings._from_number(self._number() | other._number())
+        return Postings._from_ids(
+            sorted(set(self._symbols()).union(other._symbols())))
+
+    def __sub__(self, other):
+        if not isinstance(other, Postings):
+            return MutableSet.__sub__(self, other)
+        self._settle()
+        other._settle()
+        if self._bits is not None and other._bits is not None:
+            return Postings._from_number(self._number() & ~other._number())
+        return Postings._from_ids(
+            symbol for symbol in self._symbols() if not other._has(symbol))
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, sorted(self))
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + sys.getsizeof(self._ids) + (
+            sys.getsizeof(self._bits) if self._bits is not None else 0)
+
+    def add(self, value):
+        """Add a name to the set."""
+        symbol = _intern(value)
+        self._dirty = True
+
+        if self._bits is not None:
+            byte, bit = symbol >> 3, 1 << (symbol & 7)
+            if byte >= len(self._bits):
+                self._bits.extend(bytearray(byte + 1 - len(self._bits)))
+            if not self._bits[byte] & bit:
+                self._bits[byte] |= bit
+                self._count += 1
+            return
+
+        ids = self._ids
+        size = self._size
+        if size == len(ids) and (not size or ids[-1] < symbol):
+            ids.append(symbol)
+            self._size += 1
+            return
+        i = bisect_left(ids, symbol, 0, size)
+        if i == size or ids[i] != symbol:
+            ids.append(symbol)
+
+    def update(self, values):
+        """Add many names to the set."""
+        if self._bits is not None:
+            for value in values:
+                self.add(value)
+        else:
+            self._dirty = True
+            self._ids.extend(_intern(value) for value in values)
+
+    def difference_update(self, values):
+        """Remove many names from the set, if present."""
+        symbols = set(SYMBOL_IDS[value] for value in values
+                      if value in SYMBOL_IDS)
+        self._settle()
+        self._dirty = True
+
+        if self._bits is not None:
+            for symbol in symbols:
+                if self._has(symbol):
+                    self._bits[symbol >> 3] &= ~(1 << (symbol & 7))
+                    self._count -= 1
+        else:
+            self._ids = array(ID_TYPECODE, (
+                symbol for symbol in self._ids if symbol not in symbols))
+            self._size = len(self._ids)
+
+    def discard(self, value):
+        """Remove a name from the set, if present."""
+        symbol = SYMBOL_IDS.get(value)
+        if symbol is None:
+            return
+        self._settle()
+        self._dirty = True
+
+        if self._bits is not None:
+            if self._has(symbol):
+                self._bits[symbol >> 3] &= ~(1 << (symbol & 7))
+                self._count -= 1
+            return
+
+        ids = self._ids
+        i = bisect_left(ids, symbol)
+        if i < len(ids) and ids[i] == symbol:
+            del ids[i]
+            self._size -= 1
+
+
+class SortedPostings(MutableSet):
+    """
+    A set of file (or tag) names, which also keeps them in sorted order.
+
+    Behaves like a set of str, which iterates in sorted order. Names are kept
+    in a set, for membership tests, and in a sorted list (postings made by set
+    operations only make the set when it is first needed). New names, and
+    removed ones, are put aside and only merged into the list the next time it
+    is read, so adding many names at once costs a sort of the new names and a
+    linear merge, and removing any number of names costs one linear pass.
+
+    The sorted list is replaced, never changed in place, so iterating over
+    the postings sees them as they were when the iteration began, even if
+    they change meanwhile. The & and - operators, with SortedPostings or sets,
+    and the | operator, between two SortedPostings, return SortedPostings in
+    linear time. Like Postings, pending names are merged while holding
+    _SETTLE_LOCK, so that many threads may read them at once.
+    """
+
+    __slots__ = ('_set', '_names', '_pending', '_removed')
+
+    def __init__(self, values=()):
+        self._set = set()
+        self._names = []  # Sorted, and replaced rather than changed
+        self._pending = []  # Added names, not yet merged into _names
+        self._removed = None  # Removed names, not yet dropped, if any
+        self.update(values)
+
+    @classmethod
+    def _from_iterable(cls, values):
+        return set(values)
+
+    @classmethod
+    def _from_sorted(cls, names):
+        """Create postings from a new, sorted list of distinct names."""
+        postings = cls()
+        postings._set = None
+        postings._names = names
+        return postings
+
+    def _members(self):
+        """Get the set of names, making it from the sorted list if needed."""
+        if self._set is None:
+            self._set = set(self._names)
+        return self._set
+
+    def _settled(self):
+        """
+        Get the sorted list of names, merging any pending names in, and
+        dropping any removed names, first.
+        """
+        if self._pending or self._removed:
+            with _SETTLE_LOCK:
+                if self._pending or self._removed:
+                    names = self._names + sorted(self._pending)
+                    names.sort()  # Two sorted runs: merged in linear time
+                    if self._removed:
+                        removed = self._removed
+                        names = [name for name in names
+                                 if name not in removed]
+                    self._names, self._pending = names, []
+                    self._removed = None
+        return self._names
+
+    def __contains__(self, value):
+        return value in self._members()
+
+    def __iter__(self):
+        return iter(self._settled())
+
+    def __len__(self):
+        return len(self._names) + len(self._pending) - len(
+            self._removed or ())
+
+    def __and__(self, other):
+        if isinstance(other, SortedPostings) and len(other) < len(self):
+            return other & self
+        if not isinstance(other, (SortedPostings, set, frozenset)):
+            return MutableSet.__and__(self, other)
+        return SortedPostings._from_sorted(
+            [name for name in self._settled() if name in other])
+
+    __rand__ = __and__
+
+    def __or__(self, other):
+        if not isinstance(other, SortedPostings):
+            return MutableSet.__or__(self, other)
+        members = self._members()
+        names = self._settled() + [
+            name for name in other._settled() if name not in members]
+        names.sort()  # Two sorted runs: merged in linear time
+        return SortedPostings._from_sorted(names)
+
+    def __sub__(self, other):
+        if not isinstance(other, (SortedPostings, set, frozenset)):
+            return MutableSet.__sub__(self, other)
+        return SortedPostings._from_sorted(
+            [name for name in self._settled() if name not in other])
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self._settled())
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + sys.getsizeof(self._members()) + (
+            sys.getsizeof(self._names) + sys.getsizeof(self._pending) +
+            sys.getsizeof(self._removed))
+
+    def add(self, value):
+        """Add a name to the set."""
+        members = self._members()
+        if value not in members:
+            members.add(value)
+            if self._removed and value in self._removed:
+                self._removed.discard(value)  # Still in the list
+            else:
+                self._pending.append(value)
+
+    def update(self, values):
+        """Add many names to the set."""
+        members = self._members()
+        added = set(values)
+        added.difference_update(members)
+        members.update(added)
+        if self._removed:
+            kept = self._removed.intersection(added)
+            self._removed.difference_update(kept)  # Still in the list
+            added.difference_update(kept)
+        self._pending.extend(added)
+
+    def difference_update(self, values):
+        """Remove many names from the set, if present."""
+        members = self._members()
+        removed = members.intersection(values)
+        if removed:
+            members.difference_update(removed)
+            if self._removed is None:
+                self._removed = removed
+            else:
+                self._removed.update(removed)
+
+    def discard(self, value):
+        """Remove a name from the set, if present."""
+        members = self._members()
+        if value in members:
+            members.discard(value)
+            if self._removed is None:
+                self._removed = set()
+            self._removed.add(value)
+
+
+def _sorted(values):
+    """
+    Get a sorted list of names, which must not be modified.
+
+    SortedPostings give their own sorted list, which they never change in
+    place; any other names are sorted into a new list.
+
+    @param values: The names to sort
+    @type values: iterable of str
+    @rtype: list of str
+    """
+    if isinstance(values, SortedPostings):
+        return values._settled()
+    return sorted(values)
+
+
+def _iter_sorted(values):
+    """
+    Iterate over names in sorted order, without copying SortedPostings.
+
+    Other postings are sorted into a new list first. Either way, changes made
+    to the postings while iterating are not seen.
+
+    @param values: The names to iterate over
+    @type values: iterable of str
+    @rtype: iterator of str
+    """
+    return iter(_sorted(values))
+
+
+def _page(names, after=None, limit=None, offset=0):
+    """
+    Get a page of a sorted list of names.
+
+    Pages may be given by position (offset) or by cursor (after): the page
+    starts after the given name, which need not be in the list, so that the
+    last name of one page gives the next page even if names were added or
+    removed meanwhile. Both may be given: the offset then counts from the
+    cursor. Finding the cursor is a binary search, so each page costs time in
+    proportion to its size, plus the logarithm of the list's.
+
+    @param names: The sorted names
+    @type names: list of str
+    @param after: Only get names after this one
+    @type after: str
+    @param limit: The most names to get, or None for all of them
+    @type limit: int
+    @param offset: How many names to skip
+    @type offset: int
+    @return: A new list of names
+    @rtype: list of str
+    @raise ValueError: When limit or offset is negative
+    """
+    if offset < 0 or (limit is not None and limit < 0):
+        raise ValueError('Negative limit or offset')
+
+    start = offset if after is None else bisect_right(names, after) + offset
+    return names[start:] if limit is None else names[start:start + limit]
+
+
+def _to_bytes(number):
+    """Convert a non-negative int into little-endian bytes."""
+    return number.to_bytes((number.bit_length() + 7) // 8, 'little')
+
+
+def _intern(name):
+    """
+    Get the symbol id of a name, adding the name to the symbol table if new.
+
+    @param name: The file or tag name to look up
+    @type name: str
+    @return: The name's symbol id
+    @rtype: int
+    """
+    symbol = SYMBOL_IDS.get(name)
+    if symbol is None:
+        with _INTERN_LOCK:
+            symbol = SYMBOL_IDS.get(name)
+            if symbol is None:
+                SYMBOL_NAMES.append(name)
+                symbol = SYMBOL_IDS[name] = len(SYMBOL_NAMES) - 1
+    return symbol
+
+
+def _postings(values=()):
+    """
+    Create a new set of names, using the configured POSTINGS setting.
+
+    @param values: The names to put in the set
+    @type values: iterable of str
+    @rtype: set, Postings, or SortedPostings
+    """
+    if POSTINGS == ARRAY_POSTINGS:
+        return Postings(values)
+    if POSTINGS == SORTED_POSTINGS:
+        return SortedPostings(values)
+    return set(values)
+
+
+class Snapshot(object):
+    """
+    A binary tag file ('bin' format), memory-mapped for reading.
+
+    The file holds a header, then the byte offsets of every tag name and file
+    name, the offsets of every tag's files and every file's tags, the ids of
+    those files and tags, and finally the names themselves, in UTF-8. Tags and
+    files are both numbered in sorted order, so every list of ids is sorted by
+    name, and names can be found by a binary search over their UTF-8 bytes.
+    Nothing is decoded until it is asked for.
+    """
+
+    def __init__(self, input_file):
+        f = open(input_file, 'rb')
+        try:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            f.close()
+
+        magic, tags, files, edges = BIN_HEADER.unpack_from(self._buffer)
+        if magic != BIN_MAGIC:
+            err = 'File "%s" is not a binary tag file!' % input_file
+            logger.error(err)
+            raise IOError(err)
+
+        offset = BIN_HEADER.size
+        self.tag_names, offset = self._view(offset, tags + 1, 'Q')
+        self.file_names, offset = self._view(offset, files + 1, 'Q')
+        self.tag_offsets, offset = self._view(offset, tags + 1, 'Q')
+        self.file_offsets, offset = self._view(offset, files + 1, 'Q')
+        self.tag_postings, offset = self._view(offset, edges, 'I')
+        self.file_postings, offset = self._view(offset, edges, 'I')
+        self.names = offset
+
+    def _view(self, offset, count, typecode):
+        """Get count little-endian numbers at offset, and the next offset."""
+        size = count * struct.calcsize(typecode)
+        view = memoryview(self._buffer)[offset:offset + size].cast(typecode)
+        if sys.byteorder != 'little':  # NOCOV
+            view = array(typecode, view)
+            view.byteswap()
+        return view, offset + _align(size)
+
+    def name(self, names, index):
+        """Decode the name at the given index of the tag or file names."""
+        start, end = names[index], names[index + 1]
+        return self._buffer[self.names + start:self.names + end].decode(
+            'utf-8')
+
+    def find(self, names, name):
+        """Get the index of a name in the tag or file names, or None."""
+        target = name.encode('utf-8')
+        buffer, base = self._buffer, self.names
+        low, high = 0, len(names) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if buffer[base + names[middle]:base + names[middle + 1]] < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(names) - 1 and buffer[
+                base + names[low]:base + names[low + 1]] == target:
+            return low
+        return None
+
+    def tag_map(self):
+        """Get a tag-to-file map backed by this snapshot."""
+        return MappedTagMap(self, self.tag_names, self.tag_offsets,
+                            self.tag_postings, self.file_names)
+
+    def file_map(self):
+        """Get a file-to-tag map backed by this snapshot."""
+        return MappedTagMap(self, self.file_names, self.file_offsets,
+                            self.file_postings, self.tag_names)
+
+    def edges(self):
+        """Iterate over every (file, tag) pair in this snapshot."""
+        for tag_name, file_names in self.tag_map().items():
+            for file_name in file_names:
+                yield file_name, tag_name
+
+
+class MappedTagMap(MutableMapping):
+    """
+    A tag map (like THE_LIST) that reads its keys and values from a Snapshot.
+
+    Looking up a key costs a binary search over the snapshot, and gives a
+    MappedPostings view of its values. Any keys that are added, replaced, or
+    deleted are kept in memory, on top of the snapshot.
+    """
+
+    def __init__(self, snapshot, keys, offsets, postings, values):
+        self._snapshot = snapshot
+        self._keys = keys
+        self._offsets = offsets
+        self._postings = postings
+        self._values = values
+        self._changed = {}  # Keys that have been added or replaced
+        self._deleted = set()  # Keys of the snapshot that have been deleted
+        self._cache = {}  # Views of keys of the snapshot that were looked up
+
+    def _find(self, key):
+        """Get the index of a key in the snapshot, or None."""
+        return self._snapshot.find(self._keys, key)
+
+    def __getitem__(self, key):
+        if key in self._changed:
+            return self._changed[key]
+        index = None if key in self._deleted else self._find(key)
+        if index is None:
+            raise KeyError(key)
+        if key not in self._cache:
+            # Threads reading at once may both get here: keep the first view
+            self._cache.setdefault(key, MappedPostings(
+                self._snapshot, self._values, self._postings[
+                    self._offsets[index]:self._offsets[index + 1]]))
+        return self._cache[key]
+
+    def __setitem__(self, key, values):
+        self._deleted.discard(key)
+        self._cache.pop(key, None)
+        self._changed[key] = values
+
+    def __delitem__(self, key):
+        if key in self._deleted:
+            raise KeyError(key)
+        in_snapshot = self._find(key) is not None
+        if key not in self._changed and not in_snapshot:
+            raise KeyError(key)
+        self._changed.pop(key, None)
+        self._cache.pop(key, None)
+        if in_snapshot:
+            self._deleted.add(key)
+
+    def __contains__(self, key):
+        if key in self._changed:
+            return True
+        return key not in self._deleted and self._find(key) is not None
+
+    def __iter__(self):
+        for index in range(len(self._keys) - 1):
+            key = self._snapshot.name(self._keys, index)
+            if key not in self._deleted:
+                yield key
+        for key in self._changed:
+            if self._find(key) is None:
+                yield key
+
+    def __len__(self):
+        added = sum(1 for key in self._changed if self._find(key) is None)
+        return len(self._keys) - 1 - len(self._deleted) + added
+
+
+class MappedPostings(MutableSet):
+    """
+    A set of names (like Postings), read from a sorted slice of a Snapshot.
+
+    Names are decoded as they are read, in sorted order. The first change to
+    the set copies it into memory, as a set or Postings, and all further
+    reads and changes go to that copy instead.
+    """
+
+    __slots__ = ('_snapshot', '_names', '_ids', '_copy')
+
+    def __init__(self, snapshot, names, ids):
+        self._snapshot = snapshot
+        self._names = names
+        self._ids = ids
+        self._copy = None
+
+    @classmethod
+    def _from_iterable(cls, values):
+        return set(values)
+
+    def _materialize(self):
+        """Copy the set into memory, before changing it."""
+        if self._copy is None:
+            self._copy = _postings(iter(self))
+        return self._copy
+
+    def __contains__(self, value):
+        if self._copy is not None:
+            return value in self._copy
+        index = self._snapshot.find(self._names, value)
+        if index is None:
+            return False
+        i = bisect_left(self._ids, index)
+        return i < len(self._ids) and self._ids[i] == index
+
+    def __iter__(self):
+        if self._copy is not None:
+            return iter(self._copy)
+        snapshot, names = self._snapshot, self._names
+        return (snapshot.name(names, index) for index in self._ids)
+
+    def __len__(self):
+        return len(self._copy if self._copy is not None else self._ids)
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, sorted(self))
+
+    def add(self, value):
+        """Add a name to the set."""
+        self._materialize().add(value)
+
+    def discard(self, value):
+        """Remove a name from the set, if present."""
+        self._materialize().discard(value)
+
+    def update(self, values):
+        """Add many names to the set."""
+        self._materialize().update(values)
+
+    def difference_update(self, values):
+        """Remove many names from the set, if present."""
+        self._materialize().difference_update(values)
+
+
+def _align(size):
+    """Round a size in bytes up to the next multiple of 8."""
+    return (size + 7) // 8 * 8
+
+
+class ReadWriteLock(object):
+    """
+    A lock that many threads may hold for reading at once, or one for writing.
+
+    Writers wait for current readers to finish, and new readers wait for any
+    waiting writers, so that a steady stream of readers cannot starve them.
+    A thread may take the lock again while holding it, for reading or for
+    writing, and may read while holding it for writing; but a thread holding
+    it only for reading must not then take it for writing.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._readers = 0  # Number of threads holding the lock for reading
+        self._writer = None  # Thread holding the lock for writing, if any
+        self._writes = 0  # Number of times the writer has taken the lock
+        self._waiting = 0  # Number of writers waiting for the lock
+        self._sleeping = 0  # Number of threads waiting on _condition
+        self._local = threading.local()  # Each thread's count of reads
+
+    def _wait(self):
+        """Wait for the lock to change hands, while holding _lock."""
+        self._sleeping += 1
+        self._condition.wait()
+        self._sleeping -= 1
+
+    def _wake(self):
+        """Wake any threads waiting for the lock, while holding _lock."""
+        if self._sleeping:
+            self._condition.notify_all()
+
+    def acquire_read(self):
+        """Take the lock for reading, waiting for any writers first."""
+        local = self._local
+        reads = getattr(local, 'reads', 0)
+        if not reads:
+            if self._writer is threading.current_thread():
+                local.counted = False
+            else:
+                with self._lock:
+                    while self._writer is not None or self._waiting:
+                        self._wait()
+                    self._readers += 1
+                local.counted = True
+        local.reads = reads + 1
+
+    def release_read(self):
+        """Release the lock after reading."""
+        local = self._local
+        local.reads -= 1
+        if not local.reads and local.counted:
+            with self._lock:
+                self._readers -= 1
+                if not self._readers:
+                    self._wake()
+
+    def acquire_write(self):
+        """Take the lock for writing, waiting for all readers to finish."""
+        me = threading.current_thread()
+        if self._writer is me:
+            self._writes += 1
+            return
+        with self._lock:
+            self._waiting += 1
+            while self._writer is not None or self._readers:
+                self._wait()
+            self._waiting -= 1
+            self._writer, self._writes = me, 1
+
+    def release_write(self):
+        """Release the lock after writing."""
+        self._writes -= 1
+        if not self._writes:
+            with self._lock:
+                self._writer = None
+                self._wake()
+
+
+class QueryCache(object):
+    """
+    A least-recently-used cache of query results, for a TagStore.
+
+    Each result is kept with the stamps of the tags and files it depends on,
+    and is only handed out again while they are unchanged: the store stamps
+    the tags and files that each change touches (see TagStore._touch()), so
+    a change to one tag leaves the results for every other tag cached.
+
+    The cache counts its hits, misses, evictions (to stay within CACHE_SIZE
+    and CACHE_BYTES), and invalidations (of results found to be stale); see
+    stats(). Results are kept as lists, which hold the store's own strings,
+    so a result is counted at the size of the list alone.
+
+    Many threads may read a store at once, so the cache has a lock of its own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key: (stamps, result, size)
+        self._bytes = 0
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, stamps):
+        """
+        Get a cached result, if its stamps still match.
+
+        @param key: What was asked for, e.g. ('files', tag name)
+        @type key: tuple
+        @param stamps: The current stamps of the tags and files it depends on
+        @type stamps: tuple
+        @return: The cached result, which must not be modified, or None
+        @rtype: list
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry[0] == stamps:
+                self._entries[key] = entry
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._bytes -= entry[2]
+                self.invalidations += 1
+            self.misses += 1
+            return None
+
+    def put(self, key, stamps, result):
+        """
+        Cache a result, evicting the least recently used ones to make room.
+
+        @param key: What was asked for (see get())
+        @type key: tuple
+        @param stamps: The stamps the result was made with (see get())
+        @type stamps: tuple
+        @param result: The result to cache, which must not be modified
+        @type result: list
+        """
+        size = sys.getsizeof(result)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry[2]
+            self._entries[key] = (stamps, result, size)
+            self._bytes += size
+            while self._entries and (
+                    len(self._entries) > CACHE_SIZE or (
+                        CACHE_BYTES is not None and
+                        self._bytes > CACHE_BYTES)):
+                _, entry = self._entries.popitem(last=False)
+                self._bytes -= entry[2]
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every cached result."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Get the cache's counters, and how much it holds.
+
+        @return: Counts of 'hits', 'misses', 'evictions', 'invalidations', and
+                 'entries', and the estimated 'bytes' held
+        @rtype: dict
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions,
+                    'invalidations': self.invalidations,
+                    'entries': len(self._entries), 'bytes': self._bytes}
+
+
+def _split_path(file_name):
+    """Split a file name at each path separator ('/' or os.sep)."""
+    if os.sep != '/':  # NOCOV
+        file_name = file_name.replace(os.sep, '/')
+    return file_name.split('/')
+
+
+class DirectoryIndex(object):
+    """
+    A tree of file names, by directory, for a TagStore's directory queries.
+
+    Each directory is a dict of its subdirectories, keyed by name, which also
+    holds the files directly inside it under the None key: a dict of their
+    tags (or None, when tags are not kept), keyed by full file name. Each
+    directory's name is stored once, however many files are under it, and
+    the file and tag names are the store's own strings, so finding the files
+    under a directory takes time in proportion to the size of its subtree.
+    Tags are kept as tuples, not sets, since a tuple of a few names takes a
+    fraction of the memory of a set of them (see memory_usage()).
+
+    The store keeps the tree up to date as it changes (see TagStore._touch()).
+    """
+
+    def __init__(self):
+        self.root = {}
+
+    def _directory(self, parts, create=False):
+        """Get the node of a directory, given its name's parts, or None."""
+        node = self.root
+        for part in parts:
+            child = node.get(part)
+            if child is None:
+                if not create:
+                    return None
+                child = node[part] = {}
+            node = child
+        return node
+
+    def get(self, file_name):
+        """
+        Get the tags of a file, if they are kept.
+
+        @param file_name: The name of the file
+        @type file_name: str
+        @return: The file's tags, or None
+        @rtype: tuple
+        """
+        node = self._directory(_split_path(file_name)[:-1])
+        return node and node.get(None, {}).get(file_name)
+
+    def add(self, file_name, tag_names=None):
+        """
+        Add a file, or replace its tags.
+
+        @param file_name: The name of the file
+        @type file_name: str
+        @param tag_names: The file's tags, or None to not keep them
+        @type tag_names: tuple
+        """
+        node = self._directory(_split_path(file_name)[:-1], True)
+        node.setdefault(None, {})[file_name] = tag_names
+
+    def discard(self, file_name):
+        """
+        Remove a file, and any directories it leaves empty.
+
+        @param file_name: The name of the file
+        @type file_name: str
+        """
+        parts = _split_path(file_name)[:-1]
+        nodes = [self.root]
+        for part in parts:
+            node = nodes[-1].get(part)
+            if node is None:
+                return
+            nodes.append(node)
+
+        files = nodes[-1].get(None)
+        if files is None or file_name not in files:
+            return
+        del files[file_name]
+        if not files:
+            del nodes[-1][None]
+        while parts and not nodes[-1]:
+            nodes.pop()
+            del nodes[-1][parts.pop()]
+
+    def under(self, directory):
+        """
+        Get every file under a directory, at any depth, with its tags.
+
+        @param directory: The name of the directory (see
+                          TagStore.get_files_under())
+        @type directory: str
+        @return: (file name, tags) pairs, in no particular order
+        @rtype: list of tuple
+        """
+        directory = directory.rstrip('/' + os.sep)
+        parts = _split_path(directory)
+        parent = self._directory(parts[:-1])
+        if parent is None:
+            return []
+
+        found = []
+        files = parent.get(None, {})
+        if directory in files:
+            found.append((directory, files[directory]))
+
+        nodes = [parent[parts[-1]]] if parts[-1] in parent else []
+        while nodes:
+            for part, child in nodes.pop().items():
+                if part is None:
+                    found.extend(child.items())
+                else:
+                    nodes.append(child)
+        return found
+
+    def memory_usage(self):
+        """
+        Estimate how much memory the tree is using, in bytes.
+
+        File and tag names are the store's own strings, so only directory
+        names are counted, along with the dicts and tuples that hold them.
+
+        @return: A byte count
+        @rtype: int
+        """
+        usage = 0
+        nodes = [self.root]
+        while nodes:
+            node = nodes.pop()
+            usage += sys.getsizeof(node)
+            for part, child in node.items():
+                if part is None:
+                    usage += sys.getsizeof(child) + sum(
+                        sys.getsizeof(tag_names)
+                        for tag_names in child.values()
+                        if tag_names is not None)
+                else:
+                    usage += sys.getsizeof(part)
+                    nodes.append(child)
+        return usage
+
+
+_METRICS_LOCK = threading.Lock()
+_METRICS_LOCAL = threading.local()  # Each thread's edges and call depth
+_OPERATIONS = {}  # Operation name: [calls, seconds, edges, latencies]
+_PATHS = {}  # Lookup name: {'index': count, 'scan': count}
+_timer = getattr(time, 'perf_counter', time.time)
+
+
+def _start():
+    """
+    Note when an operation started, for metrics (see METRICS).
+
+    Only the outermost operation of each thread is recorded: one called by
+    another operation, e.g. tag_edges() by tag(), is part of its caller.
+    """
+    depth = getattr(_METRICS_LOCAL, 'depth', 0)
+    _METRICS_LOCAL.depth = depth + 1
+    if depth:
+        return None, 0
+    return _timer(), getattr(_METRICS_LOCAL, 'edges', 0)
+
+
+def _finish(name, started):
+    """
+    Count a call of an operation, its latency, and the edges it changed.
+
+    @param name: The name of the operation, e.g. 'get_files_by_tag'
+    @type name: str
+    @param started: What _start() returned when the operation started
+    @type started: tuple
+    """
+    _METRICS_LOCAL.depth -= 1
+    if started[0] is None:
+        return
+
+    elapsed = _timer() - started[0]
+    edges = getattr(_METRICS_LOCAL, 'edges', 0) - started[1]
+    with _METRICS_LOCK:
+        metrics = _OPERATIONS.get(name)
+        if metrics is None:
+            metrics = _OPERATIONS[name] = [
+                0, 0.0, 0, deque(maxlen=METRICS_SAMPLES)]
+        metrics[0] += 1
+        metrics[1] += elapsed
+        metrics[2] += edges
+        metrics[3].append(elapsed)
+
+
+def _changed(edges):
+    """
+    Count (file, tag) pairs added or removed, for metrics (see METRICS).
+
+    Changes are counted before they are made, by looking each pair up, so
+    this is only called while METRICS is on.
+
+    @param edges: The number of pairs
+    @type edges: int
+    """
+    _METRICS_LOCAL.edges = getattr(_METRICS_LOCAL, 'edges', 0) + edges
+
+
+def _present(tag_map, groups):
+    """
+    Count the grouped values that are already in a tag map (see _changed()).
+
+    @param tag_map: The tag map to look in
+    @type tag_map: dict
+    @param groups: The values to look for, keyed by tag (or file)
+    @type groups: dict of set
+    @rtype: int
+    """
+    count = 0
+    for key, values in groups.items():
+        postings = tag_map.get(key)
+        if postings is not None:
+            count += sum(1 for value in values if value in postings)
+    return count
+
+
+def _path(name, scan):
+    """
+    Count a lookup that used an index, or had to scan the whole tag map.
+
+    @param name: What was looked up, e.g. 'files_by_tag'
+    @type name: str
+    @param scan: True if the lookup scanned the tag map
+    @type scan: bool
+    """
+    with _METRICS_LOCK:
+        counts = _PATHS.setdefault(name, {'index': 0, 'scan': 0})
+        counts['scan' if scan else 'index'] += 1
+
+
+def _reads(method):
+    """Make a TagStore method hold its store's lock for reading."""
+    name = method.__name__
+
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        started = METRICS and _start()
+        self.lock.acquire_read()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.lock.release_read()
+            if started:
+                _finish(name, started)
+    return locked
+
+
+def _writes(method):
+    """
+    Make a TagStore method hold its store's lock for writing, and count the
+    change in the store's generation.
+    """
+    name = method.__name__
+
+    @functools.wraps(method)
+    def locked(self, *args, **kwargs):
+        started = METRICS and _start()
+        self.lock.acquire_write()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.generation += 1
+            self.lock.release_write()
+            if started:
+                _finish(name, started)
+    return locked
+
+
+class TagStore(object):
+    """
+    A catalog of tags, held in memory: its tag map and its memory mapping.
+
+    Every store is independent of every other, so one process may hold many
+    catalogs at once. The module-level functions (tag(), load(), query(),
+    and so on) all work on DEFAULT_STORE, whose state is kept in the module's
+    THE_LIST, THE_REVERSE_LIST, MAPPING, and JOURNAL globals.
+
+    Stores are safe to share between threads. Each store has a ReadWriteLock:
+    any number of threads may render, save, or query a store at once, while
+    changing, loading, or remapping it takes the store for itself. The other
+    module settings (POSTINGS, BATCH_SIZE, FORMAT, and so on) are shared by
+    every store, and the symbol table used by array postings is shared, too.
+    """
+
+    def __init__(self, mapping=TAG_TO_FILE, journal=None):
+        """
+        Create an empty store.
+
+        @param mapping: The memory mapping scheme to use (see MAPPING)
+        @type mapping: str: 'tag-->file', 'file-->tag', or 'tag<->file'
+        @param journal: The name of a journal file, or None (see JOURNAL)
+        @type journal: str
+        """
+        self.lock = ReadWriteLock()
+        self.generation = 0  # Number of changes made to the store
+        self._indexes = {}  # Sorted names, by kind: see _index()
+        self._directories = None  # See _directory_index()
+        self._init_cache()
+        self.the_list = {}
+        self.the_reverse_list = {}
+        self.mapping = mapping
+        self.journal = journal
+
+    def _init_cache(self):
+        """Start with an empty query cache (see QueryCache)."""
+        self.cache = QueryCache()
+        self._cached_maps = None  # The maps the cached results came from
+        self._clock = count(1)  # Stamps for changes: see _touch()
+        self._tag_generations = {}  # Latest stamp of each tag
+        self._file_generations = {}  # Latest stamp of each file
+
+    def _touch(self, edges):
+        """
+        Stamp the tags and files of changed (file, tag) pairs, so that cached
+        results which depend on them are no longer used (see QueryCache).
+
+        Stamps come from a counter that only goes up, so nothing needs to be
+        stamped while the cache is empty. The None tag is stamped by every
+        change, for results that depend on every tag.
+
+        The directory tree, if one has been built, is brought up to date with
+        the changed pairs here, too (see _directory_index()).
+
+        @param edges: The (file name, tag name) pairs that changed
+        @type edges: iterable of tuple
+        """
+        if self._directories is not None:
+            edges = list(edges)
+            self._update_directories(edges)
+
+        if not self.cache:
+            return
+
+        stamp = next(self._clock)
+        tags, files = self._tag_generations, self._file_generations
+        tags[None] = stamp
+        for file_name, tag_name in edges:
+            files[file_name] = stamp
+            tags[tag_name] = stamp
+
+    def _invalidate(self):
+        """Drop every cached result, e.g. after loading or remapping."""
+        self._directories = None
+        self.cache.clear()
+        self._cached_maps = None
+        self._tag_generations.clear()
+        self._file_generations.clear()
+
+    def _cached(self, key, tag_names, file_names, compute, *args):
+        """
+        Get a query result from the cache, or compute it and cache it.
+
+        The whole cache is dropped if the store's tag maps or mapping have
+        been replaced since it was filled, e.g. by setting THE_LIST.
+
+        @param key: What is being asked for (see QueryCache.get())
+        @type key: tuple
+        @param tag_names: The tags the result depends on
+        @type tag_names: iterable of str
+        @param file_names: The files the result depends on
+        @type file_names: iterable of str
+        @param compute: The method to compute the result with, given args
+        @type compute: callable
+        @return: The result, which must not be modified
+        @rtype: list
+        """
+        if not CACHE_SIZE:
+            return compute(*args)
+
+        the_list, the_reverse_list = self.the_list, self.the_reverse_list
+        maps = self._cached_maps
+        if (maps is None or maps[0] is not the_list or
+                maps[1] is not the_reverse_list or maps[2] != self.mapping):
+            self._invalidate()
+            self._cached_maps = (the_list, the_reverse_list, self.mapping)
+
+        tags, files = self._tag_generations, self._file_generations
+        stamps = (tuple(tags.get(tag_name, 0) for tag_name in tag_names) +
+                  tuple(files.get(file_name, 0) for file_name in file_names))
+
+        result = self.cache.get(key, stamps)
+        if result is None:
+            result = compute(*args)
+            self.cache.put(key, stamps, result)
+        return result
+
+    @_reads
+    def cache_stats(self):
+        """
+        Get the query cache's hit, miss, and eviction counts.
+
+        @return: See QueryCache.stats()
+        @rtype: dict
+        """
+        return self.cache.stats()
+
+    def _tag(self, file_name, tag_name, assert_exists=False):
+        """
+        Add a single tag to a single file, optionally asserting file existence.
+
+        @param file_name: Relative or absolute path to the file to tag
+        @type file_name: str
+        @param tag_name: The tag to apply to the file
+        @type tag_name: str
+        @param assert_exists: If True, don't tag nonexistent files
+        @type assert_exists: bool
+        @raise IOError: When assert_exists is True and file_name does not exist
+        """
+        if assert_exists and not os.path.exists(file_name):
+            err = 'File "%s" not found!' % file_name
+            logger.error(err)
+            raise IOError(err)
+
+        if METRICS:
+            _changed(1 - self._has_edge(file_name, tag_name))
+
+        if self.mapping == FILE_TO_TAG:
+            _add(self.the_list, file_name, tag_name)
+
+        else:
+            _add(self.the_list, tag_name, file_name)
+
+            if self.mapping == BIDIRECTIONAL:
+                _add(self.the_reverse_list, file_name, tag_name)
+
+        self._touch([(file_name, tag_name)])
+
+    @_writes
+    def tag(self, file_names, tag_names, assert_exists=False):
+        """
+        Tag multiple files with multiple tags all at once.
+
+        @param file_names: A file or a list of files to tag
+        @type file_names: str or list
+        @param tag_names: A tag or a list of tags to apply to the file or files
+        @type tag_names: str or list
+        @param assert_exists: If True, prevents tagging nonexistant files
+        @type assert_exists: bool
+        """
+        logger.debug('Using %s memory mapping.', self.mapping)
+
+        if isinstance(file_names, basestring):
+            file_names = [file_names]
+
+        if isinstance(tag_names, basestring):
+            tag_names = [tag_names]
+
+        self.tag_edges(((file_name, tag_name)
+                        for file_name in file_names
+                        for tag_name in tag_names), assert_exists)
+
+    @_writes
+    def tag_edges(self, edges, assert_exists=False):
+        """
+        Apply many (file, tag) pairs all at once.
+
+        Edges are read in batches of BATCH_SIZE, grouped by tag (or by file,
+        for file-to-tag maps), and de-duplicated, so that each group is applied
+        to the tag map in a single update. When asserting file existence, each
+        distinct file is checked only once, and a single warning is logged for
+        each file that does not exist.
+
+        @param edges: The (file name, tag name) pairs to apply
+        @type edges: iterable of tuple
+        @param assert_exists: If True, prevents tagging nonexistant files
+        @type assert_exists: bool
+        """
+        logger.debug('Using %s memory mapping.', self.mapping)
+
+        exists = {}
+
+        for batch in _batches(edges):
+            if assert_exists:
+                for file_name, _ in batch:
+                    if file_name not in exists:
+                        exists[file_name] = os.path.exists(file_name)
+                        if not exists[file_name]:
+                            logger.warn('File "%s" not found!', file_name)
+                batch = [edge for edge in batch if exists[edge[0]]]
+
+            self._tag_batch(batch)
+            self._journal('tag', batch)
+
+    def _tag_batch(self, edges):
+        """
+        Apply a batch of (file, tag) pairs, without journaling them.
+
+        @param edges: The (file name, tag name) pairs to apply
+        @type edges: list of tuple
+        """
+        groups = self._group(edges)
+        if METRICS:
+            _changed(sum(len(values) for values in groups[0][1].values()) -
+                     _present(*groups[0]))
+
+        for tag_map, group in groups:
+            _merge(tag_map, group)
+
+        self._touch(edges)
+
+    def _group(self, edges):
+        """
+        Group (file, tag) pairs by the keys of each in-memory tag map.
+
+        @param edges: The (file name, tag name) pairs to group
+        @type edges: list of tuple
+        @return: (tag map, {key: set of values}) pairs: one for the tag map,
+                 and one for the reverse index when using bidirectional
+                 mapping
+        @rtype: list of tuple
+        """
+        forward = defaultdict(set)
+        reverse = defaultdict(set)
+
+        if self.mapping == FILE_TO_TAG:
+            for file_name, tag_name in edges:
+                forward[file_name].add(tag_name)
+        else:
+            for file_name, tag_name in edges:
+                forward[tag_name].add(file_name)
+            if self.mapping == BIDIRECTIONAL:
+                for file_name, tag_name in edges:
+                    reverse[file_name].add(tag_name)
+
+        if self.mapping == BIDIRECTIONAL:
+            return [(self.the_list, forward), (self.the_reverse_list, reverse)]
+        return [(self.the_list, forward)]
+
+    def _untag(self, file_name, tag_name):
+        """
+        Remove a single tag from a single file.
+
+        @param file_name: The tagged file
+        @type file_name: str
+        @param tag_name: The tag to remove
+        @type tag_name: str
+        """
+        if METRICS:
+            _changed(self._has_edge(file_name, tag_name))
+
+        if self.mapping == FILE_TO_TAG:
+            _remove(self.the_list, file_name, tag_name)
+
+        else:
+            _remove(self.the_list, tag_name, file_name)
+
+            if self.mapping == BIDIRECTIONAL:
+                _remove(self.the_reverse_list, file_name, tag_name)
+
+        self._touch([(file_name, tag_name)])
+
+    @_writes
+    def untag(self, file_names, tag_names):
+        """
+        Remove multiple tags from multiple files all at once.
+
+        @param file_names: A file or list of files from which to remove tags
+        @type file_names: str or list
+        @param tag_names: A tag or tags to remove from the file or files
+        @type tag_names: str or list
+        """
+        logger.debug('Using %s memory mapping.', self.mapping)
+
+        if isinstance(file_names, basestring):
+            file_names = [file_names]
+
+        if isinstance(tag_names, basestring):
+            tag_names = [tag_names]
+
+        self.untag_edges((file_name, tag_name)
+                         for file_name in file_names
+                         for tag_name in tag_names)
+
+    @_writes
+    def untag_edges(self, edges):
+        """
+        Remove many (file, tag) pairs all at once.
+
+        Like tag_edges(), edges are grouped and de-duplicated in batches, so
+        that each group is removed from the tag map in a single update.
+
+        @param edges: The (file name, tag name) pairs to remove
+        @type edges: iterable of tuple
+        """
+        logger.debug('Using %s memory mapping.', self.mapping)
+
+        for batch in _batches(edges):
+            self._untag_batch(batch)
+            self._journal('untag', batch)
+
+    def _untag_batch(self, edges):
+        """
+        Remove a batch of (file, tag) pairs, without journaling them.
+
+        @param edges: The (file name, tag name) pairs to remove
+        @type edges: list of tuple
+        """
+        groups = self._group(edges)
+        if METRICS:
+            _changed(_present(*groups[0]))
+
+        for tag_map, group in groups:
+            for key, values in group.items():
+                if key not in tag_map:
+                    continue
+                tag_map[key].difference_update(values)
+                if not tag_map[key]:
+                    del tag_map[key]
+
+        self._touch(edges)
+
+    @_reads
+    def dump_json(self):
+        """
+        Render the tag list in JSON format.
+
+        @return: the JSONified tag list
+        @rtype: str
+        """
+        return ''.join(self._render_json())
+
+    def _render_json(self):
+        """
+        Render the tag list in JSON format, one key or value at a time.
+
+        The output is identical to json.dumps(..., sort_keys=True), with each
+        list of values sorted.
+
+        @return: A generator of output chunks
+        @rtype: generator of str
+        """
+        import json
+
+        # As used by json.dumps()
+        encode = json.encoder.encode_basestring_ascii
+
+        yield '{'
+
+        for i, key in enumerate(self._key_index()):
+            yield (', ' if i else '') + encode(key) + ': ['
+            for j, value in enumerate(_sorted(self.the_list[key])):
+                yield (', ' if j else '') + encode(value)
+            yield ']'
+
+        yield '}'
+
+    @_reads
+    def dump_text(self, sort=False):
+        """
+        Render the tag list in plain text.
+
+        @param sort: If True, sort the output alphabetically
+        @type sort: str
+        @return: The tag associations (graph edges) in plain text format
+        @rtype: str
+        """
+        return ''.join(self._render_text(sort))
+
+    def _render_text(self, sort=False):
+        """
+        Render the tag list in plain text, one line at a time.
+
+        Tag-to-file maps are already grouped by tag, so sorting their output
+        only takes sorting the tags by the prefix they give each line.
+        File-to-tag maps must collect every (tag, file) pair before they can
+        be sorted, which they are in the same order, so that both give the
+        same output.
+
+        @param sort: If True, sort the output alphabetically
+        @type sort: str
+        @return: A generator of output lines
+        @rtype: generator of str
+        """
+        if self.mapping != FILE_TO_TAG:
+            tag_names = sorted(
+                self.the_list, key=lambda tag_name: tag_name + SEPARATOR
+            ) if sort else self._key_index()
+            for tag_name in tag_names:
+                prefix = tag_name + SEPARATOR
+                for file_name in _sorted(self.the_list[tag_name]):
+                    yield prefix + file_name + os.linesep
+
+        elif sort:
+            edges = sorted((tag_name + SEPARATOR, file_name)
+                           for file_name, tag_names in self.the_list.items()
+                           for tag_name in tag_names)
+            for prefix, file_name in edges:
+                yield prefix + file_name + os.linesep
+
+        else:
+            for file_name in self._key_index():
+                suffix = SEPARATOR + file_name + os.linesep
+                for tag_name in _sorted(self.the_list[file_name]):
+                    yield tag_name + suffix
+
+    @_reads
+    def dump_yaml(self):
+        """
+        Render the tag list in YAML format.
+
+        @return: the YAMLified tag list
+        @rtype: str
+        """
+        return ''.join(self._render_yaml())
+
+    def _render_yaml(self):
+        """
+        Render the tag list in YAML format, one line at a time.
+
+        @return: A generator of output lines
+        @rtype: generator of str
+        """
+        for key in self._key_index():
+            yield key + ':' + os.linesep
+            for value in _sorted(self.the_list[key]):
+                yield '- ' + value + os.linesep
+
+    @_reads
+    def dump(self, fmt=FORMAT):
+        """
+        Render output using a number of different formats.
+
+        Supported options are 'json', 'text', and 'yaml'.
+
+        @param fmt: The format to render
+        @type fmt: str
+        @return: Rendered tag output
+        @rtype: str
+        """
+        logger.debug('Using %s memory mapping.', self.mapping)
+
+        if fmt == 'json':
+            return self.dump_json()
+        elif fmt == 'yaml':
+            return self.dump_yaml()
+        else:
+            return self.dump_text()
+
+    @_reads
+    def dump_to(self, output, fmt=FORMAT):
+        """
+        Write output, using a number of different formats, to a file object.
+
+        The output is identical to that of dump(), but it is written out in
+        chunks as it is rendered, instead of being built up in memory first.
+
+        @param output: The file (or file-like object) to write to
+        @type output: file
+        @param fmt: The format to render: 'json', 'text', or 'yaml'
+        @type fmt: str
+        """
+        logger.debug('Using %s memory mapping.', self.mapping)
+
+        if fmt == 'json':
+            chunks = self._render_json()
+        elif fmt == 'yaml':
+            chunks = self._render_yaml()
+        else:
+            chunks = self._render_text()
+
+        chunks = iter(chunks)
+        batch = list(islice(chunks, WRITE_SIZE))
+
+        while batch:
+            output.write(''.join(batch))
+            batch = list(islice(chunks, WRITE_SIZE))
+
+    @_reads
+    def dump_bin(self, output):
+        """
+        Write the tag map to a file object in the binary 'bin' format.
+
+        See the Snapshot class for the layout. Both directions of the map are
+        written, whatever the memory mapping, so that a snapshot may be loaded
+        under any mapping without remapping it.
+
+        @param output: The binary file (or file-like object) to write to
+        @type output: file
+        """
+        logger.debug('Using %s memory mapping.', self.mapping)
+
+        forward = self.the_list
+        if self.mapping == FILE_TO_TAG:
+            forward = _transpose(forward)
+        tag_names = sorted(forward)
+        file_names = self.get_files()
+        file_ids = dict((name, i) for i, name in enumerate(file_names))
+
+        tag_offsets = array('Q', [0])
+        tag_postings = array('I')
+        degrees = [0] * (len(file_names) + 1)
+        for tag_name in tag_names:
+            ids = sorted(file_ids[name] for name in forward[tag_name])
+            tag_postings.extend(ids)
+            tag_offsets.append(len(tag_postings))
+            for i in ids:
+                degrees[i + 1] += 1
+
+        # Tags are visited in order, so each file's tags come out sorted
+        file_offsets = array('Q', degrees)
+        for i in range(len(file_names)):
+            file_offsets[i + 1] += file_offsets[i]
+        cursor = array('Q', file_offsets)
+        file_postings = array('I', [0]) * len(tag_postings)
+        for tag_id in range(len(tag_names)):
+            for i in range(tag_offsets[tag_id], tag_offsets[tag_id + 1]):
+                file_id = tag_postings[i]
+                file_postings[cursor[file_id]] = tag_id
+                cursor[file_id] += 1
+
+        tag_blob, tag_name_offsets = _name_blob(tag_names, 0)
+        file_blob, file_name_offsets = _name_blob(file_names, len(tag_blob))
+
+        output.write(BIN_HEADER.pack(BIN_MAGIC, len(tag_names),
+                                     len(file_names), len(tag_postings)))
+        for numbers in (tag_name_offsets, file_name_offsets, tag_offsets,
+                        file_offsets, tag_postings, file_postings):
+            if sys.byteorder != 'little':  # NOCOV
+                numbers.byteswap()
+            data = numbers.tobytes()
+            output.write(data)
+            output.write(b'\0' * (_align(len(data)) - len(data)))
+        output.write(tag_blob)
+        output.write(file_blob)
+
+    @_reads
+    def save(self, output_file, overwrite=True, fmt=None):
+        """
+        Save the list of tags to a file.
+
+        The output is streamed to the file as it is rendered (see dump_to()).
+        Binary ('bin') files are written alongside the old file, then moved
+        over it, so that a snapshot loaded from the old file can still be read.
+
+        If the store has a journal, a checkpoint is then appended to it, so
+        that load()ing the file only replays the changes made after it was
+        saved (see replay()).
+
+        @param output_file: The name of the file to save
+        @type output_file: str
+        @param overwrite: If True, overwrite the file if it exists
+        @type overwrite: bool
+        @param fmt: The format to save the output in: bin, json, text, or yaml
+        @type fmt: str: 'bin', 'json', 'text', or 'yaml'
+        @raise IOError: When overwrite is False and output_file already exists
+        """
+        logger.debug('Using %s memory mapping.', self.mapping)
+
+        if not overwrite and os.path.exists(output_file):
+            err = 'File "%s" already exists!' % output_file
+            logger.error(err)
+            raise IOError(err)
+
+        fmt = fmt if fmt else getfmt(getext(output_file).lower())
+
+        if fmt != 'bin':
+            f = open(output_file, 'w')
+            try:
+                self.dump_to(f, fmt)
+            finally:
+                f.close()
+
+        else:
+            # The file may be memory-mapped by a loaded snapshot, which would
+            # break if the file were overwritten, so a new file is written and
+            # moved over it
+            f = open(output_file + '.tmp', 'wb')
+            try:
+                self.dump_bin(f)
+            finally:
+                f.close()
+            getattr(os, 'replace', os.rename)(
+                output_file + '.tmp', output_file)
+
+        self._journal('save', os.path.abspath(output_file))
+
+    @_writes
+    def init(self, data, overwrite=False, fmt=FORMAT):
+        """
+        Initialize the in-memory tag map from string input.
+
+        @param data: The data to parse and add to the in-memory map
+        @type data: str
+        @param overwrite: If True, wipe the existing tag list in memory, if
+                          any. If False, append to the existing tag list in
+                          memory.
+        @type overwrite: bool
+        @param fmt: The format to use to parse the input: json, text, or yaml
+        @type fmt: str: 'json', 'text', or 'yaml'
+        """
+        tag_map = parse(data, fmt, self.mapping)
+        self._invalidate()
+
+        if overwrite:
+            self.the_list = {}
+
+        if METRICS:
+            _changed(sum(len(values) for values in tag_map.values()) -
+                     _present(self.the_list, tag_map))
+        _merge(self.the_list, tag_map)
+
+        if self.mapping == BIDIRECTIONAL:
+            self._reindex()
+
+    def _reindex(self):
+        """Rebuild the reverse (file-to-tag) index from the tag-to-file map."""
+
+        self.the_reverse_list = _transpose(self.the_list)
+
+    @_writes
+    def load(self, input_file, overwrite=False, fmt=None, workers=1):
+        """
+        Load a list of tags from a file.
+
+        Plain text files are streamed straight into the in-memory tag map, one
+        batch of edges at a time (see iter_edges()), so the whole file is never
+        held in memory at once. Given more than one worker, they are parsed by
+        a pool of that many processes instead (see _load_parallel()), but
+        never more workers than there are CPUs: extra workers only contend for
+        the same CPUs, and a pool of one is slower than no pool at all. JSON
+        and YAML files are read whole and passed to init().
+
+        Binary ('bin') files are memory-mapped instead of read (see Snapshot).
+        If nothing is in memory yet, or overwrite is True, the tag map is read
+        from the snapshot lazily, as it is used, so loading takes no time at
+        all; otherwise, its edges are merged into the tag map in memory.
+
+        Finally, if the store has a journal, every change recorded in it since
+        input_file was last saved (or, if it never was, since the journal was
+        last compacted) is replayed on top (see replay()).
+
+        @param input_file: The name of the file to load
+        @type input_file: str
+        @param overwrite: If True, wipe the existing tag list in memory, if
+                          any. If False, append to the existing tag list in
+                          memory.
+        @type overwrite: bool
+        @param fmt: The format to use to parse the input: bin, json, text, or
+                    yaml
+        @type fmt: str: 'bin', 'json', 'text', or 'yaml'
+        @param workers: The number of processes to parse plain text files
+                        with, up to os.cpu_count()
+        @type workers: int
+        @raise IOError: When input_file does not exist, or is not a bin file
+        """
+        if not os.path.exists(input_file):
+            err = 'File "%s" not found!' % input_file
+            logger.error(err)
+            raise IOError(err)
+
+        fmt = fmt if fmt else getfmt(getext(input_file).lower())
+        self._invalidate()
+
+        if fmt == 'text':
+            if overwrite:
+                self.the_list = {}
+                self.the_reverse_list = {}
+            cpus = os.cpu_count() or 1
+            if workers > cpus:
+                logger.warning('Loading with %d workers, not %d: there are '
+                               'only %d CPUs.', cpus, workers, cpus)
+                workers = cpus
+            if workers > 1:
+                self._load_parallel(input_file, workers)
+            else:
+                for batch in _batches(iter_edges(input_file)):
+                    self._tag_batch(batch)
+
+        elif fmt == 'bin':
+            snapshot = Snapshot(input_file)
+            if overwrite or not self.the_list:
+                if self.mapping == FILE_TO_TAG:
+                    self.the_list = snapshot.file_map()
+                else:
+                    self.the_list = snapshot.tag_map()
+                self.the_reverse_list = snapshot.file_map() if (
+                    self.mapping == BIDIRECTIONAL) else {}
+            else:
+                for batch in _batches(snapshot.edges()):
+                    self._tag_batch(batch)
+
+        else:
+            f = open(input_file, 'r')
+            data = f.read()
+            f.close()
+
+            self.init(data, overwrite, fmt)
+
+        if self.journal is not None and os.path.exists(self.journal):
+            self.replay(self.journal, input_file)
+
+    def _load_parallel(self, input_file, workers):
+        """
+        Load a plain text file with a pool of worker processes.
+
+        The file is split into line-aligned ranges of about
+        PARALLEL_RANGE_SIZE bytes (see _ranges()). Each worker parses and
+        groups one range at a time (see _parse_range()), and the groups are
+        merged into the tag map as they come back, in whatever order the
+        ranges are finished. Where processes are spawned rather than forked
+        (e.g. on Windows), the calling script must be importable, with its
+        own code guarded by `if __name__ == '__main__':`.
+
+        @param input_file: The name of the plain text file to load
+        @type input_file: str
+        @param workers: The number of worker processes to use
+        @type workers: int
+        """
+        tag_maps = [self.the_list]
+        if self.mapping == BIDIRECTIONAL:
+            tag_maps.append(self.the_reverse_list)
+
+        jobs = [(input_file, start, end, self.mapping)
+                for start, end in _ranges(input_file, PARALLEL_RANGE_SIZE)]
+
+        import multiprocessing
+
+        pool = multiprocessing.Pool(workers)
+        try:
+            for groups in pool.imap_unordered(_parse_range, jobs):
+                if METRICS:
+                    _changed(sum(len(values) for values in groups[0].values())
+                             - _present(tag_maps[0], groups[0]))
+                for tag_map, group in zip(tag_maps, groups):
+                    _merge(tag_map, group)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def _journal(self, *record):
+        """
+        Append a record of a change to the journal, if the store has one.
+
+        Each record is a JSON array on a line of its own: ["tag", edges],
+        ["untag", edges], ["rename_tag", old, new], ["rename_file", old, new],
+        ["rename_files", renames], or ["rename_directory", old, new], where
+        edges is a list of [file name, tag name] pairs, and renames maps old
+        file names to new ones. ["save", file name] is a checkpoint, for the
+        absolute name of a file the tags were saved to (see replay()). Records
+        are flushed to disk before returning.
+
+        @param record: The name of the change, followed by its arguments
+        @type record: tuple
+        """
+        if self.journal is None:
+            return
+
+        import json
+
+        f = open(self.journal, 'a')
+        try:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            f.close()
+
+    @_writes
+    def replay(self, journal_file, since=None):
+        """
+        Apply every change recorded in a journal file to the tags in memory.
+
+        Changes are replayed as-is, and are not journaled again. A record that
+        was cut short (e.g. by a crash while it was being written) can only be
+        the last in the journal, and is skipped with a warning.
+
+        Given the name of a saved file, only the changes recorded after its
+        last checkpoint (see save()) are replayed: the file already holds the
+        ones before it. The journal is then read twice, once to find the
+        checkpoint. Without a checkpoint for the file, every change is
+        replayed.
+
+        @param journal_file: The name of the journal file to replay
+        @type journal_file: str
+        @param since: The name of a file the tags were saved to, or None
+        @type since: str
+        """
+        logger.debug('Using %s memory mapping.', self.mapping)
+
+        replayers = {
+            'tag': self._tag_batch,
+            'untag': self._untag_batch,
+            'rename_tag': self._rename_tag,
+            'rename_file': self._rename_file,
+            'rename_files': self._rename_files,
+            'rename_directory': self._rename_directory,
+        }
+
+        import json
+
+        start = 0
+        if since is not None:
+            start = self._checkpoint(journal_file, os.path.abspath(since))
+
+        f = open(journal_file, 'r')
+
+        try:
+            for line in islice(f, start, None):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    logger.warn('Skipping incomplete journal record: %r', line)
+                    continue
+                if record[0] == 'save':
+                    continue
+
+                self.generation += 1  # So that indexes see every record
+                replayers[record[0]](*record[1:])
+        finally:
+            f.close()
+
+    def _checkpoint(self, journal_file, file_name):
+        """
+        Find the line after the last checkpoint of a file in a journal.
+
+        @param journal_file: The name of the journal file
+        @type journal_file: str
+        @param file_name: The absolute name of the saved file
+        @type file_name: str
+        @return: The number of lines before the changes made since the file
+                 was last saved, or 0 if it never was
+        @rtype: int
+        """
+        import json
+
+        start = 0
+        f = open(journal_file, 'r')
+        try:
+            for i, line in enumerate(f):
+                if line.startswith('["save", '):
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record[1] == file_name:
+                        start = i + 1
+        finally:
+            f.close()
+        return start
+
+    @_writes
+    def compact(self, output_file, fmt=None):
+        """
+        Save every tag to a file, then empty the journal.
+
+        After this, load()ing the same file (with the same journal) gives the
+        same tags as before, with nothing left to replay. Should the process
+        die before the journal is emptied, save() has already checkpointed it
+        (see replay()), so loading the new file replays nothing twice.
+
+        @param output_file: The name of the file to save
+        @type output_file: str
+        @param fmt: The format to save the output in: bin, json, text, or yaml
+        @type fmt: str: 'bin', 'json', 'text', or 'yaml'
+        """
+        self.save(output_file, fmt=fmt)
+
+        if self.journal is not None:
+            open(self.journal, 'w').close()
+
+    @_writes
+    def remap(self, map_as=None):
+        """
+        Swap between tag-to-file memory-mapping, and tag-to-file memory
+        mapping.
+
+        The tag map is transposed in memory, in a single pass. When switching
+        between tag-to-file and file-to-tag mapping, the old map is emptied as
+        the new one is built, so that the two never hold much more than one
+        copy of the tags between them (see _transpose()).
+
+        Bidirectional mapping already keeps both directions in memory, so
+        toggling it is a no-op; switching to or from it only builds or drops
+        the reverse index.
+
+        @param map_as: The mapping scheme to use: tag-to-file, file-to-tag, or
+                       bidirectional. If left at None, remap() will toggle
+                       between tag-to-file and file-to-tag.
+        @type map_as: str: 'tag-->file', 'file-->tag', or 'tag<->file'
+        """
+        if map_as == self.mapping or map_as not in (
+                TAG_TO_FILE, FILE_TO_TAG, BIDIRECTIONAL, None):
+            return
+
+        self._invalidate()
+
+        if self.mapping == BIDIRECTIONAL:
+            if map_as is None:
+                return
+
+            if map_as == FILE_TO_TAG:
+                self.the_list = self.the_reverse_list
+
+            self.the_reverse_list = {}
+            self.mapping = map_as
+            return
+
+        if map_as is None:
+            map_as = (FILE_TO_TAG if self.mapping == TAG_TO_FILE
+                      else TAG_TO_FILE)
+
+        if map_as == BIDIRECTIONAL:
+            if self.mapping == TAG_TO_FILE:
+                self._reindex()
+            else:
+                self.the_reverse_list = self.the_list
+                self.the_list = _transpose(self.the_reverse_list)
+        else:
+            self.the_list = _transpose(self.the_list, consume=True)
+
+        self.mapping = map_as
+
+    @_writes
+    def rename_tag(self, old_tag, new_tag):
+        """
+        Rename a tag.
+
+        Note that this renames a tag itself, not an application of a tag.
+        Not a single instance of the old tag will remain applied to any file.
+        If the new tag is already in use, the two tags are merged.
+
+        With file-to-tag mapping there is no index from tags to files, so
+        every file is searched for the old tag. Stores that rename tags often
+        should use bidirectional mapping, which renames through its tag-to-file
+        map instead.
+
+        @param old_tag: The old tag to rename
+        @type old_tag: str
+        @param new_tag: The new tag name to apply
+        @type new_tag: str
+        """
+        logger.debug('Using %s memory mapping.', self.mapping)
+
+        self._rename_tag(old_tag, new_tag)
+        self._journal('rename_tag', old_tag, new_tag)
+
+    def _rename_tag(self, old_tag, new_tag):
+        """Rename a tag, without journaling it (see rename_tag())."""
+        if old_tag == new_tag:
+            return
+
+        if METRICS:
+            _path('rename_tag', self.mapping == FILE_TO_TAG)
+        if self.mapping == FILE_TO_TAG:
+            logger.info('Tag renaming operations may be slow for %s maps...',
+                        self.mapping)
+            file_names = []
+            for file_name, tag_names in self.the_list.items():
+                if old_tag in tag_names:
+                    if METRICS:
+                        _changed(1 if new_tag in tag_names else 2)
+                    tag_names.discard(old_tag)
+                    tag_names.add(new_tag)
+                    file_names.append(file_name)
+        else:
+            if METRICS:
+                _changed(_moving(self.the_list, old_tag, new_tag))
+            file_names = _move(self.the_list, old_tag, new_tag)
+
+        if self.mapping == BIDIRECTIONAL:
+            for file_name in file_names:
+                tag_names = self.the_reverse_list[file_name]
+                tag_names.discard(old_tag)
+                tag_names.add(new_tag)
+
+        self._touch((file_name, tag_name) for file_name in file_names
+                    for tag_name in (old_tag, new_tag))
+
+    @_writes
+    def rename_file(self, old_file, new_file):
+        """
+        Rename a file.
+
+        Note that this renames a file itself across all tags that may apply to
+        it. If the new file is already tagged, the tags of both files are
+        merged. With tag-to-file mapping, every tag is searched for the file,
+        unless a directory query has built the directory tree, which knows
+        each file's tags (see rename_files()).
+
+        @param old_file: The old file to rename
+        @type old_file: str
+        @param new_file: The new name of the file
+        @type new_file: str
+        """
+        logger.debug('Using %s memory mapping.', self.mapping)
+
+        self._rename_file(old_file, new_file)
+        self._journal('rename_file', old_file, new_file)
+
+    def _rename_file(self, old_file, new_file):
+        """
+        Rename a file, without journaling it (see rename_file()).
+
+        This is a batch of one rename, so it takes the same route as
+        _rename_files(): with tag-to-file mapping, once the directory tree has
+        been built, only the file's own tags are touched.
+        """
+        self._rename_files({old_file: new_file})
+
+    @_writes
+    def rename_files(self, renames):
+        """
+        Rename many files all at once.
+
+        All files are renamed at the same time, so files may even swap names.
+        Tag-to-file maps are walked once for the whole batch, rather than once
+        per file, or not at all once the directory tree has been built (see
+        _directory_index()); with file-to-tag or bidirectional mapping, only
+        the tags of the renamed files are touched.
+
+        @param renames: The new name of each file to rename, keyed by old name
+        @type renames: dict
+        """
+        logger.debug('Using %s memory mapping.', self.mapping)
+
+        self._rename_files(renames)
+        self._journal('rename_files', renames)
+
+    def _rename_files(self, renames):
+        """Rename many files, without journaling them (see rename_files())."""
+        renames = dict((old_file, new_file) for old_file, new_file in
+                       renames.items() if old_file != new_file)
+
+        tree = None
+        if self.mapping == TAG_TO_FILE:
+            tree = self._directory_index(build=False)
+        if METRICS:
+            _path('rename_file', self.mapping == TAG_TO_FILE and not tree)
+        if self.mapping == TAG_TO_FILE:
+            hits = defaultdict(list)
+            if tree is not None:
+                for old_file in renames:
+                    for tag_name in tree.get(old_file) or ():
+                        hits[tag_name].append(old_file)
+            else:
+                logger.info('File rename operations may be slow for %s '
+                            'maps...', self.mapping)
+                for tag_name, file_names in self.the_list.items():
+                    if len(renames) < len(file_names):
+                        found = [old for old in renames if old in file_names]
+                    else:
+                        found = [old for old in file_names if old in renames]
+                    if found:
+                        hits[tag_name] = found
+
+            touched = []
+            for tag_name, old_files in hits.items():
+                file_names = self.the_list[tag_name]
+                if METRICS:
+                    gone = set(old_files)
+                    _changed(len(gone) + sum(
+                        1 for new_file in set(renames[old] for old in gone)
+                        if new_file in gone or new_file not in file_names))
+                file_names.difference_update(old_files)
+                file_names.update(renames[old] for old in old_files)
+                touched.extend((old, tag_name) for old in old_files)
+            self._touch((file_name, tag_name) for old_file, tag_name in touched
+                        for file_name in (old_file, renames[old_file]))
+            return
+
+        tag_map = (self.the_list if self.mapping == FILE_TO_TAG
+                   else self.the_reverse_list)
+        moved = [(old_file, new_file, tag_map.pop(old_file))
+                 for old_file, new_file in renames.items()
+                 if old_file in tag_map]
+
+        for _, new_file, tag_names in moved:
+            if METRICS:
+                _changed(2 * len(tag_names) -
+                         _present(tag_map, {new_file: tag_names}))
+            _merge(tag_map, {new_file: tag_names})
+
+        if self.mapping == BIDIRECTIONAL:
+            for old_file, _, tag_names in moved:
+                for tag_name in tag_names:
+                    self.the_list[tag_name].discard(old_file)
+            for _, new_file, tag_names in moved:
+                for tag_name in tag_names:
+                    self.the_list[tag_name].add(new_file)
+
+        self._touch((file_name, tag_name)
+                    for old_file, new_file, tag_names in moved
+                    for tag_name in tag_names
+                    for file_name in (old_file, new_file))
+
+    @_writes
+    def rename_directory(self, old_directory, new_directory):
+        """
+        Rename a directory: rename every tagged file under it, at any depth.
+
+        A file is under a directory when its name starts with the directory's
+        name followed by a path separator ('/' or os.sep). The directory's own
+        name is renamed too, if it has been tagged itself.
+
+        @param old_directory: The old name of the directory
+        @type old_directory: str
+        @param new_directory: The new name of the directory
+        @type new_directory: str
+        """
+        logger.debug('Using %s memory mapping.', self.mapping)
+
+        self._rename_directory(old_directory, new_directory)
+        self._journal('rename_directory', old_directory, new_directory)
+
+    def _rename_directory(self, old_directory, new_directory):
+        """Move a directory, without journaling it (see rename_directory())."""
+        old_directory = old_directory.rstrip('/' + os.sep)
+        new_directory = new_directory.rstrip('/' + os.sep)
+
+        self._rename_files(dict(
+            (file_name, new_directory + file_name[len(old_directory):])
+            for file_name in self._files_under(old_directory)))
+
+    @_reads
+    def get_files_by_tag(self, tag_name, after=None, limit=None, offset=0):
+        """
+        Given a tag, get all files associated with that tag.
+
+        Results may be got a page at a time, e.g. get_files_by_tag(tag_name,
+        after=last_file_name, limit=50). Once the sorted files of the tag are
+        in the query cache (or in SortedPostings), each page only costs time
+        in proportion to its size (see _page()).
+
+        @param tag_name: The name of the tag to query on
+        @type tag_name: str
+        @param after: Only get names after this one (see _page())
+        @type after: str
+        @param limit: The most names to get, or None for all of them
+        @type limit: int
+        @param offset: How many names to skip
+        @type offset: int
+        @return: A list of associated file names
+        @rtype: list of str
+        @raise ValueError: When limit or offset is negative
+        """
+        logger.debug('Using %s memory mapping.', self.mapping)
+
+        return _page(self._cached(('files', tag_name), (tag_name,), (),
+                                  self._files_by_tag, tag_name),
+                     after, limit, offset)
+
+    def _files_by_tag(self, tag_name):
+        """Get the files of a tag, uncached (see get_files_by_tag())."""
+        if METRICS:
+            _path('files_by_tag', self.mapping == FILE_TO_TAG)
+        if self.mapping != FILE_TO_TAG:
+            return _sorted(self.the_list.get(tag_name, ()))
+        else:
+            logger.info('Queries by tag may be slow for %s maps...',
+                        self.mapping)
+            file_names = []
+            for file_name, tag_names in self.the_list.items():
+                if tag_name in tag_names:
+                    file_names.append(file_name)
+            return sorted(file_names)
+
+    @_reads
+    def get_tags_by_file(self, file_name, after=None, limit=None, offset=0):
+        """
+        Given a file, get all tags associated with that file.
+
+        Results may be got a page at a time: see get_files_by_tag().
+
+        @param file_name: The name of the file to query on
+        @type file_name: str
+        @param after: Only get names after this one (see _page())
+        @type after: str
+        @param limit: The most names to get, or None for all of them
+        @type limit: int
+        @param offset: How many names to skip
+        @type offset: int
+        @return: A list of assocaited tag names
+        @rtype: list of str
+        @raise ValueError: When limit or offset is negative
+        """
+        logger.debug('Using %s memory mapping.', self.mapping)
+
+        return _page(self._cached(('tags', file_name), (), (file_name,),
+                                  self._tags_by_file, file_name),
+                     after, limit, offset)
+
+    def _tags_by_file(self, file_name):
+        """Get the tags of a file, uncached (see get_tags_by_file())."""
+        if METRICS:
+            _path('tags_by_file', self.mapping == TAG_TO_FILE)
+        if self.mapping == TAG_TO_FILE:
+            logger.info('Queries by file may be slow for %s maps...',
+                        self.mapping)
+            tag_names = []
+            for tag_name, file_names in self.the_list.items():
+                if file_name in file_names:
+                    tag_names.append(tag_name)
+            return sorted(tag_names)
+        elif self.mapping == BIDIRECTIONAL:
+            return _sorted(self.the_reverse_list.get(file_name, ()))
+        else:
+            return _sorted(self.the_list.get(file_name, ()))
+
+    @_reads
+    def get_tags(self, after=None, limit=None, offset=0):
+        """
+        Self-explanatory: Get all tags currently in memory.
+
+        Results may be got a page at a time: see get_files_by_tag().
+
+        @param after: Only get names after this one (see _page())
+        @type after: str
+        @param limit: The most names to get, or None for all of them
+        @type limit: int
+        @param offset: How many names to skip
+        @type offset: int
+        @return: A sorted list of tag names
+        @rtype: list of str
+        @raise ValueError: When limit or offset is negative
+        """
+        logger.debug('Using %s memory mapping.', self.mapping)
+
+        return _page(self._tag_index(), after, limit, offset)
+
+    @_reads
+    def get_files(self, after=None, limit=None, offset=0):
+        """
+        Self-explanatory: Get all files with tags currently in memory.
+
+        Results may be got a page at a time: see get_files_by_tag().
+
+        @param after: Only get names after this one (see _page())
+        @type after: str
+        @param limit: The most names to get, or None for all of them
+        @type limit: int
+        @param offset: How many names to skip
+        @type offset: int
+        @return: A sorted list of file names
+        @rtype: list of str
+        @raise ValueError: When limit or offset is negative
+        """
+        logger.debug('Using %s memory mapping.', self.mapping)
+
+        return _page(self._file_index(), after, limit, offset)
+
+    @_reads
+    def iter_files_by_tag(self, tag_name):
+        """
+        Given a tag, iterate over all files associated with that tag, sorted.
+
+        Unlike get_files_by_tag(), this builds no list from sorted postings
+        (see SortedPostings): the files are read straight from the tag, as
+        they were when this was called. The query cache is not used.
+
+        @param tag_name: The name of the tag to query on
+        @type tag_name: str
+        @return: An iterator of associated file names
+        @rtype: iterator of str
+        """
+        logger.debug('Using %s memory mapping.', self.mapping)
+
+        if self.mapping != FILE_TO_TAG:
+            return _iter_sorted(self.the_list.get(tag_name, ()))
+        return iter(self._files_by_tag(tag_name))
+
+    @_reads
+    def iter_tags_by_file(self, file_name):
+        """
+        Given a file, iterate over all tags associated with that file, sorted.
+
+        See iter_files_by_tag().
+
+        @param file_name: The name of the file to query on
+        @type file_name: str
+        @return: An iterator of associated tag names
+        @rtype: iterator of str
+        """
+        logger.debug('Using %s memory mapping.', self.mapping)
+
+        if self.mapping == BIDIRECTIONAL:
+            return _iter_sorted(self.the_reverse_list.get(file_name, ()))
+        elif self.mapping == FILE_TO_TAG:
+            return _iter_sorted(self.the_list.get(file_name, ()))
+        return iter(self._tags_by_file(file_name))
+
+    @_reads
+    def iter_tags(self):
+        """Iterate over all tags currently in memory, sorted."""
+        logger.debug('Using %s memory mapping.', self.mapping)
+
+        return iter(self._tag_index())
+
+    @_reads
+    def iter_files(self):
+        """Iterate over all files with tags currently in memory, sorted."""
+        logger.debug('Using %s memory mapping.', self.mapping)
+
+        return iter(self._file_index())
+
+    @_reads
+    def get_tags_by_prefix(self, prefix):
+        """
+        Get all tags that start with a prefix.
+
+        Tags may be namespaced with slashes, e.g. 'camera/canon/eos5d': give
+        'camera/' to get every tag in the 'camera' namespace, at any depth.
+        The prefix is matched as a plain string, so 'camera' would also match
+        'cameraman'. Tags are looked up in a sorted index (see _tag_index()),
+        so this takes time in proportion to the number of matching tags.
+
+        @param prefix: The prefix to look for
+        @type prefix: str
+        @return: A sorted list of tag names
+        @rtype: list of str
+        """
+        logger.debug('Using %s memory mapping.', self.mapping)
+
+        return _prefixed(self._tag_index(), prefix)
+
+    @_reads
+    def get_files_by_tag_prefix(self, prefix):
+        """
+        Get all files with any tag that starts with a prefix.
+
+        The files of every matching tag (see get_tags_by_prefix()) are
+        gathered into a single set, so each file is only listed once.
+
+        @param prefix: The prefix to look for, e.g. 'camera/'
+        @type prefix: str
+        @return: A sorted list of file names
+        @rtype: list of str
+        """
+        tag_names = self.get_tags_by_prefix(prefix)
+
+        if METRICS:
+            _path('files_by_tag', self.mapping == FILE_TO_TAG)
+        if self.mapping == FILE_TO_TAG:
+            logger.info('Queries by tag may be slow for %s maps...',
+                        self.mapping)
+            tag_names = set(tag_names)
+            return sorted(file_name for file_name, tags
+                          in self.the_list.items()
+                          if not tag_names.isdisjoint(tags))
+
+        file_names = set()
+        for tag_name in tag_names:
+            file_names.update(self.the_list[tag_name])
+        return sorted(file_names)
+
+    @_reads
+    def get_files_under(self, directory):
+        """
+        Get all files under a directory, at any depth.
+
+        A file is under a directory when its name starts with the directory's
+        name followed by a path separator ('/' or os.sep). The directory's own
+        name is included too, if it has been tagged itself. Files are looked
+        up in the directory tree (see DirectoryIndex), so this takes time in
+        proportion to the number of files found.
+
+        @param directory: The name of the directory, e.g. '/data/2024'
+        @type directory: str
+        @return: A sorted list of file names
+        @rtype: list of str
+        """
+        logger.debug('Using %s memory mapping.', self.mapping)
+
+        return self._files_under(directory)
+
+    @_reads
+    def get_tags_under(self, directory):
+        """
+        Get all tags applied to any file under a directory, at any depth.
+
+        @param directory: The name of the directory (see get_files_under())
+        @type directory: str
+        @return: A sorted list of tag names
+        @rtype: list of str
+        """
+        logger.debug('Using %s memory mapping.', self.mapping)
+
+        return sorted(set(
+            tag_name for _, tag_name in self._edges_under(directory)))
+
+    @_writes
+    def untag_under(self, directory, tag_names=None):
+        """
+        Remove tags from every file under a directory, at any depth.
+
+        @param directory: The name of the directory (see get_files_under())
+        @type directory: str
+        @param tag_names: A tag or a list of tags to remove, or None to remove
+                          every tag
+        @type tag_names: str or list
+        """
+        logger.debug('Using %s memory mapping.', self.mapping)
+
+        if tag_names is None:
+            edges = self._edges_under(directory)
+        else:
+            if isinstance(tag_names, basestring):
+                tag_names = [tag_names]
+            edges = [(file_name, tag_name)
+                     for file_name in self._files_under(directory)
+                     for tag_name in tag_names]
+
+        self.untag_edges(edges)
+
+    def _files_under(self, directory):
+        """
+        Get every file under a directory, using the directory tree.
+
+        @param directory: The name of the directory (see get_files_under())
+        @type directory: str
+        @return: A sorted list of file names
+        @rtype: list of str
+        """
+        return sorted(file_name for file_name, _ in
+                      self._directory_index().under(directory))
+
+    def _edges_under(self, directory):
+        """
+        Get every (file, tag) pair of the files under a directory, using the
+        directory tree.
+
+        @param directory: The name of the directory (see get_files_under())
+        @type directory: str
+        @return: The (file name, tag name) pairs
+        @rtype: list of tuple
+        """
+        found = self._directory_index().under(directory)
+        if self.mapping == TAG_TO_FILE:
+            return [(file_name, tag_name) for file_name, tag_names in found
+                    for tag_name in tag_names]
+
+        tag_map = (self.the_list if self.mapping == FILE_TO_TAG
+                   else self.the_reverse_list)
+        return [(file_name, tag_name) for file_name, _ in found
+                for tag_name in tag_map[file_name]]
+
+    def _directory_index(self, build=True):
+        """
+        Get the directory tree of every file in the store (see
+        DirectoryIndex), building it if need be.
+
+        The tree is built on first use, then kept up to date by each change
+        (see _touch()), so it is only built again after the tag maps or the
+        mapping are replaced, or the number of keys in the tag map changes
+        without going through the store. With CACHE_SIZE set to 0, it is built
+        again each time, for code that modifies THE_LIST directly. With
+        tag-to-file mapping, the tree keeps each file's tags, too.
+
+        @param build: If False, get None rather than building the tree
+        @type build: bool
+        @return: The directory tree, or None
+        @rtype: L{DirectoryIndex}
+        """
+        tag_map = (self.the_reverse_list if self.mapping == BIDIRECTIONAL
+                   else self.the_list)
+        directories = self._directories
+        if CACHE_SIZE and directories is not None and (
+                directories[1] is tag_map and
+                directories[2] == self.mapping and
+                directories[3] == len(tag_map)):
+            return directories[0]
+        if not build:
+            return None
+
+        tree = DirectoryIndex()
+        if self.mapping == TAG_TO_FILE:
+            files = defaultdict(set)
+            for tag_name, file_names in tag_map.items():
+                for file_name in file_names:
+                    files[file_name].add(tag_name)
+            for file_name, tag_names in files.items():
+                tree.add(file_name, tuple(tag_names))
+        else:
+            for file_name in tag_map:
+                tree.add(file_name)
+
+        self._directories = [tree, tag_map, self.mapping, len(tag_map)]
+        return tree
+
+    def _update_directories(self, edges):
+        """
+        Bring the directory tree up to date with some changed pairs, which
+        are looked up in the tag maps to see whether they were added or
+        removed (see _touch()).
+
+        @param edges: The (file name, tag name) pairs that changed
+        @type edges: list of tuple
+        """
+        tree = self._directories[0]
+        if self.mapping == TAG_TO_FILE:
+            tag_map = self.the_list
+            changed = defaultdict(set)
+            for file_name, tag_name in edges:
+                changed[file_name].add(tag_name)
+            for file_name, tag_names in changed.items():
+                tags = set(tree.get(file_name) or ())
+                for tag_name in tag_names:
+                    if self._has_edge(file_name, tag_name):
+                        tags.add(tag_name)
+                    else:
+                        tags.discard(tag_name)
+                if tags:
+                    tree.add(file_name, tuple(tags))
+                else:
+                    tree.discard(file_name)
+        else:
+            tag_map = (self.the_list if self.mapping == FILE_TO_TAG
+                       else self.the_reverse_list)
+            for file_name in set(file_name for file_name, _ in edges):
+                if file_name in tag_map:
+                    tree.add(file_name)
+                else:
+                    tree.discard(file_name)
+
+        self._directories[3] = len(tag_map)
+
+    def _has_edge(self, file_name, tag_name):
+        """
+        Check whether a file has a tag.
+
+        @param file_name: The name of the file
+        @type file_name: str
+        @param tag_name: The name of the tag
+        @type tag_name: str
+        @rtype: bool
+        """
+        if self.mapping == FILE_TO_TAG:
+            return tag_name in self.the_list.get(file_name, ())
+        return file_name in self.the_list.get(tag_name, ())
+
+    def _key_index(self):
+        """Get every key of the tag map, sorted (see _index())."""
+        if self.mapping == FILE_TO_TAG:
+            return self._file_index()
+        return self._tag_index()
+
+    def _tag_index(self):
+        """Get every tag name in the store, sorted (see _index())."""
+        return self._index('tag', self.the_list, self.mapping != FILE_TO_TAG)
+
+    def _file_index(self):
+        """Get every file name in the store, sorted (see _index())."""
+        if self.mapping == BIDIRECTIONAL:
+            return self._index('file', self.the_reverse_list, True)
+        return self._index('file', self.the_list, self.mapping == FILE_TO_TAG)
+
+    def _index(self, kind, tag_map, keyed):
+        """
+        Get a sorted index of every tag (or file) name in a tag map.
+
+        Indexes are kept in _indexes, along with the generation, mapping, tag
+        map, and size of the tag map they were made for, and used again while
+        all four are unchanged. The tag map itself is kept, and compared by
+        identity, so that a new map is never mistaken for an old one. Keys
+        added to the tag map directly change its size; with the query cache
+        turned off (see CACHE_SIZE), indexes are checked against the tag map
+        on every use, too. Otherwise, an index of keys is compared against the
+        keys; any that were added or removed are merged into a copy of the
+        sorted list, which takes linear time, rather than sorting it all
+        again. An index of values must gather every value again.
+
+        @param kind: What the names are, for logging: 'tag' or 'file'
+        @type kind: str
+        @param tag_map: The tag map holding the names
+        @type tag_map: dict
+        @param keyed: True if the names are the keys of the tag map, or False
+                      if they are its values
+        @type keyed: bool
+        @return: Every name, sorted; the list must not be modified
+        @rtype: list of str
+        """
+        index = self._indexes.get(kind)
+
+        if index is not None and index[1] is tag_map and (
+                index[2] == self.mapping):
+            if CACHE_SIZE and index[0] == self.generation and (
+                    index[3] == len(tag_map)):
+                return index[4]
+            if keyed:
+                names, name_set = index[4], index[5]
+                keys = tag_map.keys()
+                if name_set != keys:
+                    removed = name_set - keys
+                    added = keys - name_set
+                    name_set = set(tag_map)
+                    names = sorted([name for name in names
+                                    if name not in removed] + list(added))
+                self._indexes[kind] = (self.generation, tag_map, self.mapping,
+                                       len(tag_map), names, name_set)
+                return names
+
+        if METRICS:
+            _path('all_%ss' % kind, not keyed)
+        if keyed:
+            name_set = set(tag_map)
+        else:
+            logger.info('Exhaustive %s obtainment may be slow for %s maps...',
+                        kind, self.mapping)
+            name_set = set()
+            for names in tag_map.values():
+                name_set.update(names)
+
+        names = sorted(name_set)
+        self._indexes[kind] = (self.generation, tag_map, self.mapping,
+                               len(tag_map), names, name_set)
+        return names
+
+    @_reads
+    def query(self, expression, after=None, limit=None, offset=0):
+        """
+        Get all files matching a boolean combination of tags.
+
+        Expressions combine tag names with '&' (and), '|' (or), '!' (not), and
+        parentheses, e.g. 'Photos & Vacation & !Finances'. Whitespace around
+        tag names is ignored; names containing operators may be
+        "double-quoted".
+
+        Expressions may also be given pre-parsed, as a tree of tuples:
+        ('tag', name), ('not', node), ('and', [nodes]), or ('or', [nodes]).
+
+        Conjunctions start from their smallest set of files, intersect the rest
+        in order of increasing size, and stop as soon as nothing is left.
+        Negated and nested terms only test the files that are still left, so
+        the cost depends on the smallest term, not on the size of the catalog.
+
+        Results may be got a page at a time: see get_files_by_tag(). Results
+        of expressions given as strings are cached, so only the first page
+        costs a full query.
+
+        @param expression: The query to run
+        @type expression: str or tuple
+        @param after: Only get files after this one (see _page())
+        @type after: str
+        @param limit: The most files to get, or None for all of them
+        @type limit: int
+        @param offset: How many files to skip
+        @type offset: int
+        @return: A list of matching file names
+        @rtype: list of str
+        @raise ValueError: When the expression cannot be parsed, or when limit
+                           or offset is negative
+        """
+        logger.debug('Using %s memory mapping.', self.mapping)
+
+        if isinstance(expression, basestring):
+            node = _parse_query(expression)
+            file_names = self._cached(('query', expression), _query_tags(node),
+                                      (), self._query, node)
+        else:
+            file_names = self._query(expression)
+
+        return _page(file_names, after, limit, offset)
+
+    @_reads
+    def iter_query(self, expression):
+        """
+        Iterate over all files matching a boolean combination of tags, sorted.
+
+        See query() and iter_files_by_tag(). With sorted postings, a query on
+        a single tag builds no list at all, and combinations of tags build
+        only their result.
+
+        @param expression: The query to run
+        @type expression: str or tuple
+        @return: An iterator of matching file names
+        @rtype: iterator of str
+        @raise ValueError: When the expression cannot be parsed
+        """
+        logger.debug('Using %s memory mapping.', self.mapping)
+
+        node = _parse_query(expression) if isinstance(
+            expression, basestring) else expression
+
+        if self.mapping == FILE_TO_TAG:
+            return iter(self._query(node))
+        return _iter_sorted(self._evaluate(node))
+
+    def _query(self, node):
+        """Run a parsed query, uncached (see query())."""
+        if METRICS:
+            _path('files_by_tag', self.mapping == FILE_TO_TAG)
+        if self.mapping == FILE_TO_TAG:
+            logger.info('Queries by tag may be slow for %s maps...',
+                        self.mapping)
+            return sorted(file_name for file_name, tag_names
+                          in self.the_list.items()
+                          if _matches(node, tag_names.__contains__))
+
+        return _sorted(self._evaluate(node))
+
+    def _estimate(self, node):
+        """Estimate how many files a query node matches, for ordering terms."""
+        kind, arg = node
+        if kind == 'tag':
+            return len(self.the_list.get(arg, ()))
+        if kind == 'or':
+            return sum(self._estimate(child) for child in arg)
+        if kind == 'and':
+            return min(self._estimate(child) for child in arg)
+        return float('inf')
+
+    def _evaluate(self, node):
+        """
+        Get the set of files matching a query node, using tag-to-file postings.
+
+        The returned set may be one of the sets held in the tag map, so it must
+        not be modified.
+
+        @param node: The parsed query (see query())
+        @type node: tuple
+        @return: The matching file names
+        @rtype: set of str
+        """
+        kind, arg = node
+
+        if kind == 'tag':
+            return self.the_list.get(arg, frozenset())
+
+        if kind == 'or':
+            result = self._evaluate(arg[0])
+            for child in arg[1:]:
+                result = result | self._evaluate(child)
+            return result
+
+        children = [node] if kind == 'not' else sorted(arg, key=self._estimate)
+
+        if children[0][0] == 'not':
+            result = self._all_files()
+        else:
+            result = self._evaluate(children.pop(0))
+
+        for child in children:
+            if not result:
+                break
+            kind, arg = child
+            if kind == 'tag':
+                result = result & self.the_list.get(arg, frozenset())
+            elif kind == 'not' and arg[0] == 'tag':
+                result = result - self.the_list.get(arg[1], frozenset())
+            else:
+                postings = dict(
+                    (tag_name, self.the_list.get(tag_name, ()))
+                    for tag_name in _query_tags(child) if tag_name is not None)
+                result = set(file_name for file_name in result if _matches(
+                    child, lambda tag_name: file_name in postings[tag_name]))
+
+        return result
+
+    def _all_files(self):
+        """Get the set of every tagged file, for negated queries."""
+        if METRICS:
+            _path('all_files', self.mapping != BIDIRECTIONAL)
+        if self.mapping == BIDIRECTIONAL:
+            return set(self.the_reverse_list)
+
+        logger.info('Exhaustive file obtainment may be slow for %s maps...',
+                    self.mapping)
+        all_files = set()
+        for files in self.the_list.values():
+            all_files.update(files)
+        return all_files
+
+    @_reads
+    def memory_usage(self):
+        """
+        Estimate how much memory the in-memory tag map(s) are using, in bytes.
+
+        File and tag names are shared between the tag map and its reverse
+        index, so they are counted only once, under 'strings'. The 'forward'
+        and 'reverse' figures count the dictionaries and the sets of names
+        they hold; the 'reverse' figure is therefore what bidirectional mapping
+        costs on top of the other two mappings. The 'symbols' figure counts the
+        symbol table used by array postings. The 'directories' figure counts
+        the directory tree, if a directory query has built it (see
+        DirectoryIndex.memory_usage()).
+
+        @return: Byte counts for 'strings', 'symbols', 'forward', 'reverse',
+                 'directories', and 'total'
+        @rtype: dict
+        """
+        seen = set()
+        strings = 0
+        containers = {'forward': self.the_list,
+                      'reverse': self.the_reverse_list}
+        usage = {}
+
+        for name, tag_map in containers.items():
+            usage[name] = sys.getsizeof(tag_map)
+            for key, values in tag_map.items():
+                usage[name] += sys.getsizeof(values)
+                for string in [key] + list(values):
+                    if id(string) not in seen:
+                        seen.add(id(string))
+                        strings += sys.getsizeof(string)
+
+        usage['strings'] = strings
+        usage['symbols'] = (sys.getsizeof(SYMBOL_IDS) +
+                            sys.getsizeof(SYMBOL_NAMES))
+        usage['directories'] = (0 if self._directories is None else
+                                self._directories[0].memory_usage())
+        usage['total'] = sum(usage.values())
+        return usage
+
+    get_tag_files = get_files_by_tag  # Alias
+    get_file_tags = get_tags_by_file  # Alias
+
+
+def _global(name):
+    """Make a property that gets and sets one of this module's globals."""
+    module = globals()
+    return property(lambda self: module[name],
+                    lambda self, value: module.__setitem__(name, value))
+
+
+class _ModuleStore(TagStore):
+    """
+    The default store, which keeps its state in this module's globals.
+
+    Code that reads or sets THE_LIST, THE_REVERSE_LIST, MAPPING, or JOURNAL
+    directly therefore keeps working with the module-level functions.
+    """
+
+    the_list = _global('THE_LIST')
+    the_reverse_list = _global('THE_REVERSE_LIST')
+    mapping = _global('MAPPING')
+    journal = _global('JOURNAL')
+
+    def __init__(self):
+        self.lock = ReadWriteLock()
+        self.generation = 0
+        self._indexes = {}
+        self._directories = None
+        self._init_cache()
+
+
+# The store used by the module-level functions
+DEFAULT_STORE = _ModuleStore()
+
+
+def _tag(file_name, tag_name, assert_exists=False):
+    """
+    Add a single tag to a single file, optionally asserting file existence.
+
+    Uses the default store: see TagStore._tag().
+    """
+    DEFAULT_STORE._tag(file_name, tag_name, assert_exists)
+
+
+def _add(tag_map, key, value):
+    """
+    Add a single value to the set stored under key in a tag map.
+
+    @param tag_map: The tag map to modify (THE_LIST or THE_REVERSE_LIST)
+    @type tag_map: dict
+    @param key: The tag (or file) to add the value to
+    @type key: str
+    @param value: The file (or tag) to add
+    @type value: str
+    """
+    if key in tag_map:
+        tag_map[key].add(value)
+    else:
+        if POSTINGS == ARRAY_POSTINGS:
+            key = SYMBOL_NAMES[_intern(key)]
+        tag_map[key] = _postings([value])
+
+
+def tag(file_names, tag_names, assert_exists=False):
+    """
+    Tag multiple files with multiple tags all at once.
+
+    Uses the default store: see TagStore.tag().
+    """
+    DEFAULT_STORE.tag(file_names, tag_names, assert_exists)
+
+
+def tag_edges(edges, assert_exists=False):
+    """
+    Apply many (file, tag) pairs all at once.
+
+    Uses the default store: see TagStore.tag_edges().
+    """
+    DEFAULT_STORE.tag_edges(edges, assert_exists)
+
+
+def _merge(tag_map, groups):
+    """
+    Add groups of values to the sets stored under their keys in a tag map.
+
+    With set postings, groups for new keys are stored as-is, not copied, so
+    each group must be a new set that is not used anywhere else.
+
+    @param tag_map: The tag map to modify (THE_LIST or THE_REVERSE_LIST)
+    @type tag_map: dict
+    @param groups: The values to add, keyed by tag (or file)
+    @type groups: dict of set
+    """
+    for key, values in groups.items():
+        if key in tag_map:
+            tag_map[key].update(values)
+        elif POSTINGS == ARRAY_POSTINGS:
+            tag_map[SYMBOL_NAMES[_intern(key)]] = Postings(values)
+        elif POSTINGS == SORTED_POSTINGS:
+            tag_map[key] = SortedPostings(values)
+        else:
+            tag_map[key] = values
+
+
+def _batches(edges):
+    """Split (file, tag) pairs into lists of up to BATCH_SIZE pairs each."""
+    edges = iter(edges)
+    batch = list(islice(edges, BATCH_SIZE))
+
+    while batch:
+        yield batch
+        batch = list(islice(edges, BATCH_SIZE))
+
+
+def _untag(file_name, tag_name):
+    """
+    Remove a single tag from a single file.
+
+    Uses the default store: see TagStore._untag().
+    """
+    DEFAULT_STORE._untag(file_name, tag_name)
+
+
+def _remove(tag_map, key, value):
+    """
+    Remove a single value from the set stored under key in a tag map.
+
+    The key itself is removed once its set of values is empty.
+
+    @param tag_map: The tag map to modify (THE_LIST or THE_REVERSE_LIST)
+    @type tag_map: dict
+    @param key: The tag (or file) to remove the value from
+    @type key: str
+    @param value: The file (or tag) to remove
+    @type value: str
+    """
+    if key not in tag_map:
+        return
+
+    tag_map[key].discard(value)
+
+    if not tag_map[key]:
+        del tag_map[key]
+
+
+def untag(file_names, tag_names):
+    """
+    Remove multiple tags from multiple files all at once.
+
+    Uses the default store: see TagStore.untag().
+    """
+    DEFAULT_STORE.untag(file_names, tag_names)
+
+
+def untag_edges(edges):
+    """
+    Remove many (file, tag) pairs all at once.
+
+    Uses the default store: see TagStore.untag_edges().
+    """
+    DEFAULT_STORE.untag_edges(edges)
+
+
+def dump_json():
+    """
+    Render the tag list in JSON format.
+
+    Uses the default store: see TagStore.dump_json().
+    """
+    return DEFAULT_STORE.dump_json()
+
+
+def dump_text(sort=False):
+    """
+    Render the tag list in plain text.
+
+    Uses the default store: see TagStore.dump_text().
+    """
+    return DEFAULT_STORE.dump_text(sort)
+
+
+def dump_yaml():
+    """
+    Render the tag list in YAML format.
+
+    Uses the default store: see TagStore.dump_yaml().
+    """
+    return DEFAULT_STORE.dump_yaml()
+
+
+def dump(fmt=FORMAT):
+    """
+    Render output using a number of different formats.
+
+    Uses the default store: see TagStore.dump().
+    """
+    return DEFAULT_STORE.dump(fmt)
+
+
+def dump_to(output, fmt=FORMAT):
+    """
+    Write output, using a number of different formats, to a file object.
+
+    Uses the default store: see TagStore.dump_to().
+    """
+    return DEFAULT_STORE.dump_to(output, fmt)
+
+
+def dump_bin(output):
+    """
+    Write the tag map to a file object in the binary 'bin' format.
+
+    Uses the default store: see TagStore.dump_bin().
+    """
+    return DEFAULT_STORE.dump_bin(output)
+
+
+def _name_blob(names, start):
+    """Encode names as UTF-8 and join them; also return their offsets."""
+    encoded = [name.encode('utf-8') for name in names]
+    offsets = array('Q', [start])
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    return b''.join(encoded), offsets
+
+
+def _transpose(tag_map, consume=False):
+    """
+    Get a copy of a tag map with its keys and values swapped, in one pass.
+
+    Values are gathered into plain sets, which become the new tag map's sets.
+    With array postings, they are instead compacted into the new tag map every
+    BATCH_SIZE edges. When consuming the old tag map, each of its keys is
+    removed as soon as it has been read, so that, besides the batch being
+    gathered, every edge is held by only one of the two maps.
+
+    @param tag_map: The tag map to transpose
+    @type tag_map: dict
+    @param consume: If True, empty tag_map as it is read
+    @type consume: bool
+    @return: The transposed tag map
+    @rtype: dict
+    """
+    transposed = {}
+    groups = defaultdict(set)
+    pending = 0
+
+    for key in list(tag_map):
+        values = tag_map.pop(key) if consume else tag_map[key]
+        for value in values:
+            groups[value].add(key)
+        pending += len(values)
+        if pending >= BATCH_SIZE and POSTINGS == ARRAY_POSTINGS:
+            _merge(transposed, groups)
+            groups = defaultdict(set)
+            pending = 0
+
+    _merge(transposed, groups)
+    return transposed
+
+
+def save(output_file, overwrite=True, fmt=None):
+    """
+    Save the list of tags to a file.
+
+    Uses the default store: see TagStore.save().
+    """
+    DEFAULT_STORE.save(output_file, overwrite, fmt)
+
+
+def parse_json(s):
+    """
+    Load a dictionary from a JSON object generated by dump_json().
+
+    This function should not be used with JSON objects generated by instances
+    of taggart using a different memory-mapping scheme than that of the
+    currently loaded instance, as it will pollute the tag-map with files where
+    there should be tags, and tags where there should be files.
+
+    @param s: The data to parse into a tag-map
+    @type s: str
+    @return: The tag-map, in dictionary format
+    @rtype: dict
+    """
+    import json
+
+    return {
+        str(k): _postings(str(s) for s in v) for k, v in json.loads(s).items()}
+
+
+def parse_text(s, mapping=None):
+    """
+    Load a dictionary object generated by dump_text().
+
+    Since the plain-text format used by taggart is dumped the same way
+    regardless of what memory-mapping format is used during runtime, this
+    function can be used to switch between tag-to-file and file-to-tag
+    memory mapping on-the-fly (see the remap() function). The type of
+    dictionary that will be loaded is dependent on what the MAPPING value is
+    currently set to, so it is safe to use this method regardless of what state
+    taggart was in when the data was originally dumped. (Bidirectional mapping
+    loads the same tag-to-file dictionary as tag-to-file mapping does.)
+
+    @param s: The data to parse into a tag-map
+    @type s: str
+    @param mapping: The memory mapping scheme to load for, instead of MAPPING
+    @type mapping: str: 'tag-->file', 'file-->tag', or 'tag<->file'
+    @return: The tag-map, in dictionary format
+    @rtype: dict
+    """
+    output = {}
+    mapping = MAPPING if mapping is None else mapping
+
+    lines = [line for line in s.split(os.linesep) if line]
+    for line in lines:
+        relationship = line.strip()
+        tag_name, file_name = relationship.split(SEPARATOR, 1)
+
+        if mapping == FILE_TO_TAG:
+            _add(output, file_name, tag_name)
+
+        else:
+            _add(output, tag_name, file_name)
+
+    return output
+
+
+def parse_yaml(s):
+    """
+    Load a dictionary from a YAML object generated by dump_yaml().
+
+    This function should not be used with YAML objects generated by instances
+    of taggart using a different memory-mapping scheme than that of the
+    currently loaded instance, as it will pollute the tag-map with files where
+    there should be tags, and tags where there should be files.
+
+    Output from dump_yaml() is read a line at a time (see _scan_yaml()), and
+    anything else is loaded with PyYAML, using its C loader if it has one.
+
+    @param s: The data to parse into a tag-map
+    @type s: str
+    @return: The tag-map, in dictionary format
+    @rtype: dict
+    """
+    try:
+        return _scan_yaml(s)
+    except ValueError:
+        pass
+
+    return {str(k): _postings(str(s) for s in v)
+            for k, v in _load_yaml(s).items()}
+
+
+def _scan_yaml(s):
+    """
+    Load a dictionary from YAML in the dialect that dump_yaml() writes.
+
+    The data must be nothing but "key:" lines, each followed by "- value"
+    lines, and blank lines between them, where every key and value is a plain
+    scalar (see YAML_PLAIN). Each key's values are matched all at once, and
+    split apart without looking at them one by one, unless YAML may not read
+    some of them as strings (see YAML_IMPLICIT): those are read by PyYAML.
+
+    @param s: The data to parse into a tag-map
+    @type s: str
+    @return: The tag-map, in dictionary format
+    @rtype: dict
+    @raise ValueError: When the data is not in the dialect
+    """
+    text = s.replace('\r\n', '\n')
+    for line_break in ('\r', '\x85', '\u2028', '\u2029'):
+        if line_break in text:
+            raise ValueError('Not in the YAML dialect: line breaks')
+    if not text.endswith('\n'):
+        text += '\n'
+
+    items = []
+    odd_keys, odd_values = [], []
+    pos = 0
+    end = len(text.rstrip(' \n'))
+
+    while pos < end:
+        key = YAML_KEY.match(text, pos)
+        block = key and YAML_VALUES.match(text, key.end())
+        if not block:
+            raise ValueError('Not in the YAML dialect: %r' % text[pos:][:80])
+        pos = block.end()
+
+        key = key.group(1)
+        values = text[block.start() + 2:pos - 1].split('\n- ')
+        if '  ' in block.group() or ' \n' in block.group():
+            values = [value.strip(' ') for value in values]
+
+        if YAML_IMPLICIT.match(key):
+            odd_keys.append(key)
+        if YAML_IMPLICIT.search(text, block.start(), pos):
+            odd_values.extend(
+                value for value in values if YAML_IMPLICIT.match(value))
+        items.append((key, values))
+
+    if odd_keys or odd_values:
+        read = _load_yaml(''.join('- ' + key + ': _\n' for key in odd_keys) +
+                          ''.join('- ' + value + '\n' for value in odd_values))
+        names = {key: str(next(iter(mapping)))
+                 for key, mapping in zip(odd_keys, read)}
+        names.update((value, str(read_value)) for value, read_value in zip(
+            odd_values, read[len(odd_keys):]))
+        items = [(names.get(key, key), [names.get(v, v) for v in values])
+                 for key, values in items]
+
+    return {key: _postings(values) for key, values in items}
+
+
+def _load_yaml(s):
+    """
+    Load a YAML document with PyYAML, using its C loader if it has one.
+
+    @param s: The YAML document
+    @type s: str
+    @return: The loaded document
+    """
+    try:
+        import yaml
+    except ImportError:  # NOCOV
+        logger.error('PyYAML is not installed. You can save tag files in YAML '
+                     'format, but you cannot load them.')
+        raise
+
+    return yaml.load(s, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
+
+def parse(data, fmt=FORMAT, mapping=None):
+    """
+    Produce a dictionary from output generated by dump().
+
+    @param data: The data to parse into a tag-map dictionary
+    @type data: str
+    @param fmt: The format to assume for the input: 'json', 'text', or 'yaml'
+    @type fmt: str: json, text, or yaml
+    @param mapping: The memory mapping scheme to load for, instead of MAPPING
+    @type mapping: str: 'tag-->file', 'file-->tag', or 'tag<->file'
+    @return: The tag-map dictionary
+    @rtype: dict
+    """
+    mapping = MAPPING if mapping is None else mapping
+    logger.debug('Using %s memory mapping.', mapping)
+
+    if fmt == 'json':
+        return parse_json(data)
+    elif fmt == 'yaml':
+        return parse_yaml(data)
+    else:
+        return parse_text(data, mapping)
+
+
+def init(data, overwrite=False, fmt=FORMAT):
+    """
+    Initialize the in-memory tag map from string input.
+
+    Uses the default store: see TagStore.init().
+    """
+    DEFAULT_STORE.init(data, overwrite, fmt)
+
+
+def _reindex():
+    """
+    Rebuild the reverse (file-to-tag) index from the tag-to-file map.
+
+    Uses the default store: see TagStore._reindex().
+    """
+    DEFAULT_STORE._reindex()
+
+
+def load(input_file, overwrite=False, fmt=None, workers=1):
+    """
+    Load a list of tags from a file.
+
+    Uses the default store: see TagStore.load().
+    """
+    DEFAULT_STORE.load(input_file, overwrite, fmt, workers)
+
+
+def _ranges(input_file, size):
+    """
+    Split a file into ranges of whole lines, of about size bytes each.
+
+    @param input_file: The name of the file to split
+    @type input_file: str
+    @param size: The number of bytes to aim for in each range
+    @type size: int
+    @return: (start, end) byte offsets, end exclusive
+    @rtype: list of tuple
+    """
+    total = os.path.getsize(input_file)
+    ranges = []
+
+    f = open(input_file, 'rb')
+    try:
+        start = 0
+        while start < total:
+            f.seek(start + size)
+            f.readline()
+            end = min(f.tell(), total)
+            ranges.append((start, end))
+            start = end
+    finally:
+        f.close()
+
+    return ranges
+
+
+def _parse_range(job):
+    """
+    Parse and group the (file, tag) pairs in a range of a plain text file.
+
+    This runs in a worker process (see TagStore._load_parallel()).
+
+    @param job: The name of the file, the (start, end) byte offsets of the
+                range, and the memory mapping scheme to group the pairs for
+    @type job: tuple
+    @return: {key: set of values} groups, as TagStore._group() makes them
+    @rtype: list of dict
+    """
+    import locale
+
+    input_file, start, end, mapping = job
+
+    f = open(input_file, 'rb')
+    try:
+        f.seek(start)
+        data = f.read(end - start).decode(locale.getpreferredencoding(False))
+    finally:
+        f.close()
+
+    # Split lines as iter_edges() does, on universal newlines only
+    edges = []
+    for line in io.StringIO(data, newline=None):
+        relationship = line.strip()
+        if relationship:
+            tag_name, file_name = relationship.split(SEPARATOR, 1)
+            edges.append((file_name, tag_name))
+
+    return [dict(groups) for _, groups in TagStore(mapping)._group(edges)]
+
+
+def iter_edges(input_file):
+    """
+    Read (file, tag) pairs from a plain text file, one line at a time.
+
+    Only one line of the file is held in memory at any time, so this may be
+    used to process tag files of any size without loading them.
+
+    @param input_file: The name of the plain text file to read
+    @type input_file: str
+    @return: A generator of (file name, tag name) pairs
+    @rtype: generator of tuple
+    """
+    f = open(input_file, 'r')
+
+    try:
+        for line in f:
+            relationship = line.strip()
+            if relationship:
+                tag_name, file_name = relationship.split(SEPARATOR, 1)
+                yield file_name, tag_name
+    finally:
+        f.close()
+
+
+def replay(journal_file, since=None):
+    """
+    Apply every change recorded in a journal file to the tags in memory.
+
+    Uses the default store: see TagStore.replay().
+    """
+    DEFAULT_STORE.replay(journal_file, since)
+
+
+def compact(output_file, fmt=None):
+    """
+    Save every tag to a file, then empty the journal.
+
+    Uses the default store: see TagStore.compact().
+    """
+    DEFAULT_STORE.compact(output_file, fmt)
+
+
+def remap(map_as=None):
+    """
+    Swap between tag-to-file memory-mapping, and tag-to-file memory mapping.
+
+    Uses the default store: see TagStore.remap().
+    """
+    DEFAULT_STORE.remap(map_as)
+
+
+def rename_tag(old_tag, new_tag):
+    """
+    Rename a tag.
+
+    Uses the default store: see TagStore.rename_tag().
+    """
+    DEFAULT_STORE.rename_tag(old_tag, new_tag)
+
+
+def rename_file(old_file, new_file):
+    """
+    Rename a file.
+
+    Uses the default store: see TagStore.rename_file().
+    """
+    DEFAULT_STORE.rename_file(old_file, new_file)
+
+
+def rename_files(renames):
+    """
+    Rename many files all at once.
+
+    Uses the default store: see TagStore.rename_files().
+    """
+    DEFAULT_STORE.rename_files(renames)
+
+
+def rename_directory(old_directory, new_directory):
+    """
+    Rename a directory: rename every tagged file under it, at any depth.
+
+    Uses the default store: see TagStore.rename_directory().
+    """
+    DEFAULT_STORE.rename_directory(old_directory, new_directory)
+
+
+def _moving(tag_map, old_key, new_key):
+    """
+    Count the pairs that moving a key's values to another key would remove
+    and add (see _changed()).
+
+    @param tag_map: The tag map to look in
+    @type tag_map: dict
+    @param old_key: The key the values would be moved from
+    @type old_key: str
+    @param new_key: The key they would be moved (or merged) to
+    @type new_key: str
+    @rtype: int
+    """
+    values = tag_map.get(old_key, ())
+    return 2 * len(values) - _present(tag_map, {new_key: values})
+
+
+def _move(tag_map, old_key, new_key):
+    """
+    Move the values stored under one key of a tag map to another key.
+
+    @param tag_map: The tag map to modify (THE_LIST or THE_REVERSE_LIST)
+    @type tag_map: dict
+    @param old_key: The key to move the values from
+    @type old_key: str
+    @param new_key: The key to move (or merge) the values to
+    @type new_key: str
+    @return: The values that were moved
+    @rtype: set
+    """
+    if old_key not in tag_map:
+        return ()
+
+    values = tag_map.pop(old_key)
+    _merge(tag_map, {new_key: values})
+    return values
+
+
+def get_files_by_tag(tag_name, after=None, limit=None, offset=0):
+    """
+    Given a tag, get all files associated with that tag.
+
+    Uses the default store: see TagStore.get_files_by_tag().
+    """
+    return DEFAULT_STORE.get_files_by_tag(tag_name, after, limit, offset)
+
+
+# Alias
+get_tag_files = get_files_by_tag
+
+
+def get_tags_by_file(file_name, after=None, limit=None, offset=0):
+    """
+    Given a file, get all tags associated with that file.
+
+    Uses the default store: see TagStore.get_tags_by_file().
+    """
+    return DEFAULT_STORE.get_tags_by_file(file_name, after, limit, offset)
+
+
+# Alias
+get_file_tags = get_tags_by_file
+
+
+def get_tags(after=None, limit=None, offset=0):
+    """
+    Self-explanatory: Get all tags currently in memory.
+
+    Uses the default store: see TagStore.get_tags().
+    """
+    return DEFAULT_STORE.get_tags(after, limit, offset)
+
+
+def get_files(after=None, limit=None, offset=0):
+    """
+    Self-explanatory: Get all files with tags currently stored in memory.
+
+    Uses the default store: see TagStore.get_files().
+    """
+    return DEFAULT_STORE.get_files(after, limit, offset)
+
+
+def iter_files_by_tag(tag_name):
+    """
+    Given a tag, iterate over all files associated with that tag, sorted.
+
+    Uses the default store: see TagStore.iter_files_by_tag().
+    """
+    return DEFAULT_STORE.iter_files_by_tag(tag_name)
+
+
+def iter_tags_by_file(file_name):
+    """
+    Given a file, iterate over all tags associated with that file, sorted.
+
+    Uses the default store: see TagStore.iter_tags_by_file().
+    """
+    return DEFAULT_STORE.iter_tags_by_file(file_name)
+
+
+def iter_tags():
+    """
+    Iterate over all tags currently stored in memory, sorted.
+
+    Uses the default store: see TagStore.iter_tags().
+    """
+    return DEFAULT_STORE.iter_tags()
+
+
+def iter_files():
+    """
+    Iterate over all files with tags currently stored in memory, sorted.
+
+    Uses the default store: see TagStore.iter_files().
+    """
+    return DEFAULT_STORE.iter_files()
+
+
+def get_tags_by_prefix(prefix):
+    """
+    Get all tags that start with a prefix.
+
+    Uses the default store: see TagStore.get_tags_by_prefix().
+    """
+    return DEFAULT_STORE.get_tags_by_prefix(prefix)
+
+
+def get_files_by_tag_prefix(prefix):
+    """
+    Get all files with any tag that starts with a prefix.
+
+    Uses the default store: see TagStore.get_files_by_tag_prefix().
+    """
+    return DEFAULT_STORE.get_files_by_tag_prefix(prefix)
+
+
+def get_files_under(directory):
+    """
+    Get all files under a directory, at any depth.
+
+    Uses the default store: see TagStore.get_files_under().
+    """
+    return DEFAULT_STORE.get_files_under(directory)
+
+
+def get_tags_under(directory):
+    """
+    Get all tags applied to any file under a directory, at any depth.
+
+    Uses the default store: see TagStore.get_tags_under().
+    """
+    return DEFAULT_STORE.get_tags_under(directory)
+
+
+def untag_under(directory, tag_names=None):
+    """
+    Remove tags from every file under a directory, at any depth.
+
+    Uses the default store: see TagStore.untag_under().
+    """
+    DEFAULT_STORE.untag_under(directory, tag_names)
+
+
+def cache_stats():
+    """
+    Get the query cache's hit, miss, and eviction counts.
+
+    Uses the default store: see TagStore.cache_stats().
+    """
+    return DEFAULT_STORE.cache_stats()
+
+
+def stats():
+    """
+    Get the metrics counted while METRICS was on, by every store.
+
+    Only the operations called from outside are counted: calls made by other
+    operations, e.g. tag_edges() by tag(), or get_tags_by_prefix() by
+    get_files_by_tag_prefix(), are part of their caller's. The iter_*()
+    operations are timed until they return an iterator, and not while it is
+    consumed.
+
+    @return: Under 'operations', for each operation that was called: its
+             number of 'calls'; the total 'seconds' they took; the number of
+             (file, tag) 'edges' they actually added or removed (renames
+             remove each old edge and add its new one, unless it was already
+             there; loads that overwrite the tag map do not count the edges
+             they drop, and bin files mapped lazily count none); and
+             'percentiles', the latencies in seconds at each of PERCENTILES.
+             Under 'paths', for each kind of lookup that may use an index or
+             scan the whole tag map ('files_by_tag', 'tags_by_file',
+             'rename_tag', 'rename_file', 'all_tags', and 'all_files'): how
+             many times it did each, as 'index' and 'scan'
+    @rtype: dict
+    """
+    with _METRICS_LOCK:
+        operations = dict(
+            (name, {'calls': calls, 'seconds': seconds, 'edges': edges,
+                    'percentiles': _percentiles(latencies)})
+            for name, (calls, seconds, edges, latencies)
+            in _OPERATIONS.items())
+        paths = dict((name, dict(counts)) for name, counts in _PATHS.items())
+    return {'operations': operations, 'paths': paths}
+
+
+def _percentiles(latencies):
+    """
+    Pick the PERCENTILES of some latencies, by nearest rank.
+
+    @param latencies: The latencies, in seconds
+    @type latencies: iterable of float
+    @return: The latencies at each percentile, keyed by percentile
+    @rtype: dict
+    """
+    latencies = sorted(latencies)
+    return dict((percentile, latencies[
+        max(0, -(-percentile * len(latencies) // 100) - 1)])
+        for percentile in PERCENTILES)
+
+
+def reset_stats():
+    """Forget every metric counted so far (see stats())."""
+    with _METRICS_LOCK:
+        _OPERATIONS.clear()
+        _PATHS.clear()
+
+
+class _Profile(object):
+    """Counts metrics for a block of code, on its own (see profile())."""
+
+    def __init__(self):
+        self.stats = {}
+        self._saved = None
+
+    def __enter__(self):
+        global METRICS, _OPERATIONS, _PATHS
+        with _METRICS_LOCK:
+            self._saved = METRICS, _OPERATIONS, _PATHS
+            METRICS, _OPERATIONS, _PATHS = True, {}, {}
+        return self.stats
+
+    def __exit__(self, *exc_info):
+        global METRICS, _OPERATIONS, _PATHS
+        self.stats.update(stats())
+        with _METRICS_LOCK:
+            enabled, operations, paths = self._saved
+            for name, metrics in _OPERATIONS.items():
+                saved = operations.setdefault(
+                    name, [0, 0.0, 0, deque(maxlen=METRICS_SAMPLES)])
+                saved[0] += metrics[0]
+                saved[1] += metrics[1]
+                saved[2] += metrics[2]
+                saved[3].extend(metrics[3])
+            for name, counts in _PATHS.items():
+                saved = paths.setdefault(name, {'index': 0, 'scan': 0})
+                saved['index'] += counts['index']
+                saved['scan'] += counts['scan']
+            METRICS, _OPERATIONS, _PATHS = enabled, operations, paths
+        return False
+
+
+def profile():
+    """
+    Turn metrics on for a block of code, and get the block's own metrics:
+
+        >>> with taggart.profile() as block:
+        ...     taggart.query('Photos & !Vacation')
+        >>> block['operations']['query']['calls']
+        1
+
+    The dictionary is filled in (see stats()) when the block ends. Afterwards,
+    METRICS is as it was before, and the block's metrics are also added to
+    those of stats(). Blocks may be nested, but should not be profiled in
+    several threads at once.
+
+    @return: A context manager, whose value is the block's metrics
+    @rtype: _Profile
+    """
+    return _Profile()
+
+
+def query(expression, after=None, limit=None, offset=0):
+    """
+    Get all files matching a boolean combination of tags.
+
+    Uses the default store: see TagStore.query().
+    """
+    return DEFAULT_STORE.query(expression, after, limit, offset)
+
+
+def _prefixed(names, prefix):
+    """
+    Get the names in a sorted list that start with a prefix.
+
+    @param names: A sorted list of names
+    @type names: list of str
+    @param prefix: The prefix to look for
+    @type prefix: str
+    @return: A sorted list of the matching names
+    @rtype: list of str
+    """
+    start = end = bisect_left(names, prefix)
+    while end < len(names) and names[end].startswith(prefix):
+        end += 1
+    return names[start:end]
+
+
+def iter_query(expression):
+    """
+    Iterate over all files matching a boolean combination of tags, sorted.
+
+    Uses the default store: see TagStore.iter_query().
+    """
+    return DEFAULT_STORE.iter_query(expression)
+
+
+def _parse_query(expression):
+    """
+    Parse a query string into a tree of tuples (see query()).
+
+    @param expression: The query to parse
+    @type expression: str
+    @return: The parsed query
+    @rtype: tuple
+    @raise ValueError: When the expression cannot be parsed
+    """
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+
+    try:
+        while position < len(expression):
+            match = QUERY_TOKEN.match(expression, position)
+            if not match:
+                raise ValueError('Unbalanced quotes')
+            quoted, operator, name = match.groups()
+            if operator:
+                tokens.append((operator, None))
+            else:
+                name = name.strip() if quoted is None else re.sub(
+                    r'\\(.)', r'\1', quoted)
+                tokens.append(('tag', name))
+            position = match.end()
+
+        tokens.append(('end', None))
+        node, position = _parse_or(tokens, 0)
+        if tokens[position][0] != 'end':
+            raise ValueError('Unexpected "%s"' % tokens[position][0])
+
+    except ValueError as e:
+        err = 'Invalid query "%s": %s' % (expression, e)
+        logger.error(err)
+        raise ValueError(err)
+
+    return node
+
+
+def _parse_or(tokens, position):
+    """Parse "term | term | ..." from tokens; return (node, next position)."""
+    nodes = []
+    node, position = _parse_and(tokens, position)
+    nodes.append(node)
+    while tokens[position][0] == '|':
+        node, position = _parse_and(tokens, position + 1)
+        nodes.append(node)
+    return (nodes[0] if len(nodes) == 1 else ('or', nodes)), position
+
+
+def _parse_and(tokens, position):
+    """Parse "factor & factor & ..." from tokens; return (node, position)."""
+    nodes = []
+    node, position = _parse_not(tokens, position)
+    nodes.append(node)
+    while tokens[position][0] == '&':
+        node, position = _parse_not(tokens, position + 1)
+        nodes.append(node)
+    return (nodes[0] if len(nodes) == 1 else ('and', nodes)), position
+
+
+def _parse_not(tokens, position):
+    """Parse "!factor", "(expr)", or a tag; return (node, next position)."""
+    kind, name = tokens[position]
+    if kind == '!':
+        node, position = _parse_not(tokens, position + 1)
+        return ('not', node), position
+    if kind == '(':
+        node, position = _parse_or(tokens, position + 1)
+        if tokens[position][0] != ')':
+            raise ValueError('Unbalanced parentheses')
+        return node, position + 1
+    if kind != 'tag':
+        raise ValueError('Expected a tag name')
+    return ('tag', name), position + 1
+
+
+def _query_tags(node):
+    """
+    Get the tags a parsed query depends on, for the query cache.
+
+    Negated terms match files by the tags they lack, so a query with any of
+    them depends on every tag: it includes the None tag (see TagStore._touch).
+
+    @param node: The parsed query (see query())
+    @type node: tuple
+    @return: The tag names
+    @rtype: set
+    """
+    kind, arg = node
+    if kind == 'tag':
+        return set([arg])
+    if kind == 'not':
+        return _query_tags(arg) | set([None])
+    return set().union(*[_query_tags(child) for child in arg])
+
+
+def _matches(node, has_tag):
+    """
+    Test a single file against a query node.
+
+    @param node: The parsed query (see query())
+    @type node: tuple
+    @param has_tag: Returns True if the file has the given tag
+    @type has_tag: callable
+    @rtype: bool
+    """
+    kind, arg = node
+    if kind == 'tag':
+        return has_tag(arg)
+    if kind == 'not':
+        return not _matches(arg, has_tag)
+    if kind == 'and':
+        return all(_matches(child, has_tag) for child in arg)
+    return any(_matches(child, has_tag) for child in arg)
+
+
+def memory_usage():
+    """
+    Estimate how much memory the in-memory tag map(s) are using, in bytes.
+
+    Uses the default store: see TagStore.memory_usage().
+    """
+    return DEFAULT_STORE.memory_usage()
@@ -0,0 +1,333 @@
+"""
+Taggart for asyncio: load, save, and query tags without blocking the loop.
+
+Every coroutine here does what the taggart function of the same name does,
+on the same store, but in an executor: file I/O, parsing, rendering, and
+waiting for the store's lock all happen off the event loop, which keeps
+running other coroutines in the meantime. Each coroutine takes two extra
+keyword arguments: the TagStore to use (taggart.DEFAULT_STORE if None), and
+the executor to run in (the loop's default executor if None).
+
+Requires Python 3.7 or later.
+"""
+
+import asyncio
+import functools
+import threading
+
+import taggart
+
+# How many batches of rendered output dump_to() lets pile up for the event
+# loop to write, before rendering waits for it to catch up
+PIPE_DEPTH = 4
+
+
+async def _run(store, executor, method, *args):
+    """
+    Call a method of a store in an executor, and wait for its result.
+
+    @param store: The store to use, or None for taggart.DEFAULT_STORE
+    @type store: taggart.TagStore
+    @param executor: The executor to use, or None for the loop's default
+    @type executor: concurrent.futures.Executor
+    @param method: The name of the TagStore method to call
+    @type method: str
+    @return: The method's return value
+    """
+    store = taggart.DEFAULT_STORE if store is None else store
+    return await asyncio.get_running_loop().run_in_executor(
+        executor, functools.partial(getattr(store, method), *args))
+
+
+async def load(input_file, overwrite=False, fmt=None, workers=1, store=None,
+               executor=None):
+    """
+    Load a list of tags from a file (see taggart.load()).
+
+    @param input_file: The name of the file to load
+    @type input_file: str
+    @param overwrite: If True, wipe the existing tag list in memory, if any.
+                      If False, append to the existing tag list in memory.
+    @type overwrite: bool
+    @param fmt: The format to use to parse the input: bin, json, text, or yaml
+    @type fmt: str: 'bin', 'json', 'text', or 'yaml'
+    @param workers: The number of processes to parse plain text files with
+    @type workers: int
+    @raise IOError: When input_file does not exist, or is not a bin file
+    """
+    await _run(store, executor, 'load', input_file, overwrite, fmt, workers)
+
+
+async def save(output_file, overwrite=True, fmt=None, store=None,
+               executor=None):
+    """
+    Save the list of tags to a file (see taggart.save()).
+
+    @param output_file: The name of the file to save
+    @type output_file: str
+    @param overwrite: If True, overwrite the file if it exists
+    @type overwrite: bool
+    @param fmt: The format to save the output in: bin, json, text, or yaml
+    @type fmt: str: 'bin', 'json', 'text', or 'yaml'
+    @raise IOError: When overwrite is False and output_file already exists
+    """
+    await _run(store, executor, 'save', output_file, overwrite, fmt)
+
+
+async def dump(fmt=taggart.FORMAT, store=None, executor=None):
+    """
+    Render output using a number of different formats (see taggart.dump()).
+
+    @param fmt: The format to render: 'json', 'text', or 'yaml'
+    @type fmt: str
+    @return: Rendered tag output
+    @rtype: str
+    """
+    return await _run(store, executor, 'dump', fmt)
+
+
+class _Pipe(object):
+    """
+    A file-like object that hands whatever is written to it to the event loop.
+
+    Writes come from an executor thread, and are put on an asyncio.Queue for
+    a coroutine to consume. At most PIPE_DEPTH writes may wait in the queue;
+    further writes block until the consumer has taken one (see taken()), or
+    fail once it has stopped consuming (see close()).
+    """
+
+    def __init__(self, loop, queue):
+        self._loop = loop
+        self._queue = queue
+        self._room = threading.Semaphore(PIPE_DEPTH)
+        self._closed = False
+
+    def write(self, data):
+        """Queue data for the event loop, waiting for room in the queue."""
+        self._room.acquire()
+        if self._closed:
+            raise IOError('Output has been closed!')
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, data)
+
+    def end(self):
+        """Tell the event loop that nothing more will be written."""
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, None)
+
+    def taken(self):
+        """Make room for another write, once the consumer has taken one."""
+        self._room.release()
+
+    def close(self):
+        """Make any waiting or further writes fail."""
+        self._closed = True
+        self._room.release()
+
+
+async def dump_to(writer, fmt=taggart.FORMAT, encoding='utf-8', store=None,
+                  executor=None):
+    """
+    Write output, in a number of different formats, to an asyncio stream.
+
+    The output is rendered in an executor, and written out in batches of
+    taggart.WRITE_SIZE chunks as it is rendered (see taggart.dump_to()). Each
+    batch is drained before the next is written, so slow readers hold back
+    the rendering, and other coroutines run between batches.
+
+    @param writer: The stream to write to, e.g. an asyncio.StreamWriter
+    @type writer: asyncio.StreamWriter
+    @param fmt: The format to render: 'json', 'text', or 'yaml'
+    @type fmt: str
+    @param encoding: The encoding to write the output in, or None to write
+                     str rather than bytes
+    @type encoding: str
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    pipe = _Pipe(loop, queue)
+    store = taggart.DEFAULT_STORE if store is None else store
+
+    def render():
+        try:
+            store.dump_to(pipe, fmt)
+        finally:
+            pipe.end()
+
+    rendered = loop.run_in_executor(executor, render)
+    try:
+        while True:
+            data = await queue.get()
+            if data is None:
+                break
+            pipe.taken()
+            writer.write(data.encode(encoding) if encoding else data)
+            await writer.drain()
+    finally:
+        pipe.close()
+        await asyncio.wait([rendered])
+    rendered.result()
+
+
+async def query(expression, after=None, limit=None, offset=0, store=None,
+                executor=None):
+    """
+    Get all files matching a boolean combination of tags (see query()).
+
+    @param expression: The query to run
+    @type expression: str or tuple
+    @param after: Only get files after this one (see taggart.query())
+    @type after: str
+    @param limit: The most files to get, or None for all of them
+    @type limit: int
+    @param offset: How many files to skip
+    @type offset: int
+    @return: A list of matching file names
+    @rtype: list of str
+    @raise ValueError: When the expression cannot be parsed, or when limit
+                       or offset is negative
+    """
+    return await _run(store, executor, 'query', expression, after, limit,
+                      offset)
+
+
+async def get_files_by_tag(tag_name, after=None, limit=None, offset=0,
+                           store=None, executor=None):
+    """
+    Given a tag, get all files associated with that tag.
+
+    @param tag_name: The name of the tag to query on
+    @type tag_name: str
+    @param after: Only get files after this one (see get_files_by_tag())
+    @type after: str
+    @param limit: The most files to get, or None for all of them
+    @type limit: int
+    @param offset: How many files to skip
+    @type offset: int
+    @return: A list of associated file names
+    @rtype: list of str
+    """
+    return await _run(store, executor, 'get_files_by_tag', tag_name, after,
+                      limit, offset)
+
+
+async def get_tags_by_file(file_name, after=None, limit=None, offset=0,
+                           store=None, executor=None):
+    """
+    Given a file, get all tags associated with that file.
+
+    @param file_name: The name of the file to query on
+    @type file_name: str
+    @param after: Only get tags after this one (see get_files_by_tag())
+    @type after: str
+    @param limit: The most tags to get, or None for all of them
+    @type limit: int
+    @param offset: How many tags to skip
+    @type offset: int
+    @return: A list of associated tag names
+    @rtype: list of str
+    """
+    return await _run(store, executor, 'get_tags_by_file', file_name, after,
+                      limit, offset)
+
+
+async def get_tags(after=None, limit=None, offset=0, store=None,
+                   executor=None):
+    """Self-explanatory: Get all tags currently in memory."""
+    return await _run(store, executor, 'get_tags', after, limit, offset)
+
+
+async def get_files(after=None, limit=None, offset=0, store=None,
+                    executor=None):
+    """Self-explanatory: Get all files with tags currently in memory."""
+    return await _run(store, executor, 'get_files', after, limit, offset)
+
+
+async def get_tags_by_prefix(prefix, store=None, executor=None):
+    """
+    Get all tags that start with a prefix.
+
+    @param prefix: The prefix to look for, e.g. 'camera/'
+    @type prefix: str
+    @return: A sorted list of tag names
+    @rtype: list of str
+    """
+    return await _run(store, executor, 'get_tags_by_prefix', prefix)
+
+
+async def get_files_by_tag_prefix(prefix, store=None, executor=None):
+    """
+    Get all files with any tag that starts with a prefix.
+
+    @param prefix: The prefix to look for, e.g. 'camera/'
+    @type prefix: str
+    @return: A sorted list of file names
+    @rtype: list of str
+    """
+    return await _run(store, executor, 'get_files_by_tag_prefix', prefix)
+
+
+async def get_files_under(directory, store=None, executor=None):
+    """
+    Get all files under a directory, at any depth.
+
+    @param directory: The name of the directory, e.g. '/data/2024'
+    @type directory: str
+    @return: A sorted list of file names
+    @rtype: list of str
+    """
+    return await _run(store, executor, 'get_files_under', directory)
+
+
+async def get_tags_under(directory, store=None, executor=None):
+    """
+    Get all tags applied to any file under a directory, at any depth.
+
+    @param directory: The name of the directory, e.g. '/data/2024'
+    @type directory: str
+    @return: A sorted list of tag names
+    @rtype: list of str
+    """
+    return await _run(store, executor, 'get_tags_under', directory)
+
+
+async def tag(file_names, tag_names, assert_exists=False, store=None,
+              executor=None):
+    """
+    Tag multiple files with multiple tags all at once (see taggart.tag()).
+
+    @param file_names: A file or a list of files to tag
+    @type file_names: str or list
+    @param tag_names: A tag or a list of tags to apply to the file or files
+    @type tag_names: str or list
+    @param assert_exists: If True, don't tag nonexistent files
+    @type assert_exists: bool
+    """
+    await _run(store, executor, 'tag', file_names, tag_names, assert_exists)
+
+
+async def untag(file_names, tag_names, store=None, executor=None):
+    """
+    Remove tags from files all at once (see taggart.untag()).
+
+    @param file_names: A file or a list of files to untag
+    @type file_names: str or list
+    @param tag_names: A tag or a list of tags to remove from the file or files
+    @type tag_names: str or list
+    """
+    await _run(store, executor, 'untag', file_names, tag_names)
+
+
+async def untag_under(directory, tag_names=None, store=None, executor=None):
+    """
+    Remove tags from every file under a directory (see taggart.untag_under()).
+
+    @param directory: The name of the directory, e.g. '/data/2024'
+    @type directory: str
+    @param tag_names: A tag or a list of tags to remove, or None to remove
+                      every tag
+    @type tag_names: str or list
+    """
+    await _run(store, executor, 'untag_under', directory, tag_names)
+
+
+get_tag_files = get_files_by_tag  # Alias
+get_file_tags = get_tags_by_file  # Alias
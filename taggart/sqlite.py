@@ -0,0 +1,460 @@
+"""
+Taggart for SQLite: keep a catalog on disk, in a database, instead of memory.
+
+An SQLiteStore is a TagStore whose tags live in an SQLite database file, in a
+single table of (tag, file) edges, indexed by tag and by file. Nothing but the
+sorted lists of tag and file names is kept in memory, so a catalog may be far
+bigger than RAM, and many processes may share one database at once.
+
+Every TagStore method works on it as-is: tagging and untagging apply whole
+batches of edges in a single transaction; lookups by tag or by file, and each
+term of a query, are lookups in one of the two indexes; renames are updates in
+place; and load() and save() import and export the same text, JSON, YAML, and
+binary files as any other store. To make the module-level functions of taggart
+use a database, make it the default store:
+
+    >>> import taggart
+    >>> from taggart.sqlite import SQLiteStore
+    >>> taggart.DEFAULT_STORE = SQLiteStore('catalog.db')
+"""
+
+import os
+import sqlite3
+import threading
+from collections.abc import Mapping
+from contextlib import contextmanager
+
+import taggart
+
+# How long to wait for another connection (or process) to finish writing,
+# in seconds, before giving up with sqlite3.OperationalError
+TIMEOUT = 30.0
+
+# How hard SQLite works to get each transaction onto disk (PRAGMA synchronous).
+#   In WAL mode, 'NORMAL' never corrupts the database, but the last
+# transactions before a power failure may be rolled back; 'FULL' also makes
+# every transaction durable, at the cost of a sync on every commit.
+SYNCHRONOUS = 'NORMAL'
+
+# The database schema: every (tag, file) edge, once, indexed in both
+# directions. The table is stored in tag order, and the index in file order,
+# so both the files of a tag and the tags of a file come out sorted.
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS edges ('
+    'tag TEXT NOT NULL, file TEXT NOT NULL, PRIMARY KEY (tag, file)'
+    ') WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS edges_by_file ON edges (file, tag)',
+)
+
+
+class SQLiteTagMap(Mapping):
+    """
+    A tag map (like THE_LIST) that reads its keys and values from a database.
+
+    Looking up a key is an index lookup, and gives a new SortedPostings of
+    its values, read in sorted order. The map cannot be changed: an
+    SQLiteStore changes the database itself. Like the sets of a MappedTagMap,
+    the sets it gives may be changed, but the database is not.
+    """
+
+    def __init__(self, store, key, value):
+        self._store = store
+        self._key = key  # The column holding the keys: 'tag' or 'file'
+        self._value = value  # The column holding the values
+
+    def _select(self, sql, *args):
+        """Run a query on the store's database, and get its rows."""
+        return self._store._connect().execute(
+            sql % {'key': self._key, 'value': self._value}, args).fetchall()
+
+    def __getitem__(self, key):
+        rows = self._select('SELECT %(value)s FROM edges WHERE %(key)s = ? '
+                            'ORDER BY %(value)s', key)
+        if not rows:
+            raise KeyError(key)
+        return taggart.SortedPostings._from_sorted([row[0] for row in rows])
+
+    def __contains__(self, key):
+        return bool(self._select(
+            'SELECT 1 FROM edges WHERE %(key)s = ? LIMIT 1', key))
+
+    def __iter__(self):
+        return iter(self.names())
+
+    def __len__(self):
+        return self._select('SELECT COUNT(DISTINCT %(key)s) FROM edges')[0][0]
+
+    def names(self):
+        """Get every key, sorted."""
+        return [row[0] for row in self._select(
+            'SELECT DISTINCT %(key)s FROM edges ORDER BY %(key)s')]
+
+    def count(self, key):
+        """Count the values of a key, without reading them."""
+        return self._select(
+            'SELECT COUNT(*) FROM edges WHERE %(key)s = ?', key)[0][0]
+
+
+class SQLiteStore(taggart.TagStore):
+    """
+    A catalog of tags, held in an SQLite database (see this module).
+
+    The store is always mapped bidirectionally: the_list is an SQLiteTagMap
+    of tags to files, and the_reverse_list one of files to tags. Each thread
+    opens its own connection to the database. The database is in WAL mode, so
+    readers never wait for writers, nor writers for readers; writers, in any
+    process, take turns (see TIMEOUT).
+
+    Results are cached as in any TagStore, and so are the sorted lists of tag
+    and file names. Changes made by any other connection, in this process or
+    another, drop every cached result the next time one is asked for.
+    """
+
+    def __init__(self, database, journal=None):
+        """
+        Open a database, creating it if it does not exist.
+
+        @param database: The name of the database file
+        @type database: str
+        @param journal: The name of a journal file, or None (see JOURNAL)
+        @type journal: str
+        """
+        super(SQLiteStore, self).__init__(taggart.BIDIRECTIONAL, journal)
+        self.database = database
+        self.the_list = SQLiteTagMap(self, 'tag', 'file')
+        self.the_reverse_list = SQLiteTagMap(self, 'file', 'tag')
+        self._local = threading.local()  # Each thread's connection
+        self._connections = []  # Every thread's connection, to close them
+        self._connections_lock = threading.Lock()
+
+        connection = self._connect()
+        connection.execute('PRAGMA journal_mode = WAL')
+        with self._transaction() as connection:
+            for statement in SCHEMA:
+                connection.execute(statement)
+
+    def _connect(self):
+        """
+        Get this thread's connection to the database, opening it if need be.
+
+        @return: The connection, in autocommit mode (see _transaction())
+        @rtype: sqlite3.Connection
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.database, timeout=TIMEOUT, isolation_level=None,
+                check_same_thread=False)  # So that close() may close it
+            connection.execute('PRAGMA synchronous = %s' % SYNCHRONOUS)
+            self._local.connection = connection
+            self._local.depth = 0  # How many _transaction()s are open
+            self._local.data_version = None  # See _sync()
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Run a block in a transaction, committed when the block ends.
+
+        The transaction takes the database for writing from the start, so it
+        never has to wait for a lock halfway through. Transactions opened
+        within a transaction are part of it: only the outermost commits, or
+        rolls everything back should the block raise an exception.
+
+        @return: A context manager giving this thread's connection
+        """
+        connection = self._connect()
+        local = self._local
+
+        if local.depth:
+            local.depth += 1
+            try:
+                yield connection
+            finally:
+                local.depth -= 1
+            return
+
+        connection.execute('BEGIN IMMEDIATE')
+        local.depth = 1
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        else:
+            connection.execute('COMMIT')
+        finally:
+            local.depth = 0
+
+    def _sync(self):
+        """
+        Drop every cached result if another connection changed the database.
+
+        SQLite counts the changes committed by other connections (PRAGMA
+        data_version), which this thread compares with what it saw last.
+        """
+        data_version = self._connect().execute(
+            'PRAGMA data_version').fetchone()[0]
+        if data_version != self._local.data_version:
+            if self._local.data_version is not None:
+                self.generation += 1
+                self._invalidate()
+            self._local.data_version = data_version
+
+    @taggart._writes
+    def close(self):
+        """Close every thread's connection to the database."""
+        with self._connections_lock:
+            for connection in self._connections:
+                connection.close()
+            del self._connections[:]
+        self._local = threading.local()
+
+    def _cached(self, key, tag_names, file_names, compute, *args):
+        """See TagStore._cached(), after catching up with other connections."""
+        self._sync()
+        return super(SQLiteStore, self)._cached(
+            key, tag_names, file_names, compute, *args)
+
+    def _index(self, kind, tag_map, keyed):
+        """
+        Get a sorted index of every tag (or file) name in the database.
+
+        Indexes are kept in _indexes until the store changes, as in any
+        TagStore, but are read again from the database, already sorted,
+        rather than updated.
+        """
+        self._sync()
+        index = self._indexes.get(kind)
+        if index is None or index[0] != self.generation:
+            index = (self.generation, tag_map.names())
+            self._indexes[kind] = index
+        return index[1]
+
+    def _estimate(self, node):
+        """See TagStore._estimate(): tags are counted in the database."""
+        if node[0] == 'tag':
+            return self.the_list.count(node[1])
+        return super(SQLiteStore, self)._estimate(node)
+
+    def _under(self, columns, directory):
+        """
+        Select from the edges of the files under a directory, in file order.
+
+        Each path separator gives a range of the file index to read, holding
+        the files whose names start with the directory's name and that
+        separator, so no directory tree is kept in memory.
+
+        @param columns: The columns to select, e.g. 'DISTINCT file'
+        @type columns: str
+        @param directory: The name of the directory (see
+                          TagStore.get_files_under())
+        @type directory: str
+        @return: The selected rows
+        @rtype: list of tuple
+        """
+        directory = directory.rstrip('/' + os.sep)
+        ranges, args = ['file = ?'], [directory]
+        for prefix in set(directory + sep for sep in ('/', os.sep)):
+            ranges.append('(file >= ? AND file < ?)')
+            args.extend((prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)))
+
+        return self._connect().execute(
+            'SELECT %s FROM edges WHERE %s ORDER BY file' % (
+                columns, ' OR '.join(ranges)), args).fetchall()
+
+    def _files_under(self, directory):
+        """See TagStore._files_under(): files are read from the database."""
+        return [row[0] for row in self._under('DISTINCT file', directory)]
+
+    def _edges_under(self, directory):
+        """See TagStore._edges_under(): edges are read from the database."""
+        return self._under('file, tag', directory)
+
+    def _tag(self, file_name, tag_name, assert_exists=False):
+        """See TagStore._tag()."""
+        if assert_exists and not os.path.exists(file_name):
+            err = 'File "%s" not found!' % file_name
+            taggart.logger.error(err)
+            raise IOError(err)
+
+        self._tag_batch([(file_name, tag_name)])
+
+    def _tag_batch(self, edges):
+        """Apply a batch of (file, tag) pairs in one transaction."""
+        with self._transaction() as connection:
+            cursor = connection.executemany(
+                'INSERT OR IGNORE INTO edges (file, tag) VALUES (?, ?)', edges)
+            if taggart.METRICS:
+                taggart._changed(cursor.rowcount)
+
+        self._touch(edges)
+
+    def _untag(self, file_name, tag_name):
+        """See TagStore._untag()."""
+        self._untag_batch([(file_name, tag_name)])
+
+    def _untag_batch(self, edges):
+        """Remove a batch of (file, tag) pairs in one transaction."""
+        with self._transaction() as connection:
+            cursor = connection.executemany(
+                'DELETE FROM edges WHERE file = ? AND tag = ?', edges)
+            if taggart.METRICS:
+                taggart._changed(cursor.rowcount)
+
+        self._touch(edges)
+
+    def _rename_tag(self, old_tag, new_tag):
+        """See TagStore._rename_tag(): its edges are updated in place."""
+        if old_tag == new_tag:
+            return
+
+        with self._transaction() as connection:
+            file_names = self.the_list.get(old_tag, ())
+            moved = connection.execute('UPDATE OR IGNORE edges SET tag = ? '
+                                       'WHERE tag = ?', (new_tag, old_tag))
+            merged = connection.execute('DELETE FROM edges WHERE tag = ?',
+                                        (old_tag,))
+            if taggart.METRICS:
+                taggart._changed(2 * moved.rowcount + merged.rowcount)
+
+        self._touch((file_name, tag_name) for file_name in file_names
+                    for tag_name in (old_tag, new_tag))
+
+    def _rename_file(self, old_file, new_file):
+        """See TagStore._rename_file(): its edges are updated in place."""
+        if old_file == new_file:
+            return
+
+        with self._transaction() as connection:
+            tag_names = self.the_reverse_list.get(old_file, ())
+            moved = connection.execute('UPDATE OR IGNORE edges SET file = ? '
+                                       'WHERE file = ?', (new_file, old_file))
+            merged = connection.execute('DELETE FROM edges WHERE file = ?',
+                                        (old_file,))
+            if taggart.METRICS:
+                taggart._changed(2 * moved.rowcount + merged.rowcount)
+
+        self._touch((file_name, tag_name) for tag_name in tag_names
+                    for file_name in (old_file, new_file))
+
+    def _rename_files(self, renames):
+        """
+        See TagStore._rename_files().
+
+        Every renamed file's edges are read, deleted, and added again under
+        the new names, all in one transaction, so files may swap names.
+        """
+        with self._transaction() as connection:
+            moved = [(old_file, new_file, self.the_reverse_list[old_file])
+                     for old_file, new_file in renames.items()
+                     if old_file != new_file and old_file in
+                     self.the_reverse_list]
+            removed = connection.executemany(
+                'DELETE FROM edges WHERE file = ?',
+                [(old_file,) for old_file, _, _ in moved])
+            added = connection.executemany(
+                'INSERT OR IGNORE INTO edges (file, tag) VALUES (?, ?)',
+                [(new_file, tag_name) for _, new_file, tag_names in moved
+                 for tag_name in tag_names])
+            if taggart.METRICS:
+                taggart._changed(removed.rowcount + added.rowcount)
+
+        self._touch((file_name, tag_name)
+                    for old_file, new_file, tag_names in moved
+                    for tag_name in tag_names
+                    for file_name in (old_file, new_file))
+
+    def _clear(self):
+        """Delete every edge, within the current transaction."""
+        self._connect().execute('DELETE FROM edges')
+
+    @taggart._writes
+    def init(self, data, overwrite=False, fmt=taggart.FORMAT):
+        """
+        Import tags from string input (see TagStore.init()).
+
+        @param data: The data to parse and add to the database
+        @type data: str
+        @param overwrite: If True, delete every tag in the database first
+        @type overwrite: bool
+        @param fmt: The format to use to parse the input: json, text, or yaml
+        @type fmt: str: 'json', 'text', or 'yaml'
+        """
+        tag_map = taggart.parse(data, fmt, taggart.TAG_TO_FILE)
+        self._import(((file_name, tag_name)
+                      for tag_name, file_names in tag_map.items()
+                      for file_name in file_names), overwrite)
+
+    def _import(self, edges, overwrite):
+        """
+        Apply (file, tag) pairs in batches, all in one transaction.
+
+        @param edges: The (file name, tag name) pairs to apply
+        @type edges: iterable of tuple
+        @param overwrite: If True, delete every tag in the database first
+        @type overwrite: bool
+        """
+        self._invalidate()
+
+        with self._transaction():
+            if overwrite:
+                self._clear()
+            for batch in taggart._batches(edges):
+                self._tag_batch(batch)
+
+    @taggart._writes
+    def load(self, input_file, overwrite=False, fmt=None, workers=1):
+        """
+        Import tags from a file (see TagStore.load()).
+
+        Plain text and binary files are streamed into the database a batch at
+        a time; JSON and YAML files are read whole and passed to init(). The
+        whole file is imported in a single transaction, so other connections
+        see either none of it or all of it.
+
+        @param input_file: The name of the file to load
+        @type input_file: str
+        @param overwrite: If True, delete every tag in the database first
+        @type overwrite: bool
+        @param fmt: The format to use to parse the input: bin, json, text, or
+                    yaml
+        @type fmt: str: 'bin', 'json', 'text', or 'yaml'
+        @param workers: Ignored: the database is written by one process
+        @type workers: int
+        @raise IOError: When input_file does not exist, or is not a bin file
+        """
+        if not os.path.exists(input_file):
+            err = 'File "%s" not found!' % input_file
+            taggart.logger.error(err)
+            raise IOError(err)
+
+        if not fmt:
+            fmt = taggart.getfmt(taggart.getext(input_file).lower())
+
+        if fmt == 'text':
+            self._import(taggart.iter_edges(input_file), overwrite)
+        elif fmt == 'bin':
+            self._import(taggart.Snapshot(input_file).edges(), overwrite)
+        else:
+            f = open(input_file, 'r')
+            data = f.read()
+            f.close()
+
+            self.init(data, overwrite, fmt)
+
+        if self.journal is not None and os.path.exists(self.journal):
+            self.replay(self.journal, input_file)
+
+    @taggart._writes
+    def remap(self, map_as=None):
+        """
+        Do nothing: the database is always indexed in both directions.
+
+        @param map_as: Ignored (see TagStore.remap())
+        @type map_as: str
+        """
+        taggart.logger.info('SQLite stores are always mapped %s.',
+                            self.mapping)
@@ -1,20 +1,24 @@
+import asyncio
+import builtins
 import copy
+import json
+import logging
 import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
+from importlib import reload
 from unittest import TestCase
 
-try:
-    from importlib import reload  # Python>=3.4
-except ImportError:  # NOCOV
-    from imp import reload  # Python<3.4
-
-try:
-    import builtins  # Python>=3
-except ImportError:  # NOCOV
-    import __builtin__ as builtins  # Python<3
-
-from mock import call, patch
+from mock import Mock, call, patch
 
 import taggart
+from taggart import aio
+from taggart.sqlite import SQLiteStore
 
 
 class BaseCase(TestCase):
@@ -34,10 +38,10 @@ class Taggart_TTF_BaseCase(BaseCase):
         taggart.logger.setLevel('CRITICAL')
         taggart.MAPPING = taggart.TAG_TO_FILE
         taggart.THE_LIST = {
-            'Tag A': ['file_1'],
-            'Tag B': ['file_2', 'file_3'],
-            'Tag C': ['file_2', 'file_3'],
-            'Tag D': ['file_3']
+            'Tag A': {'file_1'},
+            'Tag B': {'file_2', 'file_3'},
+            'Tag C': {'file_2', 'file_3'},
+            'Tag D': {'file_3'}
         }
 
 
@@ -48,12 +52,60 @@ class Taggart_FTT_BaseCase(BaseCase):
         taggart.logger.setLevel('CRITICAL')
         taggart.MAPPING = taggart.FILE_TO_TAG
         taggart.THE_LIST = {
-            'file_1': ['Tag A'],
-            'file_2': ['Tag B', 'Tag C'],
-            'file_3': ['Tag B', 'Tag C', 'Tag D']
+            'file_1': {'Tag A'},
+            'file_2': {'Tag B', 'Tag C'},
+            'file_3': {'Tag B', 'Tag C', 'Tag D'}
         }
 
 
+class Taggart_BIDI_BaseCase(BaseCase):
+    def setUp(self):
+        super(Taggart_BIDI_BaseCase, self).setUp()
+        reload(taggart)
+        taggart.logger.setLevel('CRITICAL')
+        taggart.MAPPING = taggart.BIDIRECTIONAL
+        taggart.THE_LIST = {
+            'Tag A': {'file_1'},
+            'Tag B': {'file_2', 'file_3'},
+            'Tag C': {'file_2', 'file_3'},
+            'Tag D': {'file_3'}
+        }
+        taggart._reindex()
+
+
+class Taggart_ARRAY_BaseCase(Taggart_TTF_BaseCase):
+    def setUp(self):
+        super(Taggart_ARRAY_BaseCase, self).setUp()
+        taggart.POSTINGS = taggart.ARRAY_POSTINGS
+        taggart.THE_LIST = {
+            k: taggart.Postings(v) for k, v in taggart.THE_LIST.items()}
+
+
+class Taggart_SORTED_BaseCase(Taggart_TTF_BaseCase):
+    def setUp(self):
+        super(Taggart_SORTED_BaseCase, self).setUp()
+        taggart.POSTINGS = taggart.SORTED_POSTINGS
+        taggart.THE_LIST = {
+            k: taggart.SortedPostings(v) for k, v in taggart.THE_LIST.items()}
+
+
+class Taggart_SQLITE_BaseCase(BaseCase):
+    def setUp(self):
+        super(Taggart_SQLITE_BaseCase, self).setUp()
+        reload(taggart)
+        taggart.logger.setLevel('CRITICAL')
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.store = SQLiteStore(os.path.join(directory, 'tags.db'))
+        self.addCleanup(self.store.close)
+        self.store.tag_edges([
+            ('file_1', 'Tag A'), ('file_2', 'Tag B'), ('file_3', 'Tag B'),
+            ('file_2', 'Tag C'), ('file_3', 'Tag C'), ('file_3', 'Tag D')])
+        self.addCleanup(
+            setattr, taggart, 'DEFAULT_STORE', taggart.DEFAULT_STORE)
+        taggart.DEFAULT_STORE = self.store
+
+
 class tag_TTF_TestCase(Taggart_TTF_BaseCase):
     def test_tag_internal_assert_exists(self):
         self.exists_mock.return_value = False
@@ -65,11 +117,15 @@ class tag_TTF_TestCase(Taggart_TTF_BaseCase):
         taggart._tag('new_file', 'New Tag')
         taggart._tag('other_file', 'New Tag')
         self.assertEqual(
-            ['new_file', 'other_file'], taggart.THE_LIST.get('New Tag'))
+            {'new_file', 'other_file'}, taggart.THE_LIST.get('New Tag'))
 
     def test_tag(self):
         taggart.tag('new_file', 'New Tag')
-        self.assertEqual(['new_file'], taggart.THE_LIST.get('New Tag'))
+        self.assertEqual({'new_file'}, taggart.THE_LIST.get('New Tag'))
+
+    def test_tag_twice_keeps_one_copy(self):
+        taggart.tag('file_1', 'Tag A')
+        self.assertEqual({'file_1'}, taggart.THE_LIST.get('Tag A'))
 
     @patch.object(taggart, 'logger')
     def test_tag_warns_on_nonexistance(self, log_mock):
@@ -82,25 +138,129 @@ class tag_TTF_TestCase(Taggart_TTF_BaseCase):
     @patch.object(taggart, 'logger')
     def test_tag_works_with_many_files_and_tags(self, log_mock):
         self.exists_mock.return_value = None
-        # TODO: This needs to be optimized.
-        self.exists_mock.side_effect = [True, False, True, True, False, True]
+        self.exists_mock.side_effect = [True, False, True]
         taggart.tag(['a', 'b', 'c'], ['A', 'B'], assert_exists=True)
-        self.assertEqual(6, self.exists_mock.call_count)
-        self.exists_mock.assert_has_calls([
-            call('a'), call('b'), call('c'),
-            call('a'), call('b'), call('c')
-        ])
-        self.assertEqual(['a', 'c'], taggart.THE_LIST.get('A'))
-        self.assertEqual(['a', 'c'], taggart.THE_LIST.get('B'))
-        self.assertEqual(2, log_mock.warn.call_count)
+        self.assertEqual(3, self.exists_mock.call_count)
+        self.exists_mock.assert_has_calls([call('a'), call('b'), call('c')])
+        self.assertEqual({'a', 'c'}, taggart.THE_LIST.get('A'))
+        self.assertEqual({'a', 'c'}, taggart.THE_LIST.get('B'))
+        self.assertEqual(1, log_mock.warn.call_count)
 
 
 class tag_FTT_TestCase(Taggart_FTT_BaseCase):
+    def test_tag_internal(self):
+        taggart._tag('new_file', 'New Tag')
+        taggart._tag('new_file', 'Other Tag')
+        self.assertEqual(
+            {'New Tag', 'Other Tag'}, taggart.THE_LIST.get('new_file'))
+
     def test_tag(self):
         taggart.tag('new_file', 'New Tag')
         taggart.tag('new_file', 'Other Tag')
         self.assertEqual(
-            ['New Tag', 'Other Tag'], taggart.THE_LIST.get('new_file'))
+            {'New Tag', 'Other Tag'}, taggart.THE_LIST.get('new_file'))
+
+
+class tag_BIDI_TestCase(Taggart_BIDI_BaseCase):
+    def test_tag_updates_both_maps(self):
+        taggart.tag('new_file', ['New Tag', 'Tag A'])
+        self.assertEqual({'new_file'}, taggart.THE_LIST.get('New Tag'))
+        self.assertEqual(
+            ['file_1', 'new_file'], sorted(taggart.THE_LIST.get('Tag A')))
+        self.assertEqual(
+            ['New Tag', 'Tag A'],
+            sorted(taggart.THE_REVERSE_LIST.get('new_file')))
+
+    def test_single_tag_updates_both_maps(self):
+        taggart._tag('new_file', 'Tag A')
+        self.assertEqual(
+            ['file_1', 'new_file'], sorted(taggart.THE_LIST.get('Tag A')))
+        self.assertEqual({'Tag A'}, taggart.THE_REVERSE_LIST.get('new_file'))
+
+
+class tag_ARRAY_TestCase(Taggart_ARRAY_BaseCase):
+    def test_tag(self):
+        taggart.tag(['new_file', 'file_1'], ['New Tag', 'Tag A'])
+        self.assertIsInstance(
+            taggart.THE_LIST.get('New Tag'), taggart.Postings)
+        self.assertEqual(
+            {'file_1', 'new_file'}, taggart.THE_LIST.get('New Tag'))
+        self.assertEqual({'file_1', 'new_file'}, taggart.THE_LIST.get('Tag A'))
+
+    def test_tag_internal(self):
+        taggart._tag('new_file', 'New Tag')
+        self.assertIsInstance(
+            taggart.THE_LIST.get('New Tag'), taggart.Postings)
+        self.assertEqual({'new_file'}, taggart.THE_LIST.get('New Tag'))
+
+    def test_tag_interns_names(self):
+        taggart.tag('new_file', 'New Tag')
+        tag_name = [k for k in taggart.THE_LIST if k == 'New Tag'][0]
+        self.assertIs(taggart.SYMBOL_NAMES[taggart.SYMBOL_IDS['New Tag']],
+                      tag_name)
+        self.assertEqual(
+            len(taggart.SYMBOL_NAMES), len(set(taggart.SYMBOL_NAMES)))
+
+
+class tag_edges_BaseCase(object):
+    def test_tag_edges(self):
+        taggart.tag_edges([
+            ('new_file', 'New Tag'), ('file_1', 'New Tag'),
+            ('new_file', 'Tag A'), ('new_file', 'New Tag')])
+        self.assertEqual(['file_1', 'new_file'],
+                         taggart.get_files_by_tag('New Tag'))
+        self.assertEqual(['file_1', 'new_file'],
+                         taggart.get_files_by_tag('Tag A'))
+        self.assertEqual(['New Tag', 'Tag A'],
+                         taggart.get_tags_by_file('new_file'))
+
+    def test_tag_edges_in_batches(self):
+        taggart.BATCH_SIZE = 2
+        taggart.tag_edges(('file_%d' % i, 'Tag %d' % (i % 2))
+                          for i in range(5))
+        self.assertEqual(['file_0', 'file_2', 'file_4'],
+                         taggart.get_files_by_tag('Tag 0'))
+        self.assertEqual(['file_1', 'file_3'],
+                         taggart.get_files_by_tag('Tag 1'))
+
+    @patch.object(taggart, 'logger')
+    def test_tag_edges_checks_each_file_once(self, log_mock):
+        self.exists_mock.side_effect = lambda file_name: file_name != 'gone'
+        taggart.BATCH_SIZE = 2
+        taggart.tag_edges([('gone', 'A'), ('here', 'A'), ('gone', 'B'),
+                           ('here', 'B'), ('gone', 'C')], assert_exists=True)
+        self.assertEqual(2, self.exists_mock.call_count)
+        self.assertEqual(1, log_mock.warn.call_count)
+        self.assertEqual(['A', 'B'], taggart.get_tags_by_file('here'))
+        self.assertEqual([], taggart.get_tags_by_file('gone'))
+
+
+class tag_edges_TTF_TestCase(tag_edges_BaseCase, Taggart_TTF_BaseCase):
+    pass
+
+
+class tag_edges_FTT_TestCase(tag_edges_BaseCase, Taggart_FTT_BaseCase):
+    pass
+
+
+class tag_edges_BIDI_TestCase(tag_edges_BaseCase, Taggart_BIDI_BaseCase):
+    pass
+
+
+class tag_edges_ARRAY_TestCase(tag_edges_BaseCase, Taggart_ARRAY_BaseCase):
+    pass
+
+
+class tag_edges_SORTED_TestCase(tag_edges_BaseCase, Taggart_SORTED_BaseCase):
+    def test_new_tags_get_sorted_postings(self):
+        taggart.tag_edges([('file_9', 'Tag Z'), ('file_8', 'Tag Z')])
+        self.assertIsInstance(taggart.THE_LIST['Tag Z'],
+                              taggart.SortedPostings)
+        self.assertEqual(['file_8', 'file_9'], list(taggart.THE_LIST['Tag Z']))
+
+
+class tag_edges_SQLITE_TestCase(tag_edges_BaseCase, Taggart_SQLITE_BaseCase):
+    pass
 
 
 class untag_TTF_TestCase(Taggart_TTF_BaseCase):
@@ -116,13 +276,13 @@ class untag_TTF_TestCase(Taggart_TTF_BaseCase):
 
     def test_untag(self):
         taggart.untag('file_3', 'Tag C')
-        self.assertEqual(['file_2'], taggart.THE_LIST.get('Tag C'))
+        self.assertEqual({'file_2'}, taggart.THE_LIST.get('Tag C'))
 
     def test_untag_works_with_many_files_and_tags(self):
         taggart.untag(['file_1', 'file_2', 'file_3'], ['Tag B', 'Tag C'])
         self.assertEqual({
-            'Tag A': ['file_1'],
-            'Tag D': ['file_3']
+            'Tag A': {'file_1'},
+            'Tag D': {'file_3'}
         }, taggart.THE_LIST)
 
 
@@ -138,6 +298,68 @@ class untag_FTT_TestCase(Taggart_FTT_BaseCase):
             ['file_2', 'file_3'], sorted(list(taggart.THE_LIST.keys())))
 
 
+class untag_BIDI_TestCase(Taggart_BIDI_BaseCase):
+    def test_untag_updates_both_maps(self):
+        taggart.untag('file_1', 'Tag A')
+        taggart.untag('file_3', 'Tag B')
+        self.assertEqual(None, taggart.THE_LIST.get('Tag A'))
+        self.assertEqual(None, taggart.THE_REVERSE_LIST.get('file_1'))
+        self.assertEqual({'file_2'}, taggart.THE_LIST.get('Tag B'))
+        self.assertEqual(
+            ['Tag C', 'Tag D'],
+            sorted(taggart.THE_REVERSE_LIST.get('file_3')))
+
+    def test_single_untag_updates_both_maps(self):
+        taggart._untag('file_1', 'Tag A')
+        self.assertEqual(None, taggart.THE_LIST.get('Tag A'))
+        self.assertEqual(None, taggart.THE_REVERSE_LIST.get('file_1'))
+
+
+class untag_ARRAY_TestCase(Taggart_ARRAY_BaseCase):
+    def test_untag(self):
+        taggart.untag(['file_1', 'file_3', 'new_file'], ['Tag A', 'Tag C'])
+        self.assertEqual(None, taggart.THE_LIST.get('Tag A'))
+        self.assertEqual({'file_2'}, taggart.THE_LIST.get('Tag C'))
+
+
+class untag_edges_BaseCase(object):
+    def test_untag_edges(self):
+        taggart.untag_edges([
+            ('file_1', 'Tag A'), ('file_2', 'Tag B'), ('file_3', 'Tag B'),
+            ('file_3', 'Tag D'), ('file_2', 'Tag B'), ('new_file', 'Tag C'),
+            ('file_1', 'New Tag')])
+        self.assertEqual(['Tag C'], taggart.get_tags())
+        self.assertEqual(['file_2', 'file_3'], taggart.get_files())
+        self.assertEqual(['Tag C'], taggart.get_tags_by_file('file_3'))
+
+
+class untag_edges_TTF_TestCase(untag_edges_BaseCase, Taggart_TTF_BaseCase):
+    pass
+
+
+class untag_edges_FTT_TestCase(untag_edges_BaseCase, Taggart_FTT_BaseCase):
+    pass
+
+
+class untag_edges_BIDI_TestCase(untag_edges_BaseCase, Taggart_BIDI_BaseCase):
+    pass
+
+
+class untag_edges_ARRAY_TestCase(
+        untag_edges_BaseCase, Taggart_ARRAY_BaseCase):
+    pass
+
+
+class untag_edges_SORTED_TestCase(
+        untag_edges_BaseCase, Taggart_SORTED_BaseCase):
+    pass
+
+
+class untag_edges_SQLITE_TestCase(
+        untag_edges_BaseCase, Taggart_SQLITE_BaseCase):
+    pass
+
+
 class dump_json_TTF_TestCase(Taggart_TTF_BaseCase):
     def test_dump_json(self):
         expect = (
@@ -147,6 +369,14 @@ class dump_json_TTF_TestCase(Taggart_TTF_BaseCase):
             ' "Tag D": ["file_3"]}')
         self.assertEqual(expect, taggart.dump_json())
 
+    def test_dump_json_sorts_files(self):
+        taggart.tag('file_0', 'Tag D')
+        self.assertEqual(
+            '{"Tag A": ["file_1"],'
+            ' "Tag B": ["file_2", "file_3"],'
+            ' "Tag C": ["file_2", "file_3"],'
+            ' "Tag D": ["file_0", "file_3"]}', taggart.dump_json())
+
 
 class dump_json_FTT_TestCase(Taggart_FTT_BaseCase):
     def test_dump_json(self):
@@ -174,6 +404,15 @@ class dump_text_TTF_TestCase(dump_text_BaseCase, Taggart_TTF_BaseCase):
         self.assertEqual(self.sorted_output, taggart.dump_text(sort=False))
         self.assertEqual(self.sorted_output, taggart.dump_text(sort=True))
 
+    def test_dump_text_sorts_by_whole_line(self):
+        taggart.THE_LIST = {'Tag': {'file_1'}, 'Tag A': {'file_2'}}
+        unsorted_output = os.linesep.join(
+            ['Tag<==>file_1', 'Tag A<==>file_2', ''])
+        sorted_output = os.linesep.join(
+            ['Tag A<==>file_2', 'Tag<==>file_1', ''])
+        self.assertEqual(unsorted_output, taggart.dump_text(sort=False))
+        self.assertEqual(sorted_output, taggart.dump_text(sort=True))
+
 
 class dump_text_FTT_TestCase(dump_text_BaseCase, Taggart_FTT_BaseCase):
     def test_dump_text(self):
@@ -187,6 +426,33 @@ Tag D<==>file_3
         self.assertEqual(unsorted_output, taggart.dump_text(sort=False))
         self.assertEqual(self.sorted_output, taggart.dump_text(sort=True))
 
+    def test_dump_text_sorts_like_tag_to_file(self):
+        edges = [('file', 'Tag'), ('file\t', 'Tag'), ('file_2', 'Tag A')]
+        outputs = []
+        for mapping in (taggart.FILE_TO_TAG, taggart.TAG_TO_FILE):
+            store = taggart.TagStore(mapping)
+            store.tag_edges(edges)
+            outputs.append(store.dump_text(sort=True))
+        self.assertEqual(os.linesep.join(
+            ['Tag A<==>file_2', 'Tag<==>file', 'Tag<==>file\t', '']),
+            outputs[0])
+        self.assertEqual(outputs[1], outputs[0])
+
+
+class dump_text_BIDI_TestCase(dump_text_BaseCase, Taggart_BIDI_BaseCase):
+    def test_dump_text(self):
+        self.assertEqual(self.sorted_output, taggart.dump_text(sort=False))
+
+
+class dump_text_ARRAY_TestCase(dump_text_BaseCase, Taggart_ARRAY_BaseCase):
+    def test_dump_text(self):
+        self.assertEqual(self.sorted_output, taggart.dump_text(sort=False))
+
+
+class dump_text_SORTED_TestCase(dump_text_BaseCase, Taggart_SORTED_BaseCase):
+    def test_dump_text(self):
+        self.assertEqual(self.sorted_output, taggart.dump_text(sort=False))
+
 
 class dump_yaml_TTF_TestCase(Taggart_TTF_BaseCase):
     def test_dump_yaml(self):
@@ -220,47 +486,88 @@ file_3:
 
 
 class dump_TestCase(BaseCase):
-    @patch.object(taggart, 'dump_json')
+    @patch('taggart.TagStore.dump_json')
     def test_dump_json(self, json_mock):
         result = taggart.dump('json')
         self.assertIs(result, json_mock.return_value)
 
-    @patch.object(taggart, 'dump_yaml')
+    @patch('taggart.TagStore.dump_yaml')
     def test_dump_yaml(self, yaml_mock):
         result = taggart.dump('yaml')
         self.assertIs(result, yaml_mock.return_value)
 
-    @patch.object(taggart, 'dump_text')
+    @patch('taggart.TagStore.dump_text')
     def test_dump_text(self, text_mock):
         result = taggart.dump('text')
         self.assertIs(result, text_mock.return_value)
 
 
+class dump_to_BaseCase(object):
+    def test_dump_to_matches_dump(self):
+        taggart.WRITE_SIZE = 2
+        for fmt in ('json', 'text', 'yaml'):
+            output = StringIO()
+            taggart.dump_to(output, fmt)
+            self.assertEqual(taggart.dump(fmt), output.getvalue())
+
+    def test_dump_to_writes_in_chunks(self):
+        taggart.WRITE_SIZE = 2
+        output = Mock()
+        taggart.dump_to(output, 'text')
+        self.assertEqual(3, output.write.call_count)
+
+
+class dump_to_TTF_TestCase(dump_to_BaseCase, Taggart_TTF_BaseCase):
+    pass
+
+
+class dump_to_FTT_TestCase(dump_to_BaseCase, Taggart_FTT_BaseCase):
+    pass
+
+
+class dump_to_SQLITE_TestCase(dump_to_BaseCase, Taggart_SQLITE_BaseCase):
+    pass
+
+
 class save_TestCase(BaseCase):
     def test_save_rasies_error_when_file_exists_without_overwrite(self):
         self.exists_mock.return_value = True
         self.assertRaises(IOError, taggart.save, 'output.txt', overwrite=False)
 
-    @patch.object(taggart, 'dump')
-    def test_save_success(self, dump_mock):
-        dump_mock.return_value = 'success'
+    @patch('taggart.TagStore.dump_to')
+    def test_save_success(self, dump_to_mock):
         taggart.save('output.txt')
-        dump_mock.assert_called_once_with('text')
         self.open_mock.assert_called_once_with('output.txt', 'w')
-        self.file_mock.write.assert_called_once_with('success')
+        dump_to_mock.assert_called_once_with(self.file_mock, 'text')
+        self.file_mock.close.assert_called_once_with()
+
+    @patch.object(taggart.os, 'replace')
+    @patch('taggart.TagStore.dump_bin')
+    def test_save_bin(self, dump_bin_mock, replace_mock):
+        taggart.save('output.bin')
+        self.open_mock.assert_called_once_with('output.bin.tmp', 'wb')
+        dump_bin_mock.assert_called_once_with(self.file_mock)
+        self.file_mock.close.assert_called_once_with()
+        replace_mock.assert_called_once_with('output.bin.tmp', 'output.bin')
+
+    @patch('taggart.TagStore.dump_to')
+    def test_save_closes_file_on_error(self, dump_to_mock):
+        dump_to_mock.side_effect = ValueError
+        self.assertRaises(ValueError, taggart.save, 'output.yaml')
+        dump_to_mock.assert_called_once_with(self.file_mock, 'yaml')
         self.file_mock.close.assert_called_once_with()
 
 
 class parse_json_TestCase(BaseCase):
     def test_parse_json(self):
-        expect = {'New Tag': ['a_file'], 'Other Tag': ['a_file', 'b_file']}
+        expect = {'New Tag': {'a_file'}, 'Other Tag': {'a_file', 'b_file'}}
         jsstr = '{"New Tag": ["a_file"], "Other Tag": ["a_file", "b_file"]}'
         self.assertEqual(expect, taggart.parse_json(jsstr))
 
 
 class parse_text_TTF_TestCase(Taggart_TTF_BaseCase):
     def test_parse_text(self):
-        expect = {'New Tag': ['a_file'], 'Other Tag': ['a_file', 'b_file']}
+        expect = {'New Tag': {'a_file'}, 'Other Tag': {'a_file', 'b_file'}}
         txt = 'New Tag<==>a_file\nOther Tag<==>a_file\nOther Tag<==>b_file'
         txt = os.linesep.join(txt.split('\n'))
         self.assertEqual(expect, taggart.parse_text(txt))
@@ -268,19 +575,70 @@ class parse_text_TTF_TestCase(Taggart_TTF_BaseCase):
 
 class parse_text_FTT_TestCase(Taggart_FTT_BaseCase):
     def test_parse_text(self):
-        expect = {'a_file': ['New Tag', 'Other Tag'], 'b_file': ['Other Tag']}
+        expect = {'a_file': {'New Tag', 'Other Tag'}, 'b_file': {'Other Tag'}}
         txt = 'New Tag<==>a_file\nOther Tag<==>a_file\nOther Tag<==>b_file'
         txt = os.linesep.join(txt.split('\n'))
         self.assertEqual(expect, taggart.parse_text(txt))
 
 
+class parse_text_BIDI_TestCase(Taggart_BIDI_BaseCase):
+    def test_parse_text(self):
+        expect = {'New Tag': {'a_file'}, 'Other Tag': {'a_file', 'b_file'}}
+        txt = 'New Tag<==>a_file\nOther Tag<==>a_file\nOther Tag<==>b_file'
+        txt = os.linesep.join(txt.split('\n'))
+        self.assertEqual(expect, taggart.parse_text(txt))
+
+
+class parse_json_ARRAY_TestCase(Taggart_ARRAY_BaseCase):
+    def test_parse_json(self):
+        result = taggart.parse_json('{"New Tag": ["b_file", "a_file"]}')
+        self.assertIsInstance(result['New Tag'], taggart.Postings)
+        self.assertEqual({'New Tag': {'a_file', 'b_file'}}, result)
+
+
 class parse_yaml_TestCase(BaseCase):
     def test_parse_yaml(self):
-        expect = {'New Tag': ['a_file'], 'Other Tag': ['a_file', 'b_file']}
+        expect = {'New Tag': {'a_file'}, 'Other Tag': {'a_file', 'b_file'}}
         txt = 'New Tag:\n-  a_file\nOther Tag:\n-  a_file\n-  b_file'
         txt = os.linesep.join(txt.split('\n'))
         self.assertEqual(expect, taggart.parse_yaml(txt))
 
+    @patch.object(taggart, '_load_yaml')
+    def test_parse_yaml_dialect(self, load_mock):
+        txt = '\na:\n- b\n- c d\n\n \nb#c:\n-  x:y  \n- C:\\e#f\r\n'
+        expect = {'a': {'b', 'c d'}, 'b#c': {'x:y', 'C:\\e#f'}}
+        self.assertEqual(expect, taggart.parse_yaml(txt))
+        self.assertEqual(expect, taggart.parse_yaml(txt.rstrip()))
+        self.assertEqual({}, taggart.parse_yaml(''))
+        self.assertFalse(load_mock.called)
+
+    def test_parse_yaml_implicit_scalars(self):
+        txt = 'yes:\n- 010\n- 2024-01-01\n- b\n- null\n0::\n- .inf\nc:\n- d'
+        expect = {'True': {'8', '2024-01-01', 'b', 'None'}, '0:': {'inf'},
+                  'c': {'d'}}
+        self.assertEqual(expect, taggart.parse_yaml(txt))
+
+    def test_parse_yaml_falls_back_to_pyyaml(self):
+        for txt in ('a: [b, c]', 'a:\n- "b"\n- c # d\n', 'a:\r- b\r- c\r',
+                    '# a\na:\n- b\n- c'):
+            self.assertEqual({'a': {'b', 'c'}}, taggart.parse_yaml(txt))
+        self.assertRaises(TypeError, taggart.parse_yaml, 'a:\n- b\nc:\n')
+
+    @patch('yaml.load')
+    def test_parse_yaml_c_loader(self, load_mock):
+        import yaml
+        load_mock.return_value = {}
+        taggart.parse_yaml('a: b')
+        load_mock.assert_called_once_with('a: b', Loader=getattr(
+            yaml, 'CSafeLoader', yaml.SafeLoader))
+
+
+class parse_yaml_BIDI_TestCase(Taggart_BIDI_BaseCase):
+    def test_parse_yaml_round_trip(self):
+        taggart.tag(['a b', 'c:d', 'e#f', 'g-h'], ['Tag#1', 'x:', 'y, z'])
+        expect = {k: set(v) for k, v in taggart.THE_LIST.items()}
+        self.assertEqual(expect, taggart.parse_yaml(taggart.dump_yaml()))
+
 
 class parse_TestCase(BaseCase):
     @patch.object(taggart, 'parse_json')
@@ -298,7 +656,7 @@ class parse_TestCase(BaseCase):
     @patch.object(taggart, 'parse_text')
     def test_parse_text(self, text_mock):
         result = taggart.parse('data', 'text')
-        text_mock.assert_called_once_with('data')
+        text_mock.assert_called_once_with('data', taggart.MAPPING)
         self.assertIs(result, text_mock.return_value)
 
 
@@ -308,7 +666,8 @@ class init_TestCase(BaseCase):
         parse_mock.return_value = {'result': 'success'}
         taggart.THE_LIST = {'preexisting': 'condition'}
         taggart.init('parsable data')
-        parse_mock.assert_called_once_with('parsable data', 'text')
+        parse_mock.assert_called_once_with(
+            'parsable data', 'text', taggart.MAPPING)
         self.assertEqual(
             {'preexisting': 'condition', 'result': 'success'},
             taggart.THE_LIST)
@@ -318,9 +677,30 @@ class init_TestCase(BaseCase):
         parse_mock.return_value = {'result': 'success'}
         taggart.THE_LIST = {'preexisting': 'condition'}
         taggart.init('parsable data', overwrite=True)
-        parse_mock.assert_called_once_with('parsable data', 'text')
+        parse_mock.assert_called_once_with(
+            'parsable data', 'text', taggart.MAPPING)
         self.assertEqual({'result': 'success'}, taggart.THE_LIST)
 
+    @patch.object(taggart, 'parse')
+    def test_init_merges_into_existing_tags(self, parse_mock):
+        parse_mock.return_value = {'Tag A': {'file_2'}}
+        taggart.THE_LIST = {'Tag A': {'file_1'}}
+        taggart.init('parsable data')
+        self.assertEqual({'Tag A': {'file_1', 'file_2'}}, taggart.THE_LIST)
+
+
+class init_BIDI_TestCase(Taggart_BIDI_BaseCase):
+    def test_init_rebuilds_reverse_index(self):
+        txt = 'Tag B<==>file_2{n}New Tag<==>file_4{n}'.format(n=os.linesep)
+        taggart.init(txt)
+        self.assertEqual(
+            ['Tag B', 'Tag C', 'Tag D'],
+            sorted(taggart.THE_REVERSE_LIST.get('file_3')))
+        self.assertEqual({'New Tag'}, taggart.THE_REVERSE_LIST.get('file_4'))
+        self.assertEqual(
+            ['Tag B', 'Tag C'],
+            sorted(taggart.THE_REVERSE_LIST.get('file_2')))
+
 
 class load_TestCase(BaseCase):
     def test_load_rasies_error_for_nonexistent_file(self):
@@ -331,12 +711,12 @@ class load_TestCase(BaseCase):
     def test_load_success(self, parse_mock):
         parse_mock.return_value = {'result': 'success'}
         taggart.THE_LIST = {'preexisting': 'condition'}
-        taggart.load('input.txt')
-        self.open_mock.assert_called_once_with('input.txt', 'r')
+        taggart.load('input.json')
+        self.open_mock.assert_called_once_with('input.json', 'r')
         self.file_mock.read.assert_called_once_with()
         self.file_mock.close.assert_called_once_with()
         parse_mock.assert_called_once_with(
-            self.file_mock.read.return_value, 'text')
+            self.file_mock.read.return_value, 'json', taggart.MAPPING)
         self.assertEqual(
             {'preexisting': 'condition', 'result': 'success'},
             taggart.THE_LIST)
@@ -345,54 +725,303 @@ class load_TestCase(BaseCase):
     def test_load_with_clean_slate_success(self, parse_mock):
         parse_mock.return_value = {'result': 'success'}
         taggart.THE_LIST = {'preexisting': 'condition'}
-        taggart.load('input.txt', overwrite=True)
-        self.open_mock.assert_called_once_with('input.txt', 'r')
+        taggart.load('input.json', overwrite=True)
+        self.open_mock.assert_called_once_with('input.json', 'r')
         self.file_mock.read.assert_called_once_with()
         self.file_mock.close.assert_called_once_with()
         parse_mock.assert_called_once_with(
-            self.file_mock.read.return_value, 'text')
+            self.file_mock.read.return_value, 'json', taggart.MAPPING)
         self.assertEqual({'result': 'success'}, taggart.THE_LIST)
 
+    def test_load_text_streams_edges(self):
+        taggart.MAPPING = taggart.TAG_TO_FILE
+        taggart.THE_LIST = {'Tag A': {'file_0'}, 'Tag Z': {'file_9'}}
+        self.file_mock.__iter__.return_value = iter([
+            'Tag A<==>file_1\n', '\n', 'Tag B<==>file_1\n',
+            'Tag B<==>file_2\n'])
+        taggart.load('input.txt')
+        self.open_mock.assert_called_once_with('input.txt', 'r')
+        self.assertFalse(self.file_mock.read.called)
+        self.file_mock.close.assert_called_once_with()
+        self.assertEqual({
+            'Tag A': {'file_0', 'file_1'},
+            'Tag B': {'file_1', 'file_2'},
+            'Tag Z': {'file_9'}}, taggart.THE_LIST)
+
+    def test_load_text_with_clean_slate_success(self):
+        taggart.MAPPING = taggart.TAG_TO_FILE
+        taggart.THE_LIST = {'Tag A': {'file_0'}}
+        taggart.THE_REVERSE_LIST = {'file_0': {'Tag A'}}
+        self.file_mock.__iter__.return_value = iter(['Tag B<==>file_1\n'])
+        taggart.load('input.txt', overwrite=True)
+        self.assertEqual({'Tag B': {'file_1'}}, taggart.THE_LIST)
+        self.assertEqual({}, taggart.THE_REVERSE_LIST)
+
+
+class load_formats_TestCase(TestCase):
+    def setUp(self):
+        reload(taggart)
+        taggart.logger.setLevel('CRITICAL')
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def _load(self, mapping, fmt):
+        saved = taggart.TagStore(mapping)
+        saved.tag_edges([('file_1', 'Tag A'), ('file_2', 'Tag A'),
+                         ('file_3', 'Tag B')])
+        path = os.path.join(self.directory, 'tags.' + fmt)
+        saved.save(path, fmt=fmt)
+        store = taggart.TagStore(mapping)
+        store.tag_edges([('file_0', 'Tag A'), ('file_9', 'Tag Z')])
+        store.load(path, fmt=fmt)
+        return store.get_tags_by_file('file_0'), store.dump_text(sort=True)
+
+    def test_formats_merge_alike(self):
+        for mapping in (taggart.TAG_TO_FILE, taggart.BIDIRECTIONAL):
+            expected = self._load(mapping, 'text')
+            self.assertEqual(['Tag A'], expected[0])
+            self.assertEqual(expected, self._load(mapping, 'json'))
+            self.assertEqual(expected, self._load(mapping, 'yaml'))
+
+
+class iter_edges_TestCase(BaseCase):
+    def test_iter_edges(self):
+        self.file_mock.__iter__.return_value = iter([
+            'Tag A<==>file_1\r\n', '\r\n', 'Tag B<==>file<==>2\n'])
+        edges = taggart.iter_edges('input.txt')
+        self.assertFalse(self.open_mock.called)
+        self.assertEqual(
+            [('file_1', 'Tag A'), ('file<==>2', 'Tag B')], list(edges))
+        self.open_mock.assert_called_once_with('input.txt', 'r')
+        self.file_mock.close.assert_called_once_with()
+
+
+class load_parallel_BaseCase(object):
+    mapping = 'tag-->file'
+    postings = 'set'
+    lines = ['Tag A<==>file_1', '', 'Tag B<==>file_2', 'Tag B<==>file_3',
+             'Tag C<==>file_é', 'Tag C<==>file<==>4', 'Tag A<==>file_2']
+
+    def setUp(self):
+        reload(taggart)
+        self.addCleanup(patch.stopall)
+        patch.object(taggart.os, 'cpu_count', return_value=8).start()
+        taggart.logger.setLevel('CRITICAL')
+        taggart.MAPPING = self.mapping
+        taggart.POSTINGS = self.postings
+        taggart.PARALLEL_RANGE_SIZE = 20
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'tags.txt')
+        with open(self.path, 'w') as f:
+            f.write('\n'.join(self.lines) + '\n')
+
+    def test_ranges_are_line_aligned(self):
+        ranges = taggart._ranges(self.path, 20)
+        self.assertTrue(len(ranges) > 1)
+        self.assertEqual(0, ranges[0][0])
+        self.assertEqual(os.path.getsize(self.path), ranges[-1][1])
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        for start, end in ranges:
+            self.assertTrue(start == 0 or data[start - 1:start] == b'\n')
+        self.assertEqual([start for start, _ in ranges[1:]],
+                         [end for _, end in ranges[:-1]])
+
+    def test_parse_range(self):
+        groups = taggart._parse_range(
+            (self.path, 0, os.path.getsize(self.path), self.mapping))
+        taggart.load(self.path)
+        self.assertEqual(taggart.THE_LIST, groups[0])
+
+    def test_load_parallel_matches_load(self):
+        taggart.load(self.path)
+        expected = copy.deepcopy(taggart.THE_LIST)
+        expected_reverse = copy.deepcopy(taggart.THE_REVERSE_LIST)
+        taggart.THE_LIST = {}
+        taggart.THE_REVERSE_LIST = {}
+        taggart.load(self.path, workers=2)
+        self.assertEqual(expected, taggart.THE_LIST)
+        self.assertEqual(expected_reverse, taggart.THE_REVERSE_LIST)
+
+    def test_load_parallel_splits_lines_like_load(self):
+        with open(self.path, 'w') as f:
+            f.write('Tag\x0cA<==>file\x0b1\nTag B<==>file\x852\r\n'
+                    'Tag\u2028C<==>file\x1c3\u2029\rTag D<==>file_4\n')
+        taggart.load(self.path)
+        expected = copy.deepcopy(taggart.THE_LIST)
+        taggart.load(self.path, overwrite=True, workers=2)
+        self.assertEqual(expected, taggart.THE_LIST)
+        self.assertEqual(['Tag\x0cA', 'Tag B', 'Tag D', 'Tag\u2028C'],
+                         taggart.get_tags())
+
+    def test_load_parallel_merges_into_existing_tags(self):
+        taggart.tag('file_9', 'Tag A')
+        taggart.load(self.path, workers=2)
+        self.assertEqual(['file_1', 'file_2', 'file_9'],
+                         taggart.get_files_by_tag('Tag A'))
+        self.assertEqual(['Tag B'], taggart.get_tags_by_file('file_3'))
+
+
+class load_workers_TestCase(TestCase):
+    def setUp(self):
+        reload(taggart)
+        self.addCleanup(patch.stopall)
+        self.cpu_count_mock = patch.object(taggart.os, 'cpu_count').start()
+        self.parallel_mock = patch.object(
+            taggart.TagStore, '_load_parallel').start()
+        self.logger_mock = patch.object(taggart, 'logger').start()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'tags.txt')
+        with open(self.path, 'w') as f:
+            f.write('Tag A<==>file_1\n')
+
+    def test_workers_are_limited_to_cpus(self):
+        self.cpu_count_mock.return_value = 2
+        taggart.load(self.path, workers=8)
+        self.parallel_mock.assert_called_once_with(self.path, 2)
+        self.assertTrue(self.logger_mock.warning.called)
+
+    def test_one_cpu_loads_without_a_pool(self):
+        self.cpu_count_mock.return_value = None
+        taggart.load(self.path, workers=4)
+        self.assertFalse(self.parallel_mock.called)
+        self.assertEqual({'Tag A': {'file_1'}}, taggart.THE_LIST)
+
+
+class load_parallel_TTF_TestCase(load_parallel_BaseCase, TestCase):
+    pass
+
+
+class load_parallel_FTT_TestCase(load_parallel_BaseCase, TestCase):
+    mapping = 'file-->tag'
+
+
+class load_parallel_BIDI_TestCase(load_parallel_BaseCase, TestCase):
+    mapping = 'tag<->file'
+
+
+class load_parallel_ARRAY_TestCase(load_parallel_BaseCase, TestCase):
+    postings = 'array'
+
+    def test_load_parallel_matches_load(self):
+        super(load_parallel_ARRAY_TestCase,
+              self).test_load_parallel_matches_load()
+        self.assertIsInstance(taggart.THE_LIST['Tag A'], taggart.Postings)
+
 
 class remap_TTF_TestCase(Taggart_TTF_BaseCase):
     def test_remap_to_same_mapping(self):
         taggart.remap(taggart.MAPPING)
         self.assertEqual({
-            'Tag A': ['file_1'],
-            'Tag B': ['file_2', 'file_3'],
-            'Tag C': ['file_2', 'file_3'],
-            'Tag D': ['file_3']
+            'Tag A': {'file_1'},
+            'Tag B': {'file_2', 'file_3'},
+            'Tag C': {'file_2', 'file_3'},
+            'Tag D': {'file_3'}
         }, taggart.THE_LIST)
 
     def test_remap_to_invalid_map_does_nothing(self):
         taggart.remap('treasure map format')
         self.assertEqual({
-            'Tag A': ['file_1'],
-            'Tag B': ['file_2', 'file_3'],
-            'Tag C': ['file_2', 'file_3'],
-            'Tag D': ['file_3']
+            'Tag A': {'file_1'},
+            'Tag B': {'file_2', 'file_3'},
+            'Tag C': {'file_2', 'file_3'},
+            'Tag D': {'file_3'}
         }, taggart.THE_LIST)
 
     def test_remap_success(self):
         taggart.remap()  # Toggle
         self.assertEqual({
-            'file_1': ['Tag A'],
-            'file_2': ['Tag B', 'Tag C'],
-            'file_3': ['Tag B', 'Tag C', 'Tag D']
+            'file_1': {'Tag A'},
+            'file_2': {'Tag B', 'Tag C'},
+            'file_3': {'Tag B', 'Tag C', 'Tag D'}
         }, taggart.THE_LIST)
 
+    def test_remap_consumes_old_map(self):
+        old_map = taggart.THE_LIST
+        taggart.remap()
+        self.assertEqual({}, old_map)
+        self.assertEqual({
+            'file_1': {'Tag A'},
+            'file_2': {'Tag B', 'Tag C'},
+            'file_3': {'Tag B', 'Tag C', 'Tag D'}
+        }, taggart.THE_LIST)
+
+
+class remap_ARRAY_TestCase(Taggart_ARRAY_BaseCase):
+    def test_remap(self):
+        taggart.BATCH_SIZE = 2
+        taggart.remap()
+        self.assertEqual(
+            ['file_1', 'file_2', 'file_3'], sorted(taggart.THE_LIST))
+        self.assertTrue(isinstance(
+            taggart.THE_LIST['file_3'], taggart.Postings))
+        self.assertEqual(
+            ['Tag B', 'Tag C', 'Tag D'], taggart.get_tags_by_file('file_3'))
+
 
 class remap_FTT_TestCase(Taggart_FTT_BaseCase):
     def test_remap(self):
         taggart.remap()
         self.assertEqual({
-            'Tag A': ['file_1'],
-            'Tag B': ['file_2', 'file_3'],
-            'Tag C': ['file_2', 'file_3'],
-            'Tag D': ['file_3']
+            'Tag A': {'file_1'},
+            'Tag B': {'file_2', 'file_3'},
+            'Tag C': {'file_2', 'file_3'},
+            'Tag D': {'file_3'}
         }, taggart.THE_LIST)
 
 
+class remap_BIDI_TestCase(Taggart_BIDI_BaseCase):
+    def setUp(self):
+        super(remap_BIDI_TestCase, self).setUp()
+        self.ttf = {
+            'Tag A': {'file_1'},
+            'Tag B': {'file_2', 'file_3'},
+            'Tag C': {'file_2', 'file_3'},
+            'Tag D': {'file_3'}
+        }
+        self.ftt = {
+            'file_1': {'Tag A'},
+            'file_2': {'Tag B', 'Tag C'},
+            'file_3': {'Tag B', 'Tag C', 'Tag D'}
+        }
+
+    def test_remap_toggle_is_a_no_op(self):
+        reverse = taggart.THE_REVERSE_LIST
+        taggart.remap()
+        self.assertEqual(taggart.BIDIRECTIONAL, taggart.MAPPING)
+        self.assertEqual(self.ttf, taggart.THE_LIST)
+        self.assertIs(reverse, taggart.THE_REVERSE_LIST)
+
+    def test_remap_to_tag_to_file(self):
+        taggart.remap(taggart.TAG_TO_FILE)
+        self.assertEqual(taggart.TAG_TO_FILE, taggart.MAPPING)
+        self.assertEqual(self.ttf, taggart.THE_LIST)
+        self.assertEqual({}, taggart.THE_REVERSE_LIST)
+
+    def test_remap_to_file_to_tag(self):
+        taggart.remap(taggart.FILE_TO_TAG)
+        self.assertEqual(taggart.FILE_TO_TAG, taggart.MAPPING)
+        self.assertEqual(
+            self.ftt, taggart.THE_LIST)
+        self.assertEqual({}, taggart.THE_REVERSE_LIST)
+
+    def test_remap_from_tag_to_file(self):
+        taggart.remap(taggart.TAG_TO_FILE)
+        taggart.remap(taggart.BIDIRECTIONAL)
+        self.assertEqual(taggart.BIDIRECTIONAL, taggart.MAPPING)
+        self.assertEqual(self.ttf, taggart.THE_LIST)
+        self.assertEqual(self.ftt, taggart.THE_REVERSE_LIST)
+
+    def test_remap_from_file_to_tag(self):
+        taggart.remap(taggart.FILE_TO_TAG)
+        taggart.remap(taggart.BIDIRECTIONAL)
+        self.assertEqual(taggart.BIDIRECTIONAL, taggart.MAPPING)
+        self.assertEqual(self.ttf, taggart.THE_LIST)
+        self.assertEqual(self.ftt, taggart.THE_REVERSE_LIST)
+
+
 class rename_tag_TTF_TestCase(Taggart_TTF_BaseCase):
     def test_rename_nonexistent_tag(self):
         original = copy.deepcopy(taggart.THE_LIST)
@@ -403,32 +1032,42 @@ class rename_tag_TTF_TestCase(Taggart_TTF_BaseCase):
     def test_rename_tag(self):
         taggart.rename_tag('Tag B', 'Cool B')
         self.assertEqual({
-            'Tag A': ['file_1'],
-            'Cool B': ['file_2', 'file_3'],
-            'Tag C': ['file_2', 'file_3'],
-            'Tag D': ['file_3']
-        }, {k: sorted(v) for k, v in taggart.THE_LIST.items()})
+            'Tag A': {'file_1'},
+            'Cool B': {'file_2', 'file_3'},
+            'Tag C': {'file_2', 'file_3'},
+            'Tag D': {'file_3'}
+        }, taggart.THE_LIST)
 
 
 class rename_tag_FTT_TestCase(Taggart_FTT_BaseCase):
     def test_rename_tag(self):
         taggart.rename_tag('Tag B', 'Cool B')
         self.assertEqual({
-            'file_1': ['Tag A'],
-            'file_2': ['Cool B', 'Tag C'],
-            'file_3': ['Cool B', 'Tag C', 'Tag D']
-        }, {k: sorted(v) for k, v in taggart.THE_LIST.items()})
+            'file_1': {'Tag A'},
+            'file_2': {'Cool B', 'Tag C'},
+            'file_3': {'Cool B', 'Tag C', 'Tag D'}
+        }, taggart.THE_LIST)
+
+
+class rename_tag_BIDI_TestCase(Taggart_BIDI_BaseCase):
+    def test_rename_tag(self):
+        taggart.rename_tag('Tag B', 'Cool B')
+        self.assertEqual(None, taggart.THE_LIST.get('Tag B'))
+        self.assertEqual(
+            ['file_2', 'file_3'], sorted(taggart.THE_LIST.get('Cool B')))
+        self.assertEqual(
+            ['Cool B', 'Tag C', 'Tag D'], taggart.get_tags_by_file('file_3'))
 
 
 class rename_file_TTF_TestCase(Taggart_TTF_BaseCase):
     def test_rename_file(self):
         taggart.rename_file('file_2', '2_cool')
         self.assertEqual({
-            'Tag A': ['file_1'],
-            'Tag B': ['2_cool', 'file_3'],
-            'Tag C': ['2_cool', 'file_3'],
-            'Tag D': ['file_3']
-        }, {k: sorted(v) for k, v in taggart.THE_LIST.items()})
+            'Tag A': {'file_1'},
+            'Tag B': {'2_cool', 'file_3'},
+            'Tag C': {'2_cool', 'file_3'},
+            'Tag D': {'file_3'}
+        }, taggart.THE_LIST)
 
 
 class rename_file_FTT_TestCase(Taggart_FTT_BaseCase):
@@ -441,10 +1080,125 @@ class rename_file_FTT_TestCase(Taggart_FTT_BaseCase):
     def test_rename_file(self):
         taggart.rename_file('file_2', '2_cool')
         self.assertEqual({
-            'file_1': ['Tag A'],
-            'file_3': ['Tag B', 'Tag C', 'Tag D'],
-            '2_cool': ['Tag B', 'Tag C']
-        }, {k: sorted(v) for k, v in taggart.THE_LIST.items()})
+            'file_1': {'Tag A'},
+            'file_3': {'Tag B', 'Tag C', 'Tag D'},
+            '2_cool': {'Tag B', 'Tag C'}
+        }, taggart.THE_LIST)
+
+
+class rename_file_BIDI_TestCase(Taggart_BIDI_BaseCase):
+    def test_rename_file(self):
+        taggart.rename_file('file_2', '2_cool')
+        self.assertEqual(None, taggart.THE_REVERSE_LIST.get('file_2'))
+        self.assertEqual(
+            ['Tag B', 'Tag C'], sorted(taggart.THE_REVERSE_LIST.get('2_cool')))
+        self.assertEqual(
+            ['2_cool', 'file_3'], taggart.get_files_by_tag('Tag C'))
+
+
+class rename_tag_merge_BaseCase(object):
+    def test_rename_tag_to_itself(self):
+        taggart.rename_tag('Tag B', 'Tag B')
+        self.assertEqual(
+            ['file_2', 'file_3'], taggart.get_files_by_tag('Tag B'))
+
+    def test_rename_tag_merges_into_existing_tag(self):
+        taggart.rename_tag('Tag A', 'Tag D')
+        self.assertEqual(['Tag B', 'Tag C', 'Tag D'], taggart.get_tags())
+        self.assertEqual(
+            ['file_1', 'file_3'], taggart.get_files_by_tag('Tag D'))
+        self.assertEqual(['Tag D'], taggart.get_tags_by_file('file_1'))
+
+
+class rename_tag_merge_TTF_TestCase(
+        rename_tag_merge_BaseCase, Taggart_TTF_BaseCase):
+    pass
+
+
+class rename_tag_merge_FTT_TestCase(
+        rename_tag_merge_BaseCase, Taggart_FTT_BaseCase):
+    pass
+
+
+class rename_tag_merge_BIDI_TestCase(
+        rename_tag_merge_BaseCase, Taggart_BIDI_BaseCase):
+    pass
+
+
+class rename_tag_merge_ARRAY_TestCase(
+        rename_tag_merge_BaseCase, Taggart_ARRAY_BaseCase):
+    pass
+
+
+class rename_tag_merge_SORTED_TestCase(
+        rename_tag_merge_BaseCase, Taggart_SORTED_BaseCase):
+    pass
+
+
+class rename_tag_merge_SQLITE_TestCase(
+        rename_tag_merge_BaseCase, Taggart_SQLITE_BaseCase):
+    pass
+
+
+class rename_files_BaseCase(object):
+    def test_rename_files(self):
+        taggart.rename_files({
+            'file_1': 'new_1', 'file_3': 'file_3', 'file_9': 'new_9'})
+        self.assertEqual(
+            ['file_2', 'file_3', 'new_1'], taggart.get_files())
+        self.assertEqual(['new_1'], taggart.get_files_by_tag('Tag A'))
+        self.assertEqual(['file_3'], taggart.get_files_by_tag('Tag D'))
+        self.assertEqual(['Tag A'], taggart.get_tags_by_file('new_1'))
+
+    def test_rename_files_swaps_names(self):
+        taggart.rename_files({'file_1': 'file_3', 'file_3': 'file_1'})
+        self.assertEqual(['file_3'], taggart.get_files_by_tag('Tag A'))
+        self.assertEqual(['file_1'], taggart.get_files_by_tag('Tag D'))
+        self.assertEqual(
+            ['Tag B', 'Tag C', 'Tag D'], taggart.get_tags_by_file('file_1'))
+
+    def test_rename_files_merges_into_existing_file(self):
+        taggart.rename_files({'file_1': 'file_2'})
+        self.assertEqual(['file_2', 'file_3'], taggart.get_files())
+        self.assertEqual(
+            ['Tag A', 'Tag B', 'Tag C'], taggart.get_tags_by_file('file_2'))
+
+    def test_rename_directory(self):
+        taggart.tag(['photos', 'photos/a.jpg', 'photos/2014/b.jpg',
+                     'photos.txt', 'photos2/c.jpg'], 'Tag E')
+        taggart.rename_directory('photos/', 'pictures')
+        self.assertEqual([
+            'file_1', 'file_2', 'file_3', 'photos.txt', 'photos2/c.jpg',
+            'pictures', 'pictures/2014/b.jpg', 'pictures/a.jpg'
+        ], taggart.get_files())
+        self.assertEqual(['Tag E'], taggart.get_tags_by_file('pictures/a.jpg'))
+
+
+class rename_files_TTF_TestCase(rename_files_BaseCase, Taggart_TTF_BaseCase):
+    pass
+
+
+class rename_files_FTT_TestCase(rename_files_BaseCase, Taggart_FTT_BaseCase):
+    pass
+
+
+class rename_files_BIDI_TestCase(rename_files_BaseCase, Taggart_BIDI_BaseCase):
+    pass
+
+
+class rename_files_ARRAY_TestCase(
+        rename_files_BaseCase, Taggart_ARRAY_BaseCase):
+    pass
+
+
+class rename_files_SORTED_TestCase(
+        rename_files_BaseCase, Taggart_SORTED_BaseCase):
+    pass
+
+
+class rename_files_SQLITE_TestCase(
+        rename_files_BaseCase, Taggart_SQLITE_BaseCase):
+    pass
 
 
 class get_files_by_tag_TTF_TestCase(Taggart_TTF_BaseCase):
@@ -459,6 +1213,15 @@ class get_files_by_tag_FTT_TestCase(Taggart_FTT_BaseCase):
             ['file_2', 'file_3'], taggart.get_files_by_tag('Tag B'))
 
 
+class get_files_by_tag_BIDI_TestCase(Taggart_BIDI_BaseCase):
+    def test_get_files_by_tag(self):
+        self.assertEqual(
+            ['file_2', 'file_3'], taggart.get_files_by_tag('Tag B'))
+
+    def test_get_files_by_nonexistent_tag(self):
+        self.assertEqual([], taggart.get_files_by_tag('Nonexistent Tag'))
+
+
 class get_tag_files_alias_TestCase(BaseCase):
     def test_get_tag_files_alias(self):
         self.assertIs(taggart.get_tag_files, taggart.get_files_by_tag)
@@ -476,6 +1239,15 @@ class get_tags_by_file_FTT_TestCase(Taggart_FTT_BaseCase):
             ['Tag B', 'Tag C', 'Tag D'], taggart.get_tags_by_file('file_3'))
 
 
+class get_tags_by_file_BIDI_TestCase(Taggart_BIDI_BaseCase):
+    def test_get_tags_by_file(self):
+        self.assertEqual(
+            ['Tag B', 'Tag C', 'Tag D'], taggart.get_tags_by_file('file_3'))
+
+    def test_get_tags_by_nonexistent_file(self):
+        self.assertEqual([], taggart.get_tags_by_file('nonexistent_file'))
+
+
 class get_file_tags_alias_TestCase(BaseCase):
     def test_file_tags_alias(self):
         self.assertIs(taggart.get_file_tags, taggart.get_tags_by_file)
@@ -493,6 +1265,12 @@ class get_tags_FTT_TestCase(Taggart_FTT_BaseCase):
             ['Tag A', 'Tag B', 'Tag C', 'Tag D'], taggart.get_tags())
 
 
+class get_tags_BIDI_TestCase(Taggart_BIDI_BaseCase):
+    def test_get_tags(self):
+        self.assertEqual(
+            ['Tag A', 'Tag B', 'Tag C', 'Tag D'], taggart.get_tags())
+
+
 class get_files_TTF_TestCase(Taggart_TTF_BaseCase):
     def test_get_files(self):
         self.assertEqual(
@@ -503,3 +1281,1897 @@ class get_files_FTT_TestCase(Taggart_FTT_BaseCase):
     def test_get_files(self):
         self.assertEqual(
             ['file_1', 'file_2', 'file_3'], taggart.get_files())
+
+
+class get_files_BIDI_TestCase(Taggart_BIDI_BaseCase):
+    def test_get_files(self):
+        self.assertEqual(
+            ['file_1', 'file_2', 'file_3'], taggart.get_files())
+
+
+class prefix_BaseCase(object):
+    def setUp(self):
+        super(prefix_BaseCase, self).setUp()
+        taggart.tag(['img_1', 'img_2'], 'camera/canon/eos5d')
+        taggart.tag('img_3', 'camera/nikon')
+        taggart.tag('img_1', 'camera')
+        taggart.tag('img_4', 'cameraman')
+
+    def test_get_tags_by_prefix(self):
+        self.assertEqual(['camera/canon/eos5d', 'camera/nikon'],
+                         taggart.get_tags_by_prefix('camera/'))
+        self.assertEqual(
+            ['camera', 'camera/canon/eos5d', 'camera/nikon', 'cameraman'],
+            taggart.get_tags_by_prefix('camera'))
+        self.assertEqual(taggart.get_tags(), taggart.get_tags_by_prefix(''))
+        self.assertEqual([], taggart.get_tags_by_prefix('lens/'))
+
+    def test_get_files_by_tag_prefix(self):
+        self.assertEqual(['img_1', 'img_2', 'img_3'],
+                         taggart.get_files_by_tag_prefix('camera/'))
+        self.assertEqual(['img_1', 'img_2'],
+                         taggart.get_files_by_tag_prefix('camera/canon/'))
+        self.assertEqual([], taggart.get_files_by_tag_prefix('lens/'))
+
+    def test_prefix_queries_follow_changes(self):
+        taggart.rename_tag('camera/nikon', 'camera/nikon/d850')
+        taggart.tag('img_5', 'camera/sony')
+        self.assertEqual(
+            ['camera/canon/eos5d', 'camera/nikon/d850', 'camera/sony'],
+            taggart.get_tags_by_prefix('camera/'))
+        taggart.untag(['img_1', 'img_2'], 'camera/canon/eos5d')
+        self.assertEqual(['img_3', 'img_5'],
+                         taggart.get_files_by_tag_prefix('camera/'))
+
+
+class prefix_TTF_TestCase(prefix_BaseCase, Taggart_TTF_BaseCase):
+    def test_tag_index_is_kept_until_tags_change(self):
+        tag_names = taggart.DEFAULT_STORE._tag_index()
+        self.assertIs(tag_names, taggart.DEFAULT_STORE._tag_index())
+        taggart.tag('img_5', 'camera/nikon')
+        self.assertIs(tag_names, taggart.DEFAULT_STORE._tag_index())
+        taggart.tag('img_5', 'camera/sony')
+        self.assertEqual(sorted(tag_names + ['camera/sony']),
+                         taggart.DEFAULT_STORE._tag_index())
+        taggart.THE_LIST = {'Tag Z': {'file_9'}}
+        self.assertEqual(['Tag Z'], taggart.get_tags_by_prefix('Tag'))
+
+    def test_new_tag_maps_are_not_mistaken_for_old_ones(self):
+        taggart.THE_LIST = {'x0': {'g'}}
+        self.assertEqual(['x0'], taggart.get_tags())
+        taggart.THE_LIST = {}
+        taggart.THE_LIST = {'x1': {'g'}}
+        self.assertEqual(['x1'], taggart.get_tags())
+
+    def test_tags_added_directly_are_seen(self):
+        self.assertEqual(['camera/canon/eos5d', 'camera/nikon'],
+                         taggart.get_tags_by_prefix('camera/'))
+        taggart.THE_LIST['camera/sony'] = {'img_5'}
+        self.assertEqual(
+            ['camera/canon/eos5d', 'camera/nikon', 'camera/sony'],
+            taggart.get_tags_by_prefix('camera/'))
+        self.assertIn('camera/sony', taggart.get_tags())
+
+    def test_tags_replaced_directly_are_seen_without_cache(self):
+        taggart.CACHE_SIZE = 0
+        self.assertIn('cameraman', taggart.get_tags())
+        del taggart.THE_LIST['cameraman']
+        taggart.THE_LIST['lens'] = {'img_4'}
+        self.assertNotIn('cameraman', taggart.get_tags())
+        self.assertEqual(['lens'], taggart.get_tags_by_prefix('lens'))
+
+
+class prefix_FTT_TestCase(prefix_BaseCase, Taggart_FTT_BaseCase):
+    pass
+
+
+class prefix_BIDI_TestCase(prefix_BaseCase, Taggart_BIDI_BaseCase):
+    pass
+
+
+class prefix_ARRAY_TestCase(prefix_BaseCase, Taggart_ARRAY_BaseCase):
+    pass
+
+
+class prefix_SORTED_TestCase(prefix_BaseCase, Taggart_SORTED_BaseCase):
+    pass
+
+
+class prefix_SQLITE_TestCase(prefix_BaseCase, Taggart_SQLITE_BaseCase):
+    pass
+
+
+class under_BaseCase(object):
+    def setUp(self):
+        super(under_BaseCase, self).setUp()
+        taggart.tag(['data/2024/a.jpg', 'data/2024/b.jpg'], 'Tag X')
+        taggart.tag('data/2024/jan/c.jpg', ['Tag X', 'Tag Y'])
+        taggart.tag(['data/2025/d.jpg', 'data/2024-old'], 'Tag Z')
+
+    def test_get_files_under(self):
+        self.assertEqual(
+            ['data/2024/a.jpg', 'data/2024/b.jpg', 'data/2024/jan/c.jpg'],
+            taggart.get_files_under('data/2024'))
+        self.assertEqual(taggart.get_files_under('data/2024'),
+                         taggart.get_files_under('data/2024/'))
+        self.assertEqual(['data/2024/jan/c.jpg'],
+                         taggart.get_files_under('data/2024/jan'))
+        self.assertEqual([], taggart.get_files_under('data/2026'))
+        self.assertEqual([], taggart.get_files_under('zzz'))
+
+    def test_get_files_under_includes_the_directory(self):
+        taggart.tag('data/2025', 'Tag Y')
+        self.assertEqual(['data/2025', 'data/2025/d.jpg'],
+                         taggart.get_files_under('data/2025'))
+
+    def test_get_tags_under(self):
+        self.assertEqual(['Tag X', 'Tag Y'],
+                         taggart.get_tags_under('data/2024'))
+        self.assertEqual(['Tag X', 'Tag Y', 'Tag Z'],
+                         taggart.get_tags_under('data'))
+        self.assertEqual([], taggart.get_tags_under('data/2026'))
+
+    def test_untag_under(self):
+        taggart.untag_under('data/2024', 'Tag X')
+        self.assertEqual(['data/2024/jan/c.jpg'],
+                         taggart.get_files_under('data/2024'))
+        self.assertEqual(['Tag Y'], taggart.get_tags_under('data/2024'))
+        self.assertEqual(['data/2024-old', 'data/2025/d.jpg'],
+                         taggart.get_files_by_tag('Tag Z'))
+
+    def test_untag_under_every_tag(self):
+        taggart.untag_under('data/2024')
+        self.assertEqual(['data/2024-old', 'data/2025/d.jpg'],
+                         taggart.get_files_under('data'))
+        taggart.untag_under('data', ['Tag Z', 'Tag W'])
+        self.assertEqual(['file_1', 'file_2', 'file_3'], taggart.get_files())
+
+    def test_files_under_follow_changes(self):
+        taggart.rename_directory('data/2024', 'data/2023')
+        taggart.tag('data/2024/e.jpg', 'Tag X')
+        self.assertEqual(['data/2024/e.jpg'],
+                         taggart.get_files_under('data/2024'))
+        self.assertEqual(
+            ['data/2023/a.jpg', 'data/2023/b.jpg', 'data/2023/jan/c.jpg'],
+            taggart.get_files_under('data/2023'))
+
+    def assertUnder(self, *directories):
+        for directory in directories:
+            file_names = [file_name for file_name in taggart.get_files()
+                          if file_name == directory or
+                          file_name.startswith(directory + '/')]
+            self.assertEqual(file_names, taggart.get_files_under(directory))
+            self.assertEqual(
+                sorted(set(tag_name for file_name in file_names
+                           for tag_name in taggart.get_tags_by_file(
+                               file_name))),
+                taggart.get_tags_under(directory))
+
+    def test_directories_follow_every_change(self):
+        directories = ('data', 'data/2024', 'data/2024/jan', 'data/2025',
+                       'data/2026')
+        self.assertUnder(*directories)
+        taggart.tag(['data/2025/e.jpg', 'data/2025/d.jpg'], 'Tag Y')
+        self.assertUnder(*directories)
+        taggart.untag('data/2024/jan/c.jpg', 'Tag X')
+        self.assertUnder(*directories)
+        taggart.untag('data/2024/jan/c.jpg', 'Tag Y')
+        self.assertUnder(*directories)
+        taggart.rename_tag('Tag Z', 'Tag Y')
+        self.assertUnder(*directories)
+        taggart.rename_file('data/2024/a.jpg', 'data/2026/a.jpg')
+        self.assertUnder(*directories)
+        taggart.rename_files({'data/2024/b.jpg': 'data/2025/d.jpg',
+                              'data/2025/d.jpg': 'data/2024/b.jpg'})
+        self.assertUnder(*directories)
+        taggart.untag_under('data/2025', 'Tag Y')
+        self.assertUnder(*directories)
+        taggart.rename_directory('data/2024', 'data/2026')
+        self.assertUnder(*directories)
+
+
+class under_tree_BaseCase(under_BaseCase):
+    def test_directory_tree_is_kept_while_it_changes(self):
+        store = taggart.DEFAULT_STORE
+        tree = store._directory_index()
+        taggart.tag('data/2026/f.jpg', 'Tag W')
+        taggart.rename_directory('data/2024', 'data/2023')
+        taggart.rename_tag('Tag X', 'Tag V')
+        taggart.untag_under('data/2025')
+        self.assertIs(tree, store._directory_index())
+        self.assertEqual(['data/2026/f.jpg'],
+                         taggart.get_files_under('data/2026'))
+        self.assertEqual(['Tag V', 'Tag Y'],
+                         taggart.get_tags_under('data/2023'))
+        self.assertNotIn('2024', tree.root['data'])
+        self.assertNotIn('2025', tree.root['data'])
+        taggart.untag('data/2026/f.jpg', 'Tag W')
+        self.assertNotIn('2026', tree.root['data'])
+        self.assertIs(tree, store._directory_index())
+
+    def test_directory_tree_is_built_again_when_maps_are_replaced(self):
+        store = taggart.DEFAULT_STORE
+        tree = store._directory_index()
+        taggart.THE_LIST = dict(taggart.THE_LIST)
+        taggart.THE_REVERSE_LIST = dict(taggart.THE_REVERSE_LIST)
+        self.assertIsNot(tree, store._directory_index())
+        taggart.CACHE_SIZE = 0
+        tree = store._directory_index()
+        self.assertIsNot(tree, store._directory_index())
+
+
+class under_TTF_TestCase(under_tree_BaseCase, Taggart_TTF_BaseCase):
+    def test_files_added_directly_are_seen(self):
+        self.assertEqual(['data/2025/d.jpg'],
+                         taggart.get_files_under('data/2025'))
+        taggart.THE_LIST['Tag W'] = {'data/2025/e.jpg'}
+        self.assertEqual(['data/2025/d.jpg', 'data/2025/e.jpg'],
+                         taggart.get_files_under('data/2025'))
+        self.assertIn('data/2025/e.jpg', taggart.get_files())
+
+    def test_files_added_directly_are_seen_without_cache(self):
+        taggart.CACHE_SIZE = 0
+        self.assertEqual(['data/2025/d.jpg'],
+                         taggart.get_files_under('data/2025'))
+        taggart.THE_LIST['Tag Z'].add('data/2025/e.jpg')
+        self.assertEqual(['data/2025/d.jpg', 'data/2025/e.jpg'],
+                         taggart.get_files_under('data/2025'))
+        self.assertEqual(['Tag Z'], taggart.get_tags_under('data/2025'))
+
+
+class under_FTT_TestCase(under_tree_BaseCase, Taggart_FTT_BaseCase):
+    def test_file_index_is_kept_until_files_change(self):
+        file_names = taggart.DEFAULT_STORE._file_index()
+        self.assertIs(file_names, taggart.DEFAULT_STORE._file_index())
+        taggart.tag('data/2025/d.jpg', 'Tag X')
+        self.assertIs(file_names, taggart.DEFAULT_STORE._file_index())
+        taggart.untag_under('data/2025')
+        self.assertEqual(
+            [n for n in file_names if n != 'data/2025/d.jpg'],
+            taggart.DEFAULT_STORE._file_index())
+
+
+class under_BIDI_TestCase(under_tree_BaseCase, Taggart_BIDI_BaseCase):
+    pass
+
+
+class under_ARRAY_TestCase(under_tree_BaseCase, Taggart_ARRAY_BaseCase):
+    pass
+
+
+class under_SORTED_TestCase(under_tree_BaseCase, Taggart_SORTED_BaseCase):
+    pass
+
+
+class under_SQLITE_TestCase(under_BaseCase, Taggart_SQLITE_BaseCase):
+    pass
+
+
+class cache_BaseCase(object):
+    def assertFresh(self):
+        store = taggart.DEFAULT_STORE
+        for tag_name in ['Tag A', 'Tag B', 'Tag C', 'Tag D', 'Tag E']:
+            self.assertEqual(store._files_by_tag(tag_name),
+                             taggart.get_files_by_tag(tag_name))
+        for file_name in ['file_1', 'file_2', 'file_3', 'file_4', 'file_5']:
+            self.assertEqual(store._tags_by_file(file_name),
+                             taggart.get_tags_by_file(file_name))
+        for expression in ['Tag B & !Tag D', 'Tag A | Tag E']:
+            self.assertEqual(store._query(taggart._parse_query(expression)),
+                             taggart.query(expression))
+
+    def test_repeated_queries_hit_the_cache(self):
+        self.assertEqual(['file_2', 'file_3'],
+                         taggart.get_files_by_tag('Tag B'))
+        taggart.get_files_by_tag('Tag B').append('file_9')
+        self.assertEqual(['file_2', 'file_3'],
+                         taggart.get_files_by_tag('Tag B'))
+        stats = taggart.cache_stats()
+        self.assertEqual((2, 1, 1), (
+            stats['hits'], stats['misses'], stats['entries']))
+
+    def test_changes_only_invalidate_what_they_touch(self):
+        taggart.get_files_by_tag('Tag A')
+        taggart.get_tags_by_file('file_1')
+        taggart.query('Tag B & Tag C')
+        taggart.tag('file_4', 'Tag D')
+        taggart.get_files_by_tag('Tag A')
+        taggart.get_tags_by_file('file_1')
+        taggart.query('Tag B & Tag C')
+        self.assertEqual(3, taggart.cache_stats()['hits'])
+        taggart.untag('file_1', 'Tag A')
+        self.assertEqual([], taggart.get_files_by_tag('Tag A'))
+        self.assertEqual([], taggart.get_tags_by_file('file_1'))
+        self.assertEqual(2, taggart.cache_stats()['invalidations'])
+
+    def test_negated_queries_depend_on_every_tag(self):
+        self.assertEqual(['file_1'], taggart.query('!Tag B'))
+        taggart.tag('file_4', 'Tag E')
+        self.assertEqual(['file_1', 'file_4'], taggart.query('!Tag B'))
+
+    def test_cache_follows_changes(self):
+        self.assertFresh()
+        taggart.tag(['file_4', 'file_5'], ['Tag A', 'Tag E'])
+        self.assertFresh()
+        taggart._tag('file_1', 'Tag E')
+        self.assertFresh()
+        taggart._untag('file_4', 'Tag A')
+        self.assertFresh()
+        taggart.rename_tag('Tag E', 'Tag D')
+        self.assertFresh()
+        taggart.rename_tag('Tag A', 'Tag E')
+        self.assertFresh()
+        taggart.rename_file('file_4', 'file_1')
+        self.assertFresh()
+        taggart.rename_files({'file_1': 'file_2', 'file_2': 'file_1'})
+        self.assertFresh()
+        taggart.untag_under('file_3')
+        self.assertFresh()
+        taggart.init('Tag A<==>file_3' + os.linesep)
+        self.assertFresh()
+        taggart.remap(taggart.BIDIRECTIONAL)
+        self.assertFresh()
+
+    def test_replacing_the_tag_map_drops_the_cache(self):
+        taggart.get_files_by_tag('Tag A')
+        taggart.THE_LIST = {}
+        self.assertEqual([], taggart.get_files_by_tag('Tag A'))
+        self.assertEqual(0, taggart.cache_stats()['hits'])
+
+    def test_cache_can_be_turned_off(self):
+        taggart.CACHE_SIZE = 0
+        taggart.get_files_by_tag('Tag A')
+        taggart.get_files_by_tag('Tag A')
+        self.assertEqual(0, taggart.cache_stats()['entries'])
+
+
+class cache_TTF_TestCase(cache_BaseCase, Taggart_TTF_BaseCase):
+    pass
+
+
+class cache_FTT_TestCase(cache_BaseCase, Taggart_FTT_BaseCase):
+    pass
+
+
+class cache_BIDI_TestCase(cache_BaseCase, Taggart_BIDI_BaseCase):
+    pass
+
+
+class cache_ARRAY_TestCase(cache_BaseCase, Taggart_ARRAY_BaseCase):
+    pass
+
+
+class cache_SORTED_TestCase(cache_BaseCase, Taggart_SORTED_BaseCase):
+    pass
+
+
+class memory_usage_TestCase(Taggart_BIDI_BaseCase):
+    def test_memory_usage(self):
+        usage = taggart.memory_usage()
+        self.assertEqual(
+            ['directories', 'forward', 'reverse', 'strings', 'symbols',
+             'total'], sorted(usage))
+        self.assertTrue(usage['reverse'] > 0)
+        self.assertEqual(0, usage['directories'])
+        self.assertEqual(usage['total'], (
+            usage['strings'] + usage['symbols'] +
+            usage['forward'] + usage['reverse']))
+
+    def test_memory_usage_counts_the_directory_tree(self):
+        taggart.get_files_under('file_1')
+        self.assertEqual(
+            taggart.DEFAULT_STORE._directory_index().memory_usage(),
+            taggart.memory_usage()['directories'])
+        self.assertTrue(taggart.memory_usage()['directories'] > 0)
+
+    def test_memory_usage_counts_shared_strings_once(self):
+        before = taggart.memory_usage()['strings']
+        taggart.remap(taggart.TAG_TO_FILE)
+        self.assertEqual(before, taggart.memory_usage()['strings'])
+        self.assertEqual(0, taggart.memory_usage()['reverse'] - (
+            taggart.sys.getsizeof({})))
+
+
+class query_BaseCase(object):
+    def test_query_single_tag(self):
+        self.assertEqual(['file_2', 'file_3'], taggart.query('Tag B'))
+
+    def test_query_and(self):
+        self.assertEqual(['file_3'], taggart.query('Tag C & Tag D'))
+        self.assertEqual([], taggart.query('Tag A & Tag D & Tag B'))
+
+    def test_query_or(self):
+        self.assertEqual(['file_1', 'file_3'], taggart.query('Tag A|Tag D'))
+
+    def test_query_not(self):
+        self.assertEqual(['file_2'], taggart.query('Tag B & !Tag D'))
+        self.assertEqual(['file_1', 'file_2'], taggart.query('!Tag D'))
+        self.assertEqual(['file_1'], taggart.query('!Tag B & !Tag D'))
+
+    def test_query_nested(self):
+        self.assertEqual(
+            ['file_1', 'file_2'],
+            taggart.query('(Tag A | Tag C) & !(Tag B & Tag D)'))
+        self.assertEqual(
+            ['file_3'], taggart.query('Tag B & (Tag D | Nonexistent)'))
+        self.assertEqual(
+            ['file_3'], taggart.query('(Tag B | Tag A) & (Tag C & Tag D)'))
+
+    def test_query_nonexistent_tag(self):
+        self.assertEqual([], taggart.query('Nonexistent & Tag B'))
+
+    def test_query_tree(self):
+        self.assertEqual(['file_2'], taggart.query(
+            ('and', [('tag', 'Tag C'), ('not', ('tag', 'Tag D'))])))
+
+    def test_iter_query(self):
+        for expression in ['Tag B', 'Tag C & Tag D', 'Tag A|Tag D', '!Tag D',
+                           'Tag B & !Tag D', '(Tag A | Tag C) & !Tag D',
+                           ('or', [('tag', 'Tag A'), ('tag', 'Tag D')])]:
+            self.assertEqual(taggart.query(expression),
+                             list(taggart.iter_query(expression)))
+
+
+class query_TTF_TestCase(query_BaseCase, Taggart_TTF_BaseCase):
+    pass
+
+
+class query_FTT_TestCase(query_BaseCase, Taggart_FTT_BaseCase):
+    pass
+
+
+class query_BIDI_TestCase(query_BaseCase, Taggart_BIDI_BaseCase):
+    pass
+
+
+class query_ARRAY_TestCase(query_BaseCase, Taggart_ARRAY_BaseCase):
+    pass
+
+
+class query_SORTED_TestCase(query_BaseCase, Taggart_SORTED_BaseCase):
+    pass
+
+
+class query_SQLITE_TestCase(query_BaseCase, Taggart_SQLITE_BaseCase):
+    pass
+
+
+class page_BaseCase(object):
+    def test_pages_by_offset(self):
+        self.assertEqual(['file_2'],
+                         taggart.get_files_by_tag('Tag B', limit=1))
+        self.assertEqual(['file_3'], taggart.get_files_by_tag(
+            'Tag B', limit=1, offset=1))
+        self.assertEqual([], taggart.get_files_by_tag('Tag B', offset=2))
+        self.assertEqual(['Tag A', 'Tag B'], taggart.get_tags(limit=2))
+        self.assertEqual(['file_3'], taggart.get_files(offset=2))
+        self.assertEqual(['Tag C'], taggart.get_tags_by_file(
+            'file_3', limit=1, offset=1))
+
+    def test_pages_by_cursor(self):
+        self.assertEqual(['file_3'],
+                         taggart.get_files_by_tag('Tag B', after='file_2'))
+        self.assertEqual(['file_2'], taggart.get_files_by_tag(
+            'Tag B', after='file_1', limit=1))
+        self.assertEqual([], taggart.get_files_by_tag('Tag B', after='file_3'))
+        self.assertEqual(['Tag C', 'Tag D'],
+                         taggart.get_tags_by_file('file_3', after='Tag B'))
+        self.assertEqual(['Tag D'], taggart.get_tags(after='Tag C'))
+        self.assertEqual(['file_2'], taggart.get_files(
+            after='file_1', limit=1))
+
+    def test_cursor_survives_changes(self):
+        taggart.untag('file_2', 'Tag B')
+        taggart.tag('file_0', 'Tag B')
+        self.assertEqual(['file_3'],
+                         taggart.get_files_by_tag('Tag B', after='file_2'))
+
+    def test_query_pages(self):
+        self.assertEqual(['file_2'], taggart.query(
+            'Tag A | Tag B', after='file_1', limit=1))
+        self.assertEqual(['file_3'], taggart.query(
+            ('or', [('tag', 'Tag A'), ('tag', 'Tag B')]), offset=2))
+        pages, after = [], None
+        while True:
+            page = taggart.query('!Tag D | Tag C', after=after, limit=1)
+            if not page:
+                break
+            pages.append(page)
+            after = page[-1]
+        self.assertEqual([['file_1'], ['file_2'], ['file_3']], pages)
+
+    def test_pages_are_copies(self):
+        taggart.CACHE_SIZE = 0
+        taggart.get_files_by_tag('Tag B').append('file_9')
+        taggart.query('Tag B').append('file_9')
+        taggart.query(('tag', 'Tag B')).append('file_9')
+        self.assertEqual(['file_2', 'file_3'],
+                         taggart.get_files_by_tag('Tag B'))
+
+    def test_negative_limit_or_offset(self):
+        self.assertRaises(ValueError, taggart.get_files_by_tag, 'Tag B',
+                          limit=-1)
+        self.assertRaises(ValueError, taggart.query, 'Tag B', offset=-1)
+
+
+class page_TTF_TestCase(page_BaseCase, Taggart_TTF_BaseCase):
+    pass
+
+
+class page_FTT_TestCase(page_BaseCase, Taggart_FTT_BaseCase):
+    pass
+
+
+class page_BIDI_TestCase(page_BaseCase, Taggart_BIDI_BaseCase):
+    pass
+
+
+class page_ARRAY_TestCase(page_BaseCase, Taggart_ARRAY_BaseCase):
+    pass
+
+
+class page_SORTED_TestCase(page_BaseCase, Taggart_SORTED_BaseCase):
+    pass
+
+
+class page_SQLITE_TestCase(page_BaseCase, Taggart_SQLITE_BaseCase):
+    pass
+
+
+class iter_BaseCase(object):
+    def test_iterators_match_lists(self):
+        for tag_name in ['Tag A', 'Tag B', 'Tag D', 'Nonexistent']:
+            self.assertEqual(taggart.get_files_by_tag(tag_name),
+                             list(taggart.iter_files_by_tag(tag_name)))
+        for file_name in ['file_1', 'file_3', 'nonexistent']:
+            self.assertEqual(taggart.get_tags_by_file(file_name),
+                             list(taggart.iter_tags_by_file(file_name)))
+        self.assertEqual(taggart.get_tags(), list(taggart.iter_tags()))
+        self.assertEqual(taggart.get_files(), list(taggart.iter_files()))
+
+    def test_iterators_do_not_see_later_changes(self):
+        files = taggart.iter_files_by_tag('Tag B')
+        tags = taggart.iter_tags_by_file('file_3')
+        self.assertEqual('file_2', next(files))
+        self.assertEqual('Tag B', next(tags))
+        taggart.tag('file_0', ['Tag B', 'Tag A'])
+        taggart.untag('file_3', ['Tag B', 'Tag C'])
+        self.assertEqual(['file_3'], list(files))
+        self.assertEqual(['Tag C', 'Tag D'], list(tags))
+        self.assertEqual(['file_0', 'file_2'],
+                         list(taggart.iter_files_by_tag('Tag B')))
+
+
+class iter_TTF_TestCase(iter_BaseCase, Taggart_TTF_BaseCase):
+    pass
+
+
+class iter_FTT_TestCase(iter_BaseCase, Taggart_FTT_BaseCase):
+    pass
+
+
+class iter_BIDI_TestCase(iter_BaseCase, Taggart_BIDI_BaseCase):
+    pass
+
+
+class iter_ARRAY_TestCase(iter_BaseCase, Taggart_ARRAY_BaseCase):
+    pass
+
+
+class iter_SORTED_TestCase(iter_BaseCase, Taggart_SORTED_BaseCase):
+    def test_iterating_builds_no_list(self):
+        files = taggart.iter_files_by_tag('Tag B')
+        self.assertIs(taggart.THE_LIST['Tag B']._names,
+                      files.__reduce__()[1][0])
+
+
+class iter_SQLITE_TestCase(iter_BaseCase, Taggart_SQLITE_BaseCase):
+    pass
+
+
+class parse_query_TestCase(BaseCase):
+    def setUp(self):
+        super(parse_query_TestCase, self).setUp()
+        taggart.logger.setLevel('CRITICAL')
+
+    def test_parse_query(self):
+        self.assertEqual(
+            ('or', [
+                ('and', [('tag', 'A'), ('not', ('tag', 'B & C'))]),
+                ('tag', 'D "E"')]),
+            taggart._parse_query(' A & !"B & C" | "D \\"E\\"" '))
+
+    def test_parse_query_errors(self):
+        for expression in ('', 'A &', '(A', 'A)', '"A', '& A'):
+            self.assertRaises(ValueError, taggart._parse_query, expression)
+
+
+class Postings_TestCase(TestCase):
+    def setUp(self):
+        reload(taggart)
+
+    def test_add_out_of_order_and_duplicates(self):
+        postings = taggart.Postings(['c', 'a'])
+        postings.add('b')
+        postings.add('a')
+        postings.add('d')
+        postings.add('d')
+        self.assertEqual(4, len(postings))
+        self.assertEqual(['a', 'b', 'c', 'd'], sorted(postings))
+        self.assertEqual(
+            sorted(postings._ids), list(postings._ids))
+
+    def test_contains(self):
+        postings = taggart.Postings(['a', 'b'])
+        taggart._intern('c')
+        self.assertTrue('a' in postings)
+        self.assertFalse('c' in postings)
+        self.assertFalse('never interned' in postings)
+
+    def test_discard(self):
+        postings = taggart.Postings(['a', 'b', 'c'])
+        postings.discard('b')
+        postings.discard('b')
+        postings.discard('never interned')
+        self.assertEqual({'a', 'c'}, postings)
+
+    def test_set_operations(self):
+        a = taggart.Postings(['a', 'b', 'c'])
+        b = taggart.Postings(['b', 'c', 'd'])
+        self.assertEqual({'b', 'c'}, a & b)
+        self.assertEqual({'b', 'c'}, a & {'b', 'c', 'e'})
+        self.assertEqual({'b', 'c'}, {'b', 'c', 'e'} & a)
+        self.assertEqual({'a'}, a - b)
+        self.assertEqual({'c'}, a - {'a', 'b'})
+        self.assertEqual({'e'}, {'b', 'c', 'e'} - a)
+        self.assertEqual({'a', 'b', 'c', 'd'}, a | b)
+        self.assertEqual({'a', 'b', 'c', 'e'}, a | {'e'})
+        self.assertIsInstance(a & b, taggart.Postings)
+        self.assertIsInstance(a & {'b'}, set)
+
+    def test_update(self):
+        postings = taggart.Postings(['c', 'a'])
+        postings.update(['b', 'a', 'b'])
+        self.assertEqual(['a', 'b', 'c'], sorted(postings))
+        self.assertEqual(3, len(postings))
+
+    def test_difference_update(self):
+        postings = taggart.Postings(['a', 'b', 'c', 'd'])
+        postings.difference_update(['b', 'd', 'never interned'])
+        self.assertEqual({'a', 'c'}, postings)
+
+    def test_repr(self):
+        self.assertEqual(
+            "Postings(['a', 'b'])", repr(taggart.Postings(['b', 'a'])))
+
+    def test_sizeof_includes_ids(self):
+        small = taggart.sys.getsizeof(taggart.Postings())
+        large = taggart.Postings('file_%d' % i for i in range(1000))
+        self.assertTrue(taggart.sys.getsizeof(large) >= small + 4000)
+
+
+class SortedPostings_TestCase(TestCase):
+    def setUp(self):
+        reload(taggart)
+
+    def test_add_out_of_order_and_duplicates(self):
+        postings = taggart.SortedPostings(['c', 'a'])
+        postings.add('b')
+        postings.add('a')
+        postings.add('d')
+        postings.update(['d', 'e'])
+        self.assertEqual(5, len(postings))
+        self.assertEqual(['a', 'b', 'c', 'd', 'e'], list(postings))
+        self.assertEqual([], postings._pending)
+
+    def test_contains(self):
+        postings = taggart.SortedPostings(['a', 'b'])
+        self.assertTrue('a' in postings)
+        self.assertFalse('c' in postings)
+
+    def test_discard(self):
+        postings = taggart.SortedPostings(['a', 'b', 'c'])
+        postings.add('d')
+        postings.discard('b')
+        postings.discard('b')
+        self.assertEqual(['a', 'c', 'd'], list(postings))
+
+    def test_changes_are_merged_on_the_next_read(self):
+        postings = taggart.SortedPostings(['a', 'b', 'c', 'd'])
+        list(postings)
+        postings.discard('b')
+        postings.add('e')
+        postings.discard('e')
+        postings.add('b')
+        postings.difference_update(['a', 'c', 'x'])
+        postings.update(['a', 'f'])
+        postings.add('g')
+        postings.discard('d')
+        self.assertEqual(['a', 'b', 'c', 'd'], postings._names)
+        self.assertEqual(4, len(postings))
+        self.assertTrue('b' in postings)
+        self.assertFalse('c' in postings)
+        self.assertEqual(['a', 'b', 'f', 'g'], list(postings))
+        self.assertEqual(([], None), (postings._pending, postings._removed))
+
+    def test_difference_update(self):
+        postings = taggart.SortedPostings(['a', 'b', 'c', 'd'])
+        postings.difference_update(['b', 'd', 'e'])
+        postings.difference_update(['e'])
+        self.assertEqual(['a', 'c'], list(postings))
+
+    def test_changes_do_not_disturb_iteration(self):
+        postings = taggart.SortedPostings(['a', 'b', 'c'])
+        names = iter(postings)
+        postings.discard('a')
+        postings.difference_update(['b'])
+        postings.add('aa')
+        self.assertEqual(['a', 'b', 'c'], list(names))
+        self.assertEqual(['aa', 'c'], list(postings))
+
+    def test_set_operations(self):
+        a = taggart.SortedPostings(['a', 'b', 'c'])
+        b = taggart.SortedPostings(['d', 'c', 'b'])
+        c = taggart.SortedPostings(['c'])
+        self.assertEqual(['b', 'c'], list(a & b))
+        self.assertEqual(['c'], list(a & c))
+        self.assertEqual(['b', 'c'], list(a & {'b', 'c', 'e'}))
+        self.assertEqual(['b', 'c'], list({'b', 'c', 'e'} & a))
+        self.assertEqual(['a'], list(a - b))
+        self.assertEqual(['c'], list(a - {'a', 'b'}))
+        self.assertEqual({'e'}, {'b', 'c', 'e'} - a)
+        self.assertEqual(['a', 'b', 'c', 'd'], list(a | b))
+        self.assertEqual({'a', 'b', 'c', 'e'}, a | {'e'})
+        self.assertEqual({'b'}, a & ['b'])
+        self.assertEqual({'a', 'c'}, a - ['b'])
+        self.assertIsInstance(a & b, taggart.SortedPostings)
+        self.assertIsInstance(a - {'a'}, taggart.SortedPostings)
+
+    def test_set_operation_results_may_be_changed(self):
+        union = taggart.SortedPostings(['a']) | taggart.SortedPostings(['c'])
+        self.assertTrue('c' in union)
+        union.add('b')
+        self.assertEqual(['a', 'b', 'c'], list(union))
+
+    def test_repr(self):
+        self.assertEqual("SortedPostings(['a', 'b'])",
+                         repr(taggart.SortedPostings(['b', 'a'])))
+
+    def test_sizeof_includes_names(self):
+        small = taggart.sys.getsizeof(taggart.SortedPostings())
+        large = taggart.SortedPostings('file_%d' % i for i in range(1000))
+        self.assertTrue(taggart.sys.getsizeof(large) >= small + 8000)
+
+    def test_sorted_gives_the_list_of_sorted_postings(self):
+        postings = taggart.SortedPostings(['b', 'a'])
+        names = taggart._sorted(postings)
+        self.assertIs(postings._names, names)
+        self.assertEqual(['a', 'b'], taggart._sorted({'b', 'a'}))
+
+
+class Postings_bitmap_TestCase(TestCase):
+    def setUp(self):
+        reload(taggart)
+        taggart.BITMAP_MINIMUM = 4
+        taggart.BITMAP_DENSITY = 0.125
+        self.names = ['file_%02d' % i for i in range(32)]
+        for name in self.names:
+            taggart._intern(name)
+
+    def test_switches_to_bitmap_when_dense(self):
+        postings = taggart.Postings(self.names[:4])
+        self.assertEqual(4, len(postings))
+        self.assertEqual(None, postings._bits)
+        postings.add(self.names[20])
+        self.assertEqual(5, len(postings))
+        self.assertNotEqual(None, postings._bits)
+        self.assertEqual(self.names[:4] + [self.names[20]], sorted(postings))
+        self.assertTrue(self.names[20] in postings)
+        self.assertFalse(self.names[21] in postings)
+
+    def test_switches_back_to_array_when_sparse(self):
+        postings = taggart.Postings(self.names[:8])
+        postings.discard(self.names[0])
+        postings.discard(self.names[0])
+        postings.discard(self.names[1])
+        self.assertNotEqual(None, postings._bits)
+        for name in self.names[2:5]:
+            postings.discard(name)
+        self.assertEqual(3, len(postings))
+        self.assertEqual(None, postings._bits)
+        self.assertEqual(self.names[5:8], sorted(postings))
+
+    def test_bitmap_grows_with_symbol_table(self):
+        postings = taggart.Postings(self.names[:16])
+        self.assertEqual(16, len(postings))
+        self.assertNotEqual(None, postings._bits)
+        for i in range(16):
+            postings.add('new_file_%d' % i)
+        postings.add(self.names[0])
+        self.assertTrue('new_file_15' in postings)
+        self.assertFalse('never interned' in postings)
+        self.assertEqual(32, len(postings))
+
+    def test_bitmap_update(self):
+        postings = taggart.Postings(self.names[:16])
+        self.assertNotEqual(0, len(postings))
+        postings.update(self.names[12:20])
+        postings.difference_update(self.names[:2] + ['never interned'])
+        postings.difference_update(self.names[:2])
+        self.assertNotEqual(None, postings._bits)
+        self.assertEqual(self.names[2:20], sorted(postings))
+
+    def test_bitmap_set_operations(self):
+        dense_a = taggart.Postings(self.names[:16])
+        dense_b = taggart.Postings(self.names[8:24])
+        sparse = taggart.Postings(self.names[6:10])
+        self.assertEqual(set(self.names[8:16]), dense_a & dense_b)
+        self.assertEqual(set(self.names[:24]), dense_a | dense_b)
+        self.assertEqual(set(self.names[:8]), dense_a - dense_b)
+        self.assertEqual(set(self.names[8:10]), dense_b & sparse)
+        self.assertEqual(set(self.names[8:10]), sparse & dense_b)
+        self.assertEqual(set(self.names[6:8]), sparse - dense_b)
+        self.assertEqual(
+            set(self.names[10:24]), dense_b - sparse)
+        self.assertEqual(set(self.names[6:24]), sparse | dense_b)
+        self.assertNotEqual(None, (dense_a & dense_b)._bits)
+
+    def test_bitmap_sizeof(self):
+        postings = taggart.Postings(self.names)
+        self.assertTrue(taggart.sys.getsizeof(postings) >= (
+            taggart.sys.getsizeof(postings._bits)))
+
+
+class bin_TestCase(TestCase):
+    def setUp(self):
+        reload(taggart)
+        taggart.logger.setLevel('CRITICAL')
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'tags.bin')
+        taggart.MAPPING = taggart.TAG_TO_FILE
+        taggart.THE_LIST = {
+            'Tag A': {'file_1'},
+            'Tag B': {'file_2', 'file_3'},
+            'Tag C': {'file_2', 'file_3'},
+            'Tag é': {'file_3'}
+        }
+        self.tag_map = copy.deepcopy(taggart.THE_LIST)
+        self.file_map = {
+            'file_1': {'Tag A'},
+            'file_2': {'Tag B', 'Tag C'},
+            'file_3': {'Tag B', 'Tag C', 'Tag é'}
+        }
+
+    def reload_snapshot(self, mapping):
+        taggart.save(self.path)
+        taggart.THE_LIST = {}
+        taggart.MAPPING = mapping
+        taggart.load(self.path)
+
+    def test_round_trip_TTF(self):
+        self.reload_snapshot(taggart.TAG_TO_FILE)
+        self.assertTrue(isinstance(taggart.THE_LIST, taggart.MappedTagMap))
+        self.assertEqual(self.tag_map, taggart.THE_LIST)
+        self.assertEqual({}, taggart.THE_REVERSE_LIST)
+
+    def test_round_trip_FTT(self):
+        taggart.MAPPING = taggart.FILE_TO_TAG
+        taggart.THE_LIST = self.file_map
+        self.reload_snapshot(taggart.FILE_TO_TAG)
+        self.assertEqual(self.file_map, taggart.THE_LIST)
+        self.assertEqual(
+            ['Tag B', 'Tag C'], taggart.get_tags_by_file('file_2'))
+
+    def test_round_trip_BIDI(self):
+        self.reload_snapshot(taggart.BIDIRECTIONAL)
+        self.assertEqual(self.tag_map, taggart.THE_LIST)
+        self.assertEqual(self.file_map, taggart.THE_REVERSE_LIST)
+        self.assertEqual(['file_2', 'file_3'], taggart.query('Tag B & Tag C'))
+        self.assertEqual(['file_1', 'file_2', 'file_3'], taggart.get_files())
+
+    def test_round_trip_empty(self):
+        taggart.THE_LIST = {}
+        self.reload_snapshot(taggart.TAG_TO_FILE)
+        self.assertEqual(0, len(taggart.THE_LIST))
+        self.assertEqual([], taggart.get_tags())
+
+    def test_lookups(self):
+        self.reload_snapshot(taggart.TAG_TO_FILE)
+        self.assertEqual(
+            ['file_2', 'file_3'], taggart.get_files_by_tag('Tag B'))
+        self.assertEqual([], taggart.get_files_by_tag('Tag'))
+        self.assertEqual([], taggart.get_files_by_tag('Tag Z'))
+        files = taggart.THE_LIST['Tag C']
+        self.assertTrue(files is taggart.THE_LIST['Tag C'])
+        self.assertTrue('Tag C' in taggart.THE_LIST)
+        self.assertTrue('file_2' in files)
+        self.assertFalse('file_1' in files)
+        self.assertFalse('file_0' in files)
+        self.assertFalse('file_9' in files)
+        self.assertEqual(2, len(files))
+        self.assertEqual("MappedPostings(['file_2', 'file_3'])", repr(files))
+        self.assertEqual({'file_2'}, files - taggart.THE_LIST['Tag é'])
+
+    def test_changes_are_copied_on_write(self):
+        self.reload_snapshot(taggart.TAG_TO_FILE)
+        taggart.tag(['file_1', 'file_4'], 'Tag C')
+        taggart.untag('file_2', 'Tag B')
+        taggart.untag('file_1', 'Tag A')
+        taggart.tag('file_5', 'Tag D')
+        files = taggart.THE_LIST['Tag C']
+        files.update(['file_6'])
+        files.difference_update(['file_6', 'file_1'])
+        files.add('file_7')
+        files.discard('file_7')
+        self.assertFalse('file_1' in files)
+        self.assertEqual(
+            ['Tag B', 'Tag C', 'Tag D', 'Tag é'], taggart.get_tags())
+        self.assertEqual(['Tag B', 'Tag C', 'Tag D', 'Tag é'],
+                         sorted(taggart.THE_LIST))
+        self.assertEqual(['file_2', 'file_3', 'file_4'],
+                         taggart.get_files_by_tag('Tag C'))
+        taggart.save(self.path)
+        taggart.THE_LIST = {}
+        taggart.load(self.path)
+        self.assertEqual({
+            'Tag B': {'file_3'},
+            'Tag C': {'file_2', 'file_3', 'file_4'},
+            'Tag D': {'file_5'},
+            'Tag é': {'file_3'}}, taggart.THE_LIST)
+
+    def test_deleted_keys(self):
+        self.reload_snapshot(taggart.TAG_TO_FILE)
+        taggart.THE_LIST['Tag Z'] = {'file_9'}
+        del taggart.THE_LIST['Tag Z']
+        del taggart.THE_LIST['Tag A']
+        self.assertRaises(KeyError, taggart.THE_LIST.__delitem__, 'Tag A')
+        self.assertRaises(KeyError, taggart.THE_LIST.__delitem__, 'Tag Z')
+        self.assertRaises(KeyError, taggart.THE_LIST.__getitem__, 'Tag A')
+        self.assertFalse('Tag A' in taggart.THE_LIST)
+        self.assertEqual(3, len(taggart.THE_LIST))
+        taggart.THE_LIST['Tag A'] = {'file_0'}
+        self.assertEqual({'file_0'}, taggart.THE_LIST['Tag A'])
+        self.assertTrue('Tag A' in taggart.THE_LIST)
+
+    def test_dump_bin(self):
+        output = BytesIO()
+        taggart.dump_bin(output)
+        with open(self.path, 'wb') as f:
+            f.write(output.getvalue())
+        taggart.THE_LIST = {}
+        taggart.load(self.path)
+        self.assertEqual(self.tag_map, taggart.THE_LIST)
+
+    def test_load_merges_into_existing_tags(self):
+        taggart.save(self.path)
+        taggart.THE_LIST = {'Tag A': {'file_0'}, 'Tag Z': {'file_9'}}
+        taggart.load(self.path)
+        self.assertTrue(isinstance(taggart.THE_LIST, dict))
+        self.tag_map['Tag A'].add('file_0')
+        self.tag_map['Tag Z'] = {'file_9'}
+        self.assertEqual(self.tag_map, taggart.THE_LIST)
+
+    def test_load_with_clean_slate(self):
+        taggart.save(self.path)
+        taggart.THE_LIST = {'Tag Z': {'file_9'}}
+        taggart.load(self.path, overwrite=True)
+        self.assertEqual(self.tag_map, taggart.THE_LIST)
+
+    def test_load_rejects_other_files(self):
+        taggart.save(self.path, fmt='text')
+        self.assertRaises(IOError, taggart.load, self.path)
+
+
+class journal_TestCase(TestCase):
+    def setUp(self):
+        reload(taggart)
+        taggart.logger.setLevel('CRITICAL')
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'tags.txt')
+        taggart.JOURNAL = os.path.join(self.directory, 'tags.journal')
+        taggart.MAPPING = taggart.TAG_TO_FILE
+        taggart.THE_LIST = {
+            'Tag A': {'file_1'},
+            'Tag B': {'file_2', 'file_3'}
+        }
+
+    def read_journal(self):
+        with open(taggart.JOURNAL) as f:
+            return [json.loads(line) for line in f]
+
+    def make_changes(self):
+        taggart.tag(['file_1', 'file_2', 'dir/file_5'], 'Tag C')
+        taggart.untag('file_3', ['Tag B', 'Tag Z'])
+        taggart.rename_tag('Tag A', 'Tag D')
+        taggart.rename_file('file_2', 'file_4')
+        taggart.rename_files({'file_1': 'file_2', 'file_3': 'file_1'})
+        taggart.rename_directory('dir', 'new_dir')
+
+    def test_changes_are_journaled(self):
+        taggart.MAPPING = taggart.FILE_TO_TAG
+        taggart.THE_LIST = {
+            'file_1': {'Tag A'},
+            'file_2': {'Tag B'},
+            'file_3': {'Tag B'}
+        }
+        self.make_changes()
+        self.assertEqual([
+            ['tag', [['file_1', 'Tag C'], ['file_2', 'Tag C'],
+                     ['dir/file_5', 'Tag C']]],
+            ['untag', [['file_3', 'Tag B'], ['file_3', 'Tag Z']]],
+            ['rename_tag', 'Tag A', 'Tag D'],
+            ['rename_file', 'file_2', 'file_4'],
+            ['rename_files', {'file_1': 'file_2', 'file_3': 'file_1'}],
+            ['rename_directory', 'dir', 'new_dir']], self.read_journal())
+
+    def test_missing_files_are_not_journaled(self):
+        taggart.tag(['file_1', self.path], 'Tag C', assert_exists=True)
+        self.assertEqual([['tag', []]], self.read_journal())
+
+    def test_nothing_is_journaled_without_a_journal(self):
+        taggart.JOURNAL = None
+        self.make_changes()
+        self.assertEqual([], os.listdir(self.directory))
+
+    def test_load_replays_journal(self):
+        taggart.save(self.path)
+        self.make_changes()
+        expected = copy.deepcopy(taggart.THE_LIST)
+        taggart.THE_LIST = {}
+        taggart.load(self.path)
+        self.assertEqual(expected, taggart.THE_LIST)
+        self.assertEqual(7, len(self.read_journal()))
+        self.assertEqual(['save', os.path.abspath(self.path)],
+                         self.read_journal()[0])
+
+    def test_load_replays_journal_under_any_mapping(self):
+        taggart.save(self.path)
+        self.make_changes()
+        taggart.remap(taggart.FILE_TO_TAG)
+        expected = copy.deepcopy(taggart.THE_LIST)
+        taggart.THE_LIST = {}
+        taggart.load(self.path)
+        self.assertEqual(expected, taggart.THE_LIST)
+
+    def test_load_bin_replays_journal(self):
+        path = os.path.join(self.directory, 'tags.bin')
+        taggart.save(path)
+        self.make_changes()
+        expected = copy.deepcopy(taggart.THE_LIST)
+        taggart.THE_LIST = {'Tag Z': {'file_0'}}
+        taggart.load(path)
+        expected['Tag Z'] = {'file_0'}
+        self.assertEqual(expected, taggart.THE_LIST)
+        self.assertEqual(7, len(self.read_journal()))
+
+    def test_save_then_load_only_replays_later_changes(self):
+        other = os.path.join(self.directory, 'other.json')
+        taggart.save(other)
+        taggart.rename_tag('Tag A', 'Tag D')
+        taggart.tag('file_9', 'Tag A')
+        taggart.save(self.path)
+        taggart.rename_file('file_2', 'file_4')
+        expected = copy.deepcopy(taggart.THE_LIST)
+        taggart.THE_LIST = {}
+        taggart.load(self.path)
+        self.assertEqual(expected, taggart.THE_LIST)
+        taggart.THE_LIST = {}
+        taggart.load(other)
+        self.assertEqual(expected, taggart.THE_LIST)
+        taggart.THE_LIST = {}
+        taggart.replay(taggart.JOURNAL, self.directory)
+        self.assertEqual({'Tag A': {'file_9'}}, taggart.THE_LIST)
+
+    def test_replay_skips_incomplete_checkpoints(self):
+        taggart.save(self.path)
+        taggart.tag('file_1', 'Tag C')
+        with open(taggart.JOURNAL, 'a') as f:
+            f.write('["save", "%s' % os.path.abspath(self.path))
+        taggart.THE_LIST = {}
+        taggart.replay(taggart.JOURNAL, self.path)
+        self.assertEqual({'Tag C': {'file_1'}}, taggart.THE_LIST)
+
+    def test_replay_skips_incomplete_records(self):
+        taggart.tag('file_1', 'Tag C')
+        with open(taggart.JOURNAL, 'a') as f:
+            f.write('["tag", [["file_2", "Ta')
+        taggart.THE_LIST = {}
+        taggart.replay(taggart.JOURNAL)
+        self.assertEqual({'Tag C': {'file_1'}}, taggart.THE_LIST)
+
+    def test_replay_renames_directories_tagged_during_replay(self):
+        taggart.tag('dir/file_5', 'Tag C')
+        taggart.rename_directory('dir', 'new_dir')
+        taggart.get_files()
+        taggart.replay(taggart.JOURNAL)
+        self.assertEqual({'Tag A': {'file_1'}, 'Tag B': {'file_2', 'file_3'},
+                          'Tag C': {'new_dir/file_5'}}, taggart.THE_LIST)
+
+    def test_compact(self):
+        self.make_changes()
+        expected = copy.deepcopy(taggart.THE_LIST)
+        taggart.compact(self.path)
+        self.assertEqual([], self.read_journal())
+        taggart.THE_LIST = {}
+        taggart.load(self.path)
+        self.assertEqual(expected, taggart.THE_LIST)
+
+    def test_compact_without_a_journal(self):
+        taggart.JOURNAL = None
+        taggart.compact(self.path)
+        self.assertEqual(['tags.txt'], os.listdir(self.directory))
+
+
+class import_TestCase(TestCase):
+    def setUp(self):
+        self.addCleanup(reload, taggart)
+        reload(taggart)
+
+    def test_import_defers_slow_modules(self):
+        code = ('import sys, taggart; print(" ".join(sorted(m for m in ('
+                '"json", "locale", "logging", "multiprocessing", "yaml") '
+                'if m in sys.modules)))')
+        output = subprocess.check_output([sys.executable, '-c', code])
+        self.assertEqual(b'', output.strip())
+
+    def test_logger_is_set_up_on_first_use(self):
+        lazy = taggart.logger
+        self.assertIsInstance(lazy, taggart._LazyLogger)
+        self.assertEqual('taggart', lazy.name)
+        self.assertIs(taggart._LOGGER, taggart.logger)
+        self.assertEqual(1, len(taggart.logger.handlers))
+        self.assertEqual(logging.WARNING, taggart.logger.level)
+
+    def test_logger_is_set_up_once(self):
+        lazy = taggart.logger
+        lazy.setLevel('CRITICAL')
+        lazy.setLevel('CRITICAL')
+        self.assertIs(taggart._LOGGER, taggart._logger())
+        self.assertEqual(1, len(taggart.logger.handlers))
+
+    def test_debug_logger(self):
+        taggart.DEBUG = True
+        self.assertEqual(logging.DEBUG, taggart._logger().level)
+
+
+class TagStore_TestCase(TestCase):
+    def setUp(self):
+        reload(taggart)
+        taggart.logger.setLevel('CRITICAL')
+
+    def test_stores_are_independent(self):
+        first = taggart.TagStore()
+        second = taggart.TagStore(taggart.FILE_TO_TAG)
+        first.tag('file_1', 'Tag A')
+        second.tag('file_2', 'Tag B')
+        self.assertEqual({'Tag A': {'file_1'}}, first.the_list)
+        self.assertEqual({'file_2': {'Tag B'}}, second.the_list)
+        self.assertEqual(['Tag B'], second.get_tags())
+        self.assertEqual({}, taggart.THE_LIST)
+
+    def test_init_parses_for_the_stores_mapping(self):
+        store = taggart.TagStore(taggart.FILE_TO_TAG)
+        store.init('Tag A<==>file_1' + os.linesep)
+        self.assertEqual({'file_1': {'Tag A'}}, store.the_list)
+        self.assertEqual(taggart.TAG_TO_FILE, taggart.MAPPING)
+
+    def test_default_store_uses_module_globals(self):
+        taggart.THE_LIST = {'file_1': {'Tag A'}}
+        taggart.DEFAULT_STORE.mapping = taggart.FILE_TO_TAG
+        self.assertEqual(taggart.FILE_TO_TAG, taggart.MAPPING)
+        self.assertEqual(['Tag A'], taggart.DEFAULT_STORE.get_tags())
+        taggart.DEFAULT_STORE.remap()
+        self.assertEqual({'Tag A': {'file_1'}}, taggart.THE_LIST)
+
+
+class SQLiteStore_TestCase(TestCase):
+    def setUp(self):
+        reload(taggart)
+        taggart.logger.setLevel('CRITICAL')
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'tags.db')
+        self.store = self.open()
+        self.store.tag_edges([('file_1', 'Tag A'), ('file_2', 'Tag B'),
+                              ('file_3', 'Tag B'), ('file_3', 'Tag D')])
+
+    def open(self, **kwargs):
+        store = SQLiteStore(self.path, **kwargs)
+        self.addCleanup(store.close)
+        return store
+
+    def test_database_is_kept_on_disk(self):
+        store = self.open()
+        self.assertEqual(['Tag A', 'Tag B', 'Tag D'], store.get_tags())
+        self.assertEqual(
+            ['file_2', 'file_3'], store.get_files_by_tag('Tag B'))
+        self.assertEqual(
+            ['Tag B', 'Tag D'], store.get_tags_by_file('file_3'))
+        self.assertEqual('wal', store._connect().execute(
+            'PRAGMA journal_mode').fetchone()[0])
+
+    def test_only_changed_edges_are_counted(self):
+        taggart.METRICS = True
+        self.store.tag(['file_1', 'file_4'], 'Tag A')
+        self.store.untag(['file_1', 'file_5'], 'Tag A')
+        self.store.rename_tag('Tag B', 'Tag D')
+        self.store.rename_file('file_4', 'file_3')
+        self.store.rename_files({'file_2': 'file_3', 'file_3': 'file_2'})
+        self.assertEqual(
+            {'tag': 1, 'untag': 1, 'rename_tag': 3, 'rename_file': 2,
+             'rename_files': 6},
+            dict((name, operation['edges']) for name, operation in
+                 taggart.stats()['operations'].items()))
+
+    def test_tag_maps(self):
+        self.assertEqual(3, len(self.store.the_list))
+        self.assertIn('Tag A', self.store.the_list)
+        self.assertNotIn('Tag C', self.store.the_list)
+        self.assertIn('file_3', self.store.the_reverse_list)
+        self.assertRaises(KeyError, lambda: self.store.the_list['Tag C'])
+        self.assertEqual({'Tag A': {'file_1'}, 'Tag B': {'file_2', 'file_3'},
+                          'Tag D': {'file_3'}}, dict(self.store.the_list))
+        self.assertEqual(2, self.store.the_list.count('Tag B'))
+
+    def test_single_edges(self):
+        self.store._tag('file_4', 'Tag A')
+        self.store._untag('file_1', 'Tag A')
+        self.assertEqual(['file_4'], self.store.get_files_by_tag('Tag A'))
+
+    @patch.object(taggart.os.path, 'exists')
+    def test_tag_asserts_existence(self, exists_mock):
+        exists_mock.return_value = False
+        self.assertRaises(
+            IOError, self.store._tag, 'file_4', 'Tag A', assert_exists=True)
+        self.assertEqual(['file_1'], self.store.get_files_by_tag('Tag A'))
+
+    def test_rename_tag_and_file(self):
+        self.store.rename_tag('Tag A', 'Tag A')
+        self.store.rename_tag('Tag B', 'Tag D')
+        self.store.rename_file('file_3', 'file_3')
+        self.store.rename_file('file_2', 'file_1')
+        self.assertEqual(['Tag A', 'Tag D'], self.store.get_tags())
+        self.assertEqual(
+            ['file_1', 'file_3'], self.store.get_files_by_tag('Tag D'))
+        self.assertEqual(
+            ['Tag A', 'Tag D'], self.store.get_tags_by_file('file_1'))
+
+    def test_failed_transactions_are_rolled_back(self):
+        def fail():
+            with self.store._transaction() as connection:
+                connection.execute('DELETE FROM edges')
+                self.store._tag_batch([('file_4', 'Tag E')])
+                raise ValueError('Oops')
+        self.assertRaises(ValueError, fail)
+        self.assertEqual(['Tag A', 'Tag B', 'Tag D'], self.open().get_tags())
+
+    def test_changes_by_other_connections_are_seen(self):
+        other = self.open()
+        self.assertEqual(['file_1'], self.store.get_files_by_tag('Tag A'))
+        self.assertEqual(['Tag A', 'Tag B', 'Tag D'], self.store.get_tags())
+        other.tag('file_4', 'Tag A')
+        self.assertEqual(
+            ['file_1', 'file_4'], self.store.get_files_by_tag('Tag A'))
+        self.assertEqual(['file_1', 'file_2', 'file_3', 'file_4'],
+                         self.store.get_files())
+
+    def test_threads_use_their_own_connections(self):
+        connections = []
+        thread = threading.Thread(target=lambda: connections.append(
+            (self.store._connect(), self.store.get_tags())))
+        thread.start()
+        thread.join()
+        self.assertIsNot(self.store._connect(), connections[0][0])
+        self.assertEqual(['Tag A', 'Tag B', 'Tag D'], connections[0][1])
+        self.store.close()
+        self.assertEqual(['Tag A', 'Tag B', 'Tag D'], self.store.get_tags())
+
+    def test_query_estimates_by_counting(self):
+        self.assertEqual(['file_3'], self.store.query('Tag B & Tag D'))
+        self.assertEqual(['file_2'], self.store.query('Tag B & !Tag D'))
+        self.assertEqual(['file_1'], self.store.query('!(Tag B | Tag D)'))
+
+    def test_save_and_load(self):
+        for fmt in ('bin', 'json', 'text', 'yaml'):
+            output = os.path.join(self.directory, 'tags.' + fmt)
+            self.store.save(output)
+            store = SQLiteStore(os.path.join(self.directory, fmt + '.db'))
+            self.addCleanup(store.close)
+            store.tag('file_9', 'Tag Z')
+            store.load(output)
+            self.assertEqual(['Tag A', 'Tag B', 'Tag D', 'Tag Z'],
+                             store.get_tags())
+            store.load(output, overwrite=True)
+            self.assertEqual(self.store.dump(), store.dump())
+
+    def test_load_replays_journal(self):
+        journal = os.path.join(self.directory, 'tags.journal')
+        output = os.path.join(self.directory, 'tags.txt')
+        self.store.save(output)
+        store = self.open(journal=journal)
+        store.tag('file_4', 'Tag E')
+        store.load(output, overwrite=True)
+        self.assertEqual(['file_4'], store.get_files_by_tag('Tag E'))
+
+    def test_load_missing_file(self):
+        self.assertRaises(IOError, self.store.load,
+                          os.path.join(self.directory, 'missing.txt'))
+
+    def test_init(self):
+        self.store.init('{"Tag E": ["file_5"]}', fmt='json')
+        self.assertEqual(['Tag A', 'Tag B', 'Tag D', 'Tag E'],
+                         self.store.get_tags())
+        self.store.init('Tag F<==>file_6' + os.linesep, overwrite=True)
+        self.assertEqual(['Tag F'], self.store.get_tags())
+
+    def test_remap_does_nothing(self):
+        self.store.remap(taggart.FILE_TO_TAG)
+        self.assertEqual(taggart.BIDIRECTIONAL, self.store.mapping)
+        self.assertEqual(['Tag B', 'Tag D'],
+                         self.store.get_tags_by_file('file_3'))
+
+    def test_module_functions_use_default_store(self):
+        self.addCleanup(
+            setattr, taggart, 'DEFAULT_STORE', taggart.DEFAULT_STORE)
+        taggart.DEFAULT_STORE = self.store
+        taggart.tag('file_4', 'Tag E')
+        taggart.rename_tag('Tag E', 'Tag F')
+        self.assertEqual(['file_4'], taggart.get_files_by_tag('Tag F'))
+        self.assertEqual({}, taggart.THE_LIST)
+
+    def test_aio(self):
+        self.assertEqual(['file_2', 'file_3'], asyncio.run(
+            aio.get_files_by_tag('Tag B', store=self.store)))
+
+
+class QueryCache_TestCase(TestCase):
+    def setUp(self):
+        reload(taggart)
+        self.cache = taggart.QueryCache()
+
+    def test_stale_results_are_not_used(self):
+        self.cache.put(('files', 'Tag A'), (1,), ['file_1'])
+        self.assertEqual(['file_1'], self.cache.get(('files', 'Tag A'), (1,)))
+        self.assertIsNone(self.cache.get(('files', 'Tag A'), (2,)))
+        self.assertIsNone(self.cache.get(('files', 'Tag A'), (1,)))
+        self.assertEqual({'hits': 1, 'misses': 2, 'evictions': 0,
+                          'invalidations': 1, 'entries': 0, 'bytes': 0},
+                         self.cache.stats())
+
+    def test_least_recently_used_results_are_evicted(self):
+        taggart.CACHE_SIZE = 2
+        self.cache.put('a', (), [])
+        self.cache.put('b', (), [])
+        self.cache.get('a', ())
+        self.cache.put('c', (), [])
+        self.assertIsNone(self.cache.get('b', ()))
+        self.assertEqual([], self.cache.get('a', ()))
+        self.assertEqual(1, self.cache.stats()['evictions'])
+
+    def test_results_are_kept_under_cache_bytes(self):
+        big = list(range(1000))
+        taggart.CACHE_BYTES = 2 * sys.getsizeof(big)
+        self.cache.put('a', (), big)
+        self.cache.put('b', (), big)
+        self.cache.put('a', (), big)
+        self.assertEqual(2, len(self.cache))
+        self.cache.put('c', (), big)
+        self.assertEqual(2, len(self.cache))
+        self.assertEqual(2 * sys.getsizeof(big), self.cache.stats()['bytes'])
+        self.cache.clear()
+        self.assertEqual(0, self.cache.stats()['bytes'])
+
+
+class DirectoryIndex_TestCase(TestCase):
+    def setUp(self):
+        reload(taggart)
+        self.tree = taggart.DirectoryIndex()
+        self.tree.add('a/b/c', ('Tag A',))
+        self.tree.add('a/b', ('Tag B',))
+        self.tree.add('a/bc')
+
+    def test_under(self):
+        self.assertEqual([('a/b', ('Tag B',)), ('a/b/c', ('Tag A',))],
+                         sorted(self.tree.under('a/b/')))
+        self.assertEqual(['a/b', 'a/b/c', 'a/bc'],
+                         sorted(name for name, _ in self.tree.under('a')))
+        self.assertEqual([], self.tree.under('x/y'))
+        self.assertEqual(('Tag A',), self.tree.get('a/b/c'))
+        self.assertIsNone(self.tree.get('a/x'))
+
+    def test_discard_prunes_empty_directories(self):
+        self.tree.discard('a/x/y')
+        self.tree.discard('a/b/d')
+        self.tree.discard('a/b/c')
+        self.assertEqual({None: {'a/b': ('Tag B',), 'a/bc': None}},
+                         self.tree.root['a'])
+        self.tree.discard('a/b')
+        self.tree.discard('a/bc')
+        self.assertEqual({}, self.tree.root)
+
+    def test_memory_usage(self):
+        getsizeof = taggart.sys.getsizeof
+        self.assertEqual(
+            getsizeof(self.tree.root) + getsizeof(self.tree.root['a']) +
+            getsizeof(self.tree.root['a']['b']) + getsizeof('a') +
+            getsizeof('b') + getsizeof(self.tree.root['a'][None]) +
+            getsizeof(self.tree.root['a']['b'][None]) +
+            2 * getsizeof(('Tag A',)), self.tree.memory_usage())
+
+
+class metrics_TestCase(TestCase):
+    def setUp(self):
+        reload(taggart)
+        taggart.logger.setLevel('CRITICAL')
+        self.store = taggart.TagStore(taggart.TAG_TO_FILE)
+        self.store.tag_edges([('a/file_1', 'Tag A'), ('a/file_2', 'Tag A'),
+                              ('b/file_3', 'Tag B')])
+
+    def test_metrics_are_off_by_default(self):
+        self.store.get_files_by_tag('Tag A')
+        self.store.get_tags_by_file('a/file_1')
+        self.assertEqual({'operations': {}, 'paths': {}}, taggart.stats())
+
+    def test_operations_are_counted(self):
+        taggart.METRICS = True
+        self.store.get_files_by_tag('Tag A')
+        self.store.get_files_by_tag('Tag B')
+        self.store.tag(['a/file_1', 'c/file_4'], ['Tag A', 'Tag C'])
+        self.store.rename_tag('Tag B', 'Tag D')
+        operations = taggart.stats()['operations']
+        self.assertEqual(['get_files_by_tag', 'rename_tag', 'tag'],
+                         sorted(operations))
+        self.assertEqual(2, operations['get_files_by_tag']['calls'])
+        self.assertEqual(0, operations['get_files_by_tag']['edges'])
+        self.assertEqual(3, operations['tag']['edges'])
+        self.assertEqual(2, operations['rename_tag']['edges'])
+        self.assertGreater(operations['tag']['seconds'], 0)
+
+    def test_only_changed_edges_are_counted(self):
+        for mapping in taggart.TAG_TO_FILE, taggart.FILE_TO_TAG, (
+                taggart.BIDIRECTIONAL):
+            self.store.remap(mapping)
+            taggart.METRICS = True
+            self.store.tag('a/file_1', ['Tag A', 'Tag B'])
+            self.store._tag('a/file_1', 'Tag B')
+            self.store._tag('a/file_1', 'Tag Z')
+            self.store._untag('a/file_1', 'Tag Z')
+            self.store._untag('a/file_1', 'Tag Z')
+            self.assertEqual(3, taggart._METRICS_LOCAL.edges)
+            self.store.untag(['a/file_1', 'a/file_9'], 'Tag B')
+            self.store.rename_tag('Tag A', 'Tag B')
+            self.store.rename_tag('Tag B', 'Tag B')
+            self.store.rename_file('b/file_3', 'a/file_2')
+            self.store.rename_file('a/file_2', 'a/file_2')
+            self.store.rename_files({'a/file_1': 'a/file_2',
+                                     'a/file_2': 'a/file_1'})
+            self.assertEqual(
+                {'tag': 1, 'untag': 1, 'rename_tag': 4, 'rename_file': 1,
+                 'rename_files': 4},
+                dict((name, operation['edges']) for name, operation in
+                     taggart.stats()['operations'].items()))
+            self.setUp()
+
+    def test_nested_operations_are_not_counted(self):
+        taggart.METRICS = True
+        self.store.untag('a/file_1', 'Tag A')
+        self.store.get_files_by_tag_prefix('Tag')
+        self.store.untag_under('a')
+        self.assertEqual(
+            {'untag': 1, 'get_files_by_tag_prefix': 0, 'untag_under': 1},
+            dict((name, operation['edges']) for name, operation in
+                 taggart.stats()['operations'].items()))
+        self.assertEqual(0, taggart._METRICS_LOCAL.depth)
+
+    def test_loads_count_the_edges_they_add(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'tags.txt')
+        with open(path, 'w') as f:
+            f.write('Tag A<==>a/file_1\nTag A<==>a/file_5\n'
+                    'Tag C<==>c/file_6\n')
+        taggart.METRICS = True
+        with patch.object(taggart.os, 'cpu_count', return_value=2):
+            self.store.load(path, workers=2)
+        self.store.init('{"Tag A": ["a/file_1", "a/file_7"]}', fmt='json')
+        operations = taggart.stats()['operations']
+        self.assertEqual(2, operations['load']['edges'])
+        self.assertEqual(1, operations['init']['edges'])
+
+    def test_failed_operations_are_counted(self):
+        taggart.METRICS = True
+        self.assertRaises(ValueError, self.store.query, 'Tag A &')
+        self.assertEqual(1, taggart.stats()['operations']['query']['calls'])
+
+    def test_percentiles(self):
+        taggart.PERCENTILES = (0, 50, 100)
+        taggart.METRICS_SAMPLES = 4
+        taggart._timer = iter([0, 1, 0, 2, 0, 3, 0, 4, 0, 5]).__next__
+        taggart.METRICS = True
+        for _ in range(5):
+            self.store.get_tags()
+        operations = taggart.stats()['operations']
+        self.assertEqual({0: 2, 50: 3, 100: 5},
+                         operations['get_tags']['percentiles'])
+        self.assertEqual(15, operations['get_tags']['seconds'])
+
+    def test_reset_stats(self):
+        taggart.METRICS = True
+        self.store.get_tags_by_file('a/file_1')
+        taggart.reset_stats()
+        self.assertEqual({'operations': {}, 'paths': {}}, taggart.stats())
+
+    def _paths(self, mapping):
+        self.store.remap(mapping)
+        taggart.reset_stats()
+        taggart.METRICS = True
+        self.store.get_files_by_tag('Tag A')
+        self.store.get_files_by_tag_prefix('Tag')
+        self.store.get_tags_by_file('a/file_1')
+        self.store.get_tags_under('a')
+        self.store.get_tags()
+        self.store.get_files()
+        self.store.query('Tag A & !Tag B')
+        self.store.query('!Tag A')
+        self.store.rename_tag('Tag A', 'Tag C')
+        self.store.rename_file('a/file_1', 'a/file_5')
+        self.store.rename_directory('b', 'c')
+        return taggart.stats()['paths']
+
+    def test_paths_tag_to_file(self):
+        self.assertEqual({
+            'files_by_tag': {'index': 4, 'scan': 0},
+            'tags_by_file': {'index': 0, 'scan': 1},
+            'all_tags': {'index': 1, 'scan': 0},
+            'all_files': {'index': 0, 'scan': 2},
+            'rename_tag': {'index': 1, 'scan': 0},
+            'rename_file': {'index': 2, 'scan': 0}},
+            self._paths(taggart.TAG_TO_FILE))
+
+    def test_rename_file_tag_to_file_uses_tree(self):
+        self.store.remap(taggart.TAG_TO_FILE)
+        self.store.get_tags_under('a')
+        taggart.reset_stats()
+        taggart.METRICS = True
+        with patch.object(taggart, 'logger') as logger_mock:
+            self.store.rename_file('a/file_1', 'a/file_5')
+        logger_mock.info.assert_not_called()
+        self.assertEqual({'index': 1, 'scan': 0},
+                         taggart.stats()['paths']['rename_file'])
+        self.assertEqual(self.store.get_tags_by_file('a/file_5'),
+                         self.store.get_tags_under('a/file_5'))
+        self.assertEqual([], self.store.get_tags_by_file('a/file_1'))
+
+    def test_paths_file_to_tag(self):
+        self.assertEqual({
+            'files_by_tag': {'index': 0, 'scan': 4},
+            'tags_by_file': {'index': 1, 'scan': 0},
+            'all_tags': {'index': 0, 'scan': 1},
+            'all_files': {'index': 1, 'scan': 0},
+            'rename_tag': {'index': 0, 'scan': 1},
+            'rename_file': {'index': 2, 'scan': 0}},
+            self._paths(taggart.FILE_TO_TAG))
+
+    def test_paths_bidirectional(self):
+        self.assertEqual({
+            'files_by_tag': {'index': 4, 'scan': 0},
+            'tags_by_file': {'index': 1, 'scan': 0},
+            'all_tags': {'index': 1, 'scan': 0},
+            'all_files': {'index': 2, 'scan': 0},
+            'rename_tag': {'index': 1, 'scan': 0},
+            'rename_file': {'index': 2, 'scan': 0}},
+            self._paths(taggart.BIDIRECTIONAL))
+
+    def test_profile(self):
+        with taggart.profile() as block:
+            self.assertTrue(taggart.METRICS)
+            self.store.get_files_by_tag('Tag A')
+        self.assertFalse(taggart.METRICS)
+        self.assertEqual(
+            1, block['operations']['get_files_by_tag']['calls'])
+        self.assertEqual({'index': 1, 'scan': 0},
+                         block['paths']['files_by_tag'])
+        self.assertEqual(block, taggart.stats())
+
+    def test_nested_profiles(self):
+        taggart.METRICS = True
+        self.store.get_files_by_tag('Tag A')
+        with taggart.profile() as outer:
+            self.store.get_files_by_tag('Tag B')
+            with taggart.profile() as inner:
+                self.store.get_files_by_tag('Tag A')
+                self.store.untag('a/file_1', 'Tag A')
+        self.assertTrue(taggart.METRICS)
+        self.assertEqual(
+            1, inner['operations']['get_files_by_tag']['calls'])
+        self.assertEqual(
+            2, outer['operations']['get_files_by_tag']['calls'])
+        self.assertEqual(1, outer['operations']['untag']['edges'])
+        self.assertEqual(3, taggart.stats()['operations'][
+            'get_files_by_tag']['calls'])
+        self.assertEqual({'index': 2, 'scan': 0},  # The last was cached
+                         taggart.stats()['paths']['files_by_tag'])
+
+    @patch.object(taggart, 'logger')
+    def test_log_messages_are_formatted_lazily(self, log_mock):
+        self.store.get_tags_by_file('a/file_1')
+        log_mock.debug.assert_called_with(
+            'Using %s memory mapping.', taggart.TAG_TO_FILE)
+        log_mock.info.assert_called_with(
+            'Queries by file may be slow for %s maps...', taggart.TAG_TO_FILE)
+
+
+class ReadWriteLock_TestCase(TestCase):
+    def setUp(self):
+        self.lock = taggart.ReadWriteLock()
+
+    def start(self, *steps):
+        """Run steps on the lock in another thread; get an Event set after."""
+        done = threading.Event()
+
+        def run():
+            for step in steps:
+                getattr(self.lock, step)()
+            done.set()
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        return done
+
+    def test_readers_share_the_lock(self):
+        self.lock.acquire_read()
+        self.assertTrue(self.start('acquire_read', 'release_read').wait(1))
+        self.lock.release_read()
+
+    def test_writer_excludes_readers(self):
+        self.lock.acquire_write()
+        done = self.start('acquire_read', 'release_read')
+        self.assertFalse(done.wait(0.1))
+        self.lock.release_write()
+        self.assertTrue(done.wait(1))
+
+    def test_readers_exclude_writers(self):
+        self.lock.acquire_read()
+        done = self.start('acquire_write', 'release_write')
+        self.assertFalse(done.wait(0.1))
+        self.lock.release_read()
+        self.assertTrue(done.wait(1))
+
+    def test_waiting_writer_blocks_new_readers(self):
+        self.lock.acquire_read()
+        writer = self.start('acquire_write', 'release_write')
+        while not self.lock._waiting:
+            time.sleep(0.001)
+        reader = self.start('acquire_read', 'release_read')
+        self.assertFalse(reader.wait(0.1))
+        self.lock.release_read()
+        self.assertTrue(writer.wait(1))
+        self.assertTrue(reader.wait(1))
+
+    def test_lock_is_reentrant(self):
+        self.lock.acquire_write()
+        self.lock.acquire_write()
+        self.lock.acquire_read()
+        self.lock.acquire_read()
+        self.lock.release_read()
+        self.lock.release_read()
+        self.lock.release_write()
+        done = self.start('acquire_read', 'release_read')
+        self.assertFalse(done.wait(0.1))
+        self.lock.release_write()
+        self.assertTrue(done.wait(1))
+
+
+class TagStore_threads_TestCase(TestCase):
+    def setUp(self):
+        reload(taggart)
+        taggart.logger.setLevel('CRITICAL')
+        taggart.BATCH_SIZE = 16
+
+    def check(self, store):
+        """Check that the reverse index matches the tag map."""
+        store.lock.acquire_read()
+        try:
+            reverse = {}
+            for tag_name, file_names in store.the_list.items():
+                for file_name in file_names:
+                    reverse.setdefault(file_name, set()).add(tag_name)
+            return reverse == dict(
+                (file_name, set(tag_names)) for file_name, tag_names
+                in store.the_reverse_list.items() if tag_names)
+        finally:
+            store.lock.release_read()
+
+    def stress(self, writers=4, readers=4, files=200):
+        store = taggart.TagStore(taggart.BIDIRECTIONAL)
+        stop = threading.Event()
+        errors = []
+        reads = []
+
+        def write(n):
+            try:
+                names = ['dir_%d/file_%d' % (n, i) for i in range(files)]
+                for i, file_name in enumerate(names):
+                    store.tag(file_name, ['Tag %d' % (i % 7), 'Writer %d' % n])
+                    if i % 3 == 0:
+                        store.untag(file_name, 'Tag %d' % (i % 7))
+                store.rename_directory('dir_%d' % n, 'done_%d' % n)
+            except Exception as e:  # pragma: no cover
+                errors.append(e)
+
+        def read():
+            count = 0
+            try:
+                while not stop.is_set():
+                    store.get_files_by_tag('Tag 1')
+                    store.query('Tag 2 & !Writer 0')
+                    store.get_tags_by_file('dir_1/file_1')
+                    if not self.check(store):  # pragma: no cover
+                        errors.append('Reverse index out of step')
+                    count += 1
+            except Exception as e:  # pragma: no cover
+                errors.append(e)
+            reads.append(count)
+
+        threads = [threading.Thread(target=write, args=(n,))
+                   for n in range(writers)]
+        threads += [threading.Thread(target=read) for _ in range(readers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads[:writers]:
+            thread.join()
+        stop.set()
+        for thread in threads[writers:]:
+            thread.join()
+
+        self.assertEqual([], errors)
+        self.assertEqual(readers, len([count for count in reads if count]))
+        for n in range(writers):
+            self.assertEqual(
+                ['done_%d/file_%d' % (n, i) for i in range(files)],
+                sorted(store.get_files_by_tag('Writer %d' % n),
+                       key=lambda name: int(name.rsplit('_', 1)[1])))
+            for i in range(files):
+                self.assertEqual(
+                    ['Tag %d' % (i % 7), 'Writer %d' % n][i % 3 == 0:],
+                    store.get_tags_by_file('done_%d/file_%d' % (n, i)))
+        self.assertTrue(self.check(store))
+
+    def test_threads_with_set_postings(self):
+        self.stress()
+
+    def test_threads_with_array_postings(self):
+        taggart.POSTINGS = taggart.ARRAY_POSTINGS
+        self.stress()
+
+
+class aio_BaseCase(TestCase):
+    def setUp(self):
+        reload(taggart)
+        taggart.logger.setLevel('CRITICAL')
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'tags.txt')
+        taggart.THE_LIST = {
+            'Tag A': {'file_1'},
+            'Tag B': {'file_2', 'file_3'},
+            'Tag C': {'file_2', 'file_3'},
+            'Tag D': {'file_3'}
+        }
+        self.tag_map = copy.deepcopy(taggart.THE_LIST)
+
+
+class aio_TestCase(aio_BaseCase):
+    def test_save_and_load(self):
+        async def run():
+            await aio.save(self.path)
+            taggart.THE_LIST = {}
+            await aio.load(self.path)
+        asyncio.run(run())
+        self.assertEqual(self.tag_map, taggart.THE_LIST)
+
+    def test_queries(self):
+        async def run():
+            return await asyncio.gather(
+                aio.query('Tag B & !Tag D'), aio.get_tag_files('Tag B'),
+                aio.get_file_tags('file_2'), aio.get_tags(), aio.get_files(),
+                aio.dump('json'), aio.get_tags_by_prefix('Tag'),
+                aio.get_files_by_tag_prefix('Tag D'))
+        self.assertEqual([
+            ['file_2'], ['file_2', 'file_3'], ['Tag B', 'Tag C'],
+            ['Tag A', 'Tag B', 'Tag C', 'Tag D'],
+            ['file_1', 'file_2', 'file_3'],
+            taggart.dump('json'), ['Tag A', 'Tag B', 'Tag C', 'Tag D'],
+            ['file_3']], asyncio.run(run()))
+
+    def test_pages(self):
+        async def run():
+            return await asyncio.gather(
+                aio.query('Tag B | Tag A', after='file_1', limit=1),
+                aio.get_files_by_tag('Tag B', offset=1),
+                aio.get_tags_by_file('file_3', limit=1),
+                aio.get_tags(after='Tag C'), aio.get_files(limit=1))
+        self.assertEqual([['file_2'], ['file_3'], ['Tag B'], ['Tag D'],
+                          ['file_1']], asyncio.run(run()))
+
+    def test_tag_and_untag_another_store(self):
+        store = taggart.TagStore()
+
+        async def run():
+            await aio.tag(['file_1', 'file_2'], 'Tag A', store=store)
+            await aio.untag('file_1', 'Tag A', store=store)
+        asyncio.run(run())
+        self.assertEqual({'Tag A': {'file_2'}}, store.the_list)
+        self.assertEqual(self.tag_map, taggart.THE_LIST)
+
+    def test_directories(self):
+        store = taggart.TagStore()
+        store.tag(['dir/file_1', 'dir/file_2', 'file_3'], ['Tag A', 'Tag B'])
+
+        async def run():
+            found = await asyncio.gather(
+                aio.get_files_under('dir', store=store),
+                aio.get_tags_under('dir', store=store))
+            await aio.untag_under('dir', 'Tag A', store=store)
+            return found
+        self.assertEqual([['dir/file_1', 'dir/file_2'], ['Tag A', 'Tag B']],
+                         asyncio.run(run()))
+        self.assertEqual(['Tag B'], store.get_tags_under('dir'))
+
+    def test_load_raises_error_for_nonexistent_file(self):
+        self.assertRaises(IOError, asyncio.run, aio.load('missing.txt'))
+
+
+class aio_dump_to_TestCase(aio_BaseCase):
+    class Writer(object):
+        def __init__(self, fail=False):
+            self.data = []
+            self.fail = fail
+
+        def write(self, data):
+            self.data.append(data)
+
+        async def drain(self):
+            await asyncio.sleep(0)
+            if self.fail:
+                raise ValueError('Connection lost')
+
+    def test_dump_to_streams_in_batches(self):
+        taggart.WRITE_SIZE = 1
+        writer = self.Writer()
+        ticks = []
+
+        async def tick():
+            while True:
+                ticks.append(None)
+                await asyncio.sleep(0)
+
+        async def run():
+            ticker = asyncio.ensure_future(tick())
+            await aio.dump_to(writer, 'text')
+            ticker.cancel()
+        asyncio.run(run())
+        self.assertEqual(6, len(writer.data))
+        self.assertEqual(taggart.dump('text').encode('utf-8'),
+                         b''.join(writer.data))
+        self.assertTrue(len(ticks) >= 6)
+
+    def test_dump_to_writes_str_without_an_encoding(self):
+        writer = self.Writer()
+        asyncio.run(aio.dump_to(writer, 'yaml', encoding=None))
+        self.assertEqual(taggart.dump('yaml'), ''.join(writer.data))
+
+    def test_dump_to_stops_rendering_when_writing_fails(self):
+        taggart.WRITE_SIZE = 1
+        aio.PIPE_DEPTH = 1
+        self.addCleanup(setattr, aio, 'PIPE_DEPTH', 4)
+        writer = self.Writer(fail=True)
+        self.assertRaises(ValueError, asyncio.run, aio.dump_to(writer))
+        self.assertEqual(1, len(writer.data))
+
+    @patch('taggart.TagStore.dump_to')
+    def test_dump_to_raises_rendering_errors(self, dump_to_mock):
+        dump_to_mock.side_effect = KeyError
+        self.assertRaises(KeyError, asyncio.run, aio.dump_to(self.Writer()))